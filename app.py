@@ -1,30 +1,32 @@
+import io
 import random
+from math import ceil
+
 import streamlit as st
 from pathlib import Path
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter
-
-from src.planner import plan_from_instruction
-from src.retriever import KnowledgeBase
-from src.executor import (
-    ExecutionContext,
-    load_dataset,
-    calcular_nueva_poliza_para_placa,
-    estadisticas_generales,
+from src.config import (
+    APP_HISTORIAL_PAGINA,
+    APP_HISTORIAL_VISIBLE,
+    APP_MAX_CHARS_MENSAJE,
+    APP_MAX_MENSAJES,
+    CATALOGO_REPORTES_ENABLED,
 )
-from src.reasoner import explain_soat_calculation
-from src.reporter import build_markdown_report
-from src.evaluator import simple_evaluate_report
+from src.retriever import KnowledgeBase
+from src.agent import run_agent
+from src.report_catalog import catalogo_reportes
 
 
-def md_to_pdf(md_path: Path) -> Path:
+def md_to_pdf(markdown: str) -> bytes:
     """
-    Convierte un archivo .md sencillo a PDF y devuelve la ruta del PDF.
+    Convierte el Markdown sencillo de un reporte a PDF, en memoria.
     """
-    pdf_path = md_path.with_suffix(".pdf")
-    text = md_path.read_text(encoding="utf-8")
+    # reportlab solo se carga cuando de verdad se genera un PDF
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.pagesizes import letter
+
+    text = markdown
 
     styles = getSampleStyleSheet()
     story = []
@@ -44,9 +46,43 @@ def md_to_pdf(md_path: Path) -> Path:
             story.append(Paragraph(safe_line, styles["BodyText"]))
             story.append(Spacer(1, 6))
 
-    doc = SimpleDocTemplate(str(pdf_path), pagesize=letter)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
     doc.build(story)
-    return pdf_path
+    return buffer.getvalue()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def pdf_en_cache(markdown: str) -> bytes:
+    """PDF de un Markdown (sin efectos: queda en caché por contenido)."""
+    return md_to_pdf(markdown)
+
+
+def pdf_del_reporte(reporte: dict) -> bytes:
+    """
+    PDF de un reporte; se genera solo cuando el usuario pide la descarga. La primera
+    vez, si el .md ya está en disco, el PDF se guarda a su lado y en el catálogo.
+    """
+    pdf = pdf_en_cache(reporte["markdown"])
+    md = reporte["report_path_md"]
+    if md and not reporte.get("pdf_guardado") and Path(md).exists():
+        pdf_path = Path(md).with_suffix(".pdf")
+        pdf_path.write_bytes(pdf)
+        reporte["pdf_guardado"] = True
+        if CATALOGO_REPORTES_ENABLED:
+            try:
+                catalogo_reportes().asignar_pdf(reporte["nombre"], pdf_path)
+            except Exception as e:
+                print(f"[WARN] No se pudo registrar el PDF en el catálogo: {e}")
+    return pdf
+
+
+@st.cache_resource(show_spinner=False)
+def knowledge_base() -> KnowledgeBase:
+    """Documentación SOAT indexada una sola vez por proceso (compartida entre sesiones)."""
+    kb = KnowledgeBase()
+    kb.index_documents()
+    return kb
 
 
 def run_agent_once(instruction: str):
@@ -55,74 +91,25 @@ def run_agent_once(instruction: str):
     y devuelve un dict con:
       - explanation
       - report_path_md
-      - report_path_pdf
+      - report_nombre / report_markdown (el PDF se genera al descargarlo)
       - calc_result
       - global_stats
+      - otros_resultados
       - eval_result
     """
 
-    # 1) Planner
-    actions = plan_from_instruction(instruction)
-
-    # 2) RAG: documentación SOAT
-    kb = KnowledgeBase()
-    kb.index_documents()
-    # Aca es donde generamos el json para el ollama con la info del pdf
-    rag_evidence = kb.retrieve(instruction, top_k=5)
-
-    # 3) Executor: dataset + acciones
-    ctx = ExecutionContext()
-    calc_result = None
-    global_stats = None
-
-    for action in actions:
-        t = action.get("type")
-        params = action.get("params", {}) or {}
-
-        if t == "load_dataset":
-            load_dataset(ctx)
-        elif t == "calc_for_plate":
-            placa = params.get("placa")
-            if placa:
-                calc_result = calcular_nueva_poliza_para_placa(ctx, placa)
-            else:
-                ctx.log("[WARN] Acción calc_for_plate sin 'placa' en params.")
-        elif t == "global_stats":
-            global_stats = estadisticas_generales(ctx)
-        else:
-            ctx.log(f"[WARN] Acción no soportada: {t}")
-
-    # 4) Reasoner: explicación con LLM
-    explanation = explain_soat_calculation(
-        instruction=instruction,
-        calc_result=calc_result,
-        global_stats=global_stats,
-        rag_evidence=rag_evidence,
-    )
-
-    # 5) Reporter: generar reporte en Markdown
-    report_path_md = build_markdown_report(
-        instruction=instruction,
-        rag_evidence=rag_evidence,
-        explanation_text=explanation,
-        calc_result=calc_result,
-        global_stats=global_stats,
-        logs=ctx.logs,
-    )
-
-    # 6) Convertir a PDF
-    report_path_pdf = md_to_pdf(Path(report_path_md))
-
-    # 7) Evaluator
-    eval_result = simple_evaluate_report(Path(report_path_md))
+    # Planner → executor → reasoner → reporter → evaluator
+    result = run_agent(instruction, knowledge_base())
 
     return {
-        "explanation": explanation,
-        "report_path_md": str(report_path_md),
-        "report_path_pdf": str(report_path_pdf),
-        "calc_result": calc_result,
-        "global_stats": global_stats,
-        "eval_result": eval_result,
+        "explanation": result["explanation"],
+        "report_path_md": result["report_path_md"],
+        "report_nombre": result["reporte"].nombre,
+        "report_markdown": result["reporte"].markdown,
+        "calc_result": result["calc_result"],
+        "global_stats": result["global_stats"],
+        "otros_resultados": result["otros_resultados"],
+        "eval_result": result["eval_result"],
     }
 
 
@@ -169,24 +156,55 @@ st.markdown(
 if "messages" not in st.session_state:
     st.session_state.messages = []  # cada mensaje: {"role": "user"/"assistant", "content": "texto"}
 
-if "last_report_pdf" not in st.session_state:
-    st.session_state.last_report_pdf = None
-
-# Mostrar historial
-for msg in st.session_state.messages:
-    if msg["role"] == "user":
-        with st.chat_message("user"):
-            st.markdown(msg["content"])
-    else:
-        with st.chat_message("assistant"):
-            st.markdown(msg["content"])
+# Último reporte (nombre, Markdown y ruta); su PDF solo se genera al descargarlo
+if "last_report" not in st.session_state:
+    st.session_state.last_report = None
+
+
+def agregar_mensaje(role: str, content: str):
+    """Agrega al historial respetando los topes por sesión (texto por mensaje y total)."""
+    if len(content) > APP_MAX_CHARS_MENSAJE:
+        content = content[:APP_MAX_CHARS_MENSAJE] + "\n\n_(mensaje recortado)_"
+    mensajes = st.session_state.messages
+    mensajes.append({"role": role, "content": content})
+    if len(mensajes) > APP_MAX_MENSAJES:
+        del mensajes[: len(mensajes) - APP_MAX_MENSAJES]
+
+
+def mostrar_mensaje(msg: dict):
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["content"])
+
+
+# Mostrar historial: siempre los últimos APP_HISTORIAL_VISIBLE mensajes; los anteriores,
+# plegados y de a una página, así que cada rerun dibuja una cantidad acotada de mensajes
+mensajes = st.session_state.messages
+n_anteriores = max(len(mensajes) - APP_HISTORIAL_VISIBLE, 0)
+if n_anteriores:
+    with st.expander(f"Mensajes anteriores ({n_anteriores})"):
+        n_paginas = ceil(n_anteriores / APP_HISTORIAL_PAGINA)
+        # La página vive solo en session_state (el widget no recibe value=): al abrir,
+        # la más reciente; si el historial se recorta, se ajusta al nuevo máximo
+        if "pagina_historial" not in st.session_state or st.session_state.pagina_historial > n_paginas:
+            st.session_state.pagina_historial = n_paginas
+        pagina = st.number_input(
+            f"Página (1 = más antigua, {n_paginas} = más reciente)",
+            min_value=1,
+            max_value=n_paginas,
+            key="pagina_historial",
+        )
+        inicio = (pagina - 1) * APP_HISTORIAL_PAGINA
+        for msg in mensajes[inicio:min(inicio + APP_HISTORIAL_PAGINA, n_anteriores)]:
+            mostrar_mensaje(msg)
+for msg in mensajes[n_anteriores:]:
+    mostrar_mensaje(msg)
 
 # Input tipo chat
 user_input = st.chat_input("Escribe tu instrucción sobre SOAT...")
 
 if user_input:
     # 1) Añadir mensaje del usuario al historial
-    st.session_state.messages.append({"role": "user", "content": user_input})
+    agregar_mensaje("user", user_input)
 
     # 2) Mostrarlo de inmediato
     with st.chat_message("user"):
@@ -213,9 +231,7 @@ if user_input:
         with st.chat_message("assistant"):
             st.markdown(respuesta)
 
-        st.session_state.messages.append(
-            {"role": "assistant", "content": respuesta}
-        )
+        agregar_mensaje("assistant", respuesta)
 
     else:
         # 4) Ejecutar agente completo solo para consultas "serias"
@@ -226,40 +242,39 @@ if user_input:
 
                     explanation = result["explanation"]
                     report_path_md = result["report_path_md"]
-                    report_path_pdf = result["report_path_pdf"]
                     eval_result = result["eval_result"]
 
-                    # Guardamos la ruta del último PDF para permitir descarga
-                    st.session_state.last_report_pdf = report_path_pdf
+                    # Solo el último reporte por sesión; el PDF se genera al descargarlo
+                    st.session_state.last_report = {
+                        "nombre": result["report_nombre"],
+                        "markdown": result["report_markdown"],
+                        "report_path_md": report_path_md,
+                    }
 
                     respuesta = explanation
                     respuesta += "\n\n---\n"
-                    respuesta += f"_He generado un reporte detallado en:_ `{report_path_md}`\n"
-                    respuesta += f"_Versión en PDF:_ `{report_path_pdf}`\n"
+                    if report_path_md:
+                        respuesta += f"_He generado un reporte detallado en:_ `{report_path_md}`\n"
+                    respuesta += "_Puedes descargarlo en PDF con el botón de abajo._\n"
                     respuesta += f"_Puntaje interno del reporte:_ **{eval_result['score']}/5**"
 
                     st.markdown(respuesta)
 
-                    st.session_state.messages.append(
-                        {"role": "assistant", "content": respuesta}
-                    )
+                    agregar_mensaje("assistant", respuesta)
 
                 except Exception as e:
                     error_msg = f"Ocurrió un error al ejecutar el agente: `{e}`"
                     st.error(error_msg)
-                    st.session_state.messages.append(
-                        {"role": "assistant", "content": error_msg}
-                    )
-
-# Si hay un último PDF, mostramos botón de descarga global
-if st.session_state.last_report_pdf:
-    pdf_path = Path(st.session_state.last_report_pdf)
-    if pdf_path.exists():
-        with open(pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-        st.download_button(
-            label="📄 Descargar último reporte en PDF",
-            data=pdf_bytes,
-            file_name=pdf_path.name,
-            mime="application/pdf",
-        )
+                    agregar_mensaje("assistant", error_msg)
+
+# Si hay un último reporte, mostramos botón de descarga global. El PDF no se lee ni se
+# genera en cada rerun: data es una función que Streamlit llama solo al hacer clic.
+ultimo = st.session_state.last_report
+if ultimo:
+    st.download_button(
+        label="📄 Descargar último reporte en PDF",
+        data=lambda: pdf_del_reporte(ultimo),
+        file_name=f"{ultimo['nombre']}.pdf",
+        mime="application/pdf",
+        on_click="ignore",
+    )
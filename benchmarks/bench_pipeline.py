@@ -0,0 +1,331 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark de las etapas del agente SOAT sobre datos sintéticos.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_pipeline --filas 1000000 --docs 200
+    python -m benchmarks.bench_pipeline --filas 1000000 --guardar-baseline
+    python -m benchmarks.bench_pipeline --filas 1000000 --comparar outputs/benchmarks/baseline.json
+
+Ollama se reemplaza por un stub (con latencia opcional), así que se mide el costo
+propio del agente y no el del modelo.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from src import planner, quote_cache, reasoner, repricing, report_catalog, reporter, shared_dataset, trace
+from src.business_rules import calcular_soat_estimado, calcular_soat_vectorizado, codificar_portafolio
+from src.config import OUTPUT_DIR, TRACE_JSONL_ENABLED
+from src.evaluator import evaluar_lote, simple_evaluate_report
+from src.executor import (
+    ExecutionContext,
+    buscar_por_placa,
+    calcular_nueva_poliza_para_placa,
+    estadisticas_generales,
+    load_dataset,
+)
+from src.reporter import construir_reporte, guardar_reporte
+from src.retriever import KnowledgeBase
+from src.synthetic import generar_corpus, generar_portafolio
+
+BENCH_DIR = OUTPUT_DIR / "benchmarks"
+
+INSTRUCCIONES = [
+    "Calcula el valor del SOAT para la placa {placa} y explícalo según el manual.",
+    "Analiza el archivo de vehículos SOAT y dame estadísticas por tipo de vehículo.",
+    "Qué factor de recargo aplica a conductores menores de 25 años en zona alta?",
+    "Cuál es la tarifa base de una moto de 150 centímetros cúbicos?",
+]
+
+
+class OllamaSimulado:
+    """Stub de ollama.chat: devuelve un plan JSON fijo al planner y texto fijo al reasoner."""
+
+    def __init__(self, latencia_ms: float = 0.0, placa: str = "ABC123"):
+        self.latencia_ms = latencia_ms
+        self.placa = placa
+
+    def chat(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000.0)
+        if "PLANIFICACIÓN" in messages[0]["content"]:
+            plan = {
+                "actions": [
+                    {"id": "a1", "type": "load_dataset", "params": {}},
+                    {"id": "a2", "type": "calc_for_plate", "params": {"placa": self.placa}},
+                ]
+            }
+            return {"message": {"content": json.dumps(plan)}}
+        return {"message": {"content": "Explicación simulada del cálculo [Fuente 1 - manual]. " * 20}}
+
+
+def medir(nombre: str, fn: Callable[[int], Any], llamadas: int, unidades: int = 1) -> Dict[str, Any]:
+    """
+    Ejecuta fn(i) `llamadas` veces. La primera llamada se hace con tracemalloc para el pico
+    de memoria (y no cuenta en las latencias); el resto mide latencia sin instrumentar.
+    """
+    tracemalloc.start()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        fn(0)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tiempos = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(1, llamadas + 1):
+            t0 = time.perf_counter()
+            fn(i)
+            tiempos.append(time.perf_counter() - t0)
+
+    tiempos = np.array(tiempos)
+    total = tiempos.sum()
+    resultado = {
+        "llamadas": llamadas,
+        "p50_ms": float(np.percentile(tiempos, 50) * 1000),
+        "p95_ms": float(np.percentile(tiempos, 95) * 1000),
+        "p99_ms": float(np.percentile(tiempos, 99) * 1000),
+        "media_ms": float(tiempos.mean() * 1000),
+        "throughput_por_s": float(llamadas * unidades / total) if total > 0 else float("inf"),
+        "pico_memoria_mb": pico / 1e6,
+    }
+    print(
+        f"{nombre:<28} p50={resultado['p50_ms']:10.3f} ms  p95={resultado['p95_ms']:10.3f} ms  "
+        f"p99={resultado['p99_ms']:10.3f} ms  thr={resultado['throughput_por_s']:14.1f}/s  "
+        f"mem={resultado['pico_memoria_mb']:9.1f} MB"
+    )
+    return resultado
+
+
+@contextlib.contextmanager
+def salidas_temporales(tmp: Path):
+    """
+    Redirige a `tmp` todo lo que el agente escribe fuera de la memoria (reportes y su
+    escritor asíncrono, catálogo, trazas JSONL, cachés de cotizaciones y del dataset,
+    archivos de repricing) y lo restaura al salir: el benchmark no toca outputs/.
+    La traza no se imprime en consola (el hilo del sink no respeta redirect_stdout).
+    """
+    destinos = [
+        (quote_cache, "QUOTES_DIR", tmp / "quotes"),
+        (shared_dataset, "DATASET_CACHE_DIR", tmp / "dataset"),
+        (repricing, "REPRICING_DIR", tmp / "repricing"),
+        (trace, "LOGS_DIR", tmp / "logs"),
+        (report_catalog, "ARCHIVO_DIR", tmp / "reports" / "archivo"),
+        (report_catalog, "_catalogo", None),
+        (reporter, "_persistencia", None),
+        (trace, "_sinks", None),
+    ]
+    previos = [(modulo, nombre, getattr(modulo, nombre)) for modulo, nombre, _ in destinos]
+    trace.vaciar_sinks()
+    for modulo, nombre, valor in destinos:
+        setattr(modulo, nombre, valor)
+    report_catalog._catalogo = report_catalog.CatalogoReportes(tmp / "catalogo.sqlite")
+    reporter._persistencia = reporter.PersistenciaReportes(directorio=tmp / "reports")
+    # Solo el sink JSONL (con su costo de escritura), sin el de consola
+    trace._sinks = [
+        trace.SinkAsincrono(trace._escribir_jsonl, nivel_min="DEBUG", nombre="jsonl", espera=trace.ESPERA_SINK_AUDITORIA)
+    ] if TRACE_JSONL_ENABLED else []
+    try:
+        yield
+    finally:
+        reporter._persistencia.vaciar()
+        trace.vaciar_sinks()
+        for modulo, nombre, valor in previos:
+            setattr(modulo, nombre, valor)
+
+
+def ejecutar_benchmarks(filas: int, docs: int, llamadas: int, latencia_llm_ms: float, seed: int) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    etapas: Dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory() as tmp, salidas_temporales(Path(tmp)):
+        tmp = Path(tmp)
+
+        print(f"Generando portafolio sintético de {filas} filas y corpus de {docs} documentos...")
+        df = generar_portafolio(filas, seed=seed)
+        csv_path = tmp / "vehiculos_sinteticos.csv"
+        df.to_csv(csv_path, index=False)
+        corpus = generar_corpus(docs, seed=seed)
+        placas = df["placa"].to_numpy()[rng.integers(0, filas, llamadas + 1)]
+
+        stub = OllamaSimulado(latencia_ms=latencia_llm_ms, placa=str(placas[0]))
+        planner.ollama = stub
+        reasoner.ollama = stub
+
+        # Un contexto nuevo por llamada: sobre el mismo contexto la carga se omite
+        # (DATASETS_DIR / ruta_absoluta == ruta_absoluta)
+        cargados: List[ExecutionContext] = []
+
+        def cargar(i: int):
+            nuevo = ExecutionContext()
+            load_dataset(nuevo, str(csv_path))
+            cargados[:] = [nuevo]
+
+        etapas["load_dataset"] = medir("load_dataset", cargar, 3, filas)
+        ctx = cargados[0]
+        ctx.traza.limpiar()
+
+        etapas["buscar_por_placa"] = medir(
+            "buscar_por_placa", lambda i: buscar_por_placa(ctx, placas[i]), llamadas
+        )
+
+        columnas = ["tipo_vehiculo", "cilindraje", "edad_conductor", "numero_siniestros_12m", "zona_riesgo", "anios_sin_siniestros"]
+        filas_muestra = df[columnas].iloc[rng.integers(0, filas, llamadas + 1)].itertuples(index=False)
+        filas_muestra = list(filas_muestra)
+        etapas["calcular_soat_estimado"] = medir(
+            "calcular_soat_estimado", lambda i: calcular_soat_estimado(*filas_muestra[i]), llamadas
+        )
+        etapas["calculo_vectorizado"] = medir(
+            "calculo_vectorizado",
+            lambda i: calcular_soat_vectorizado(codificar_portafolio(*[df[c].to_numpy() for c in columnas])),
+            3,
+            filas,
+        )
+
+        def construir_cache(i: int):
+            shutil.rmtree(quote_cache.QUOTES_DIR, ignore_errors=True)
+            ctx.indices.clear()
+            calcular_nueva_poliza_para_placa(ctx, placas[0])
+
+        etapas["cache_cotizaciones_build"] = medir("cache_cotizaciones_build", construir_cache, 2, filas)
+        etapas["calc_for_plate"] = medir(
+            "calc_for_plate", lambda i: calcular_nueva_poliza_para_placa(ctx, placas[i]), llamadas
+        )
+
+        etapas["estadisticas_generales"] = medir(
+            "estadisticas_generales", lambda i: estadisticas_generales(ctx), 5, filas
+        )
+        ctx.traza.limpiar()
+
+        kb = KnowledgeBase()
+        etapas["kb_index"] = medir("kb_index", lambda i: kb.index_texts(corpus), 2, len(corpus))
+        consultas = [INSTRUCCIONES[i % len(INSTRUCCIONES)].format(placa=placas[i]) for i in range(llamadas + 1)]
+        # Las consultas se repiten: sin caché se mide la recuperación, con caché los aciertos
+        cache_size, kb.cache_size = kb.cache_size, 0
+        etapas["kb_retrieve"] = medir("kb_retrieve", lambda i: kb.retrieve(consultas[i], top_k=5), llamadas)
+        kb.cache_size = cache_size
+        etapas["kb_retrieve_cache"] = medir(
+            "kb_retrieve_cache", lambda i: kb.retrieve(consultas[i], top_k=5), llamadas
+        )
+        etapas["kb_retrieve_cache"]["cache"] = kb.estadisticas_cache()
+
+        etapas["planner"] = medir("planner", lambda i: planner.plan_from_instruction(consultas[i]), llamadas)
+        etapas["planner"]["contadores"] = planner.estadisticas_planner()
+
+        calc = calcular_nueva_poliza_para_placa(ctx, placas[0])
+        stats = estadisticas_generales(ctx)
+        evidencia = kb.retrieve(consultas[0], top_k=5)
+        etapas["reasoner"] = medir(
+            "reasoner",
+            lambda i: reasoner.explain_soat_calculation(consultas[i], calc, stats, evidencia),
+            llamadas,
+        )
+        etapas["reasoner_plantilla"] = medir(
+            "reasoner_plantilla",
+            lambda i: reasoner.render_explicacion_plantilla(consultas[i], calc, stats, evidencia),
+            llamadas,
+        )
+
+        etapas["reporter_memoria"] = medir(
+            "reporter_memoria",
+            lambda i: construir_reporte(consultas[i], evidencia, "Explicación", calc, stats, ctx.traza.resumen()),
+            llamadas,
+        )
+
+        reportes: List[Path] = []
+        etapas["reporter"] = medir(
+            "reporter",
+            lambda i: reportes.append(
+                guardar_reporte(
+                    construir_reporte(consultas[i], evidencia, "Explicación", calc, stats, ctx.traza.resumen()),
+                    tmp / "reports",
+                )
+            ),
+            min(llamadas, 20),
+        )
+        etapas["evaluator"] = medir(
+            "evaluator", lambda i: simple_evaluate_report(reportes[i % len(reportes)]), min(llamadas, 20)
+        )
+        lote = [
+            construir_reporte(
+                consultas[i], evidencia, reasoner.render_explicacion_plantilla(consultas[i], calc, None, evidencia),
+                calc, stats, ctx.traza.resumen(),
+            )
+            for i in range(llamadas)
+        ]
+        etapas["evaluator_lote"] = medir("evaluator_lote", lambda i: evaluar_lote(lote), 3, len(lote))
+        etapas["evaluator_lote"]["agregado"] = evaluar_lote(lote)["agregado"]
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "parametros": {"filas": filas, "docs": docs, "llamadas": llamadas, "latencia_llm_ms": latencia_llm_ms, "seed": seed},
+        "etapas": etapas,
+    }
+
+
+def comparar(actual: Dict[str, Any], baseline: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Lista de regresiones (p50 o memoria pico peor que baseline * (1 + tolerancia))."""
+    regresiones = []
+    for etapa, m in actual["etapas"].items():
+        base = baseline.get("etapas", {}).get(etapa)
+        if base is None:
+            continue
+        for metrica in ("p50_ms", "pico_memoria_mb"):
+            if base[metrica] > 0 and m[metrica] > base[metrica] * (1 + tolerancia):
+                regresiones.append(
+                    f"{etapa}.{metrica}: {m[metrica]:.3f} vs baseline {base[metrica]:.3f} "
+                    f"(+{(m[metrica] / base[metrica] - 1) * 100:.0f}%)"
+                )
+    return regresiones
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline del agente SOAT.")
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--llamadas", type=int, default=200)
+    parser.add_argument("--latencia-llm-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--guardar-baseline", nargs="?", const=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--comparar", help="Ruta de un baseline JSON para detectar regresiones.")
+    parser.add_argument("--tolerancia", type=float, default=0.20)
+    args = parser.parse_args()
+
+    resultado = ejecutar_benchmarks(args.filas, args.docs, args.llamadas, args.latencia_llm_ms, args.seed)
+
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    salida = BENCH_DIR / f"bench_{ts}.json"
+    salida.write_text(json.dumps(resultado, indent=2), encoding="utf-8")
+    print(f"\n[OK] Resultados en {salida}")
+
+    if args.guardar_baseline:
+        Path(args.guardar_baseline).write_text(json.dumps(resultado, indent=2), encoding="utf-8")
+        print(f"[OK] Baseline guardado en {args.guardar_baseline}")
+
+    if args.comparar:
+        baseline = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        regresiones = comparar(resultado, baseline, args.tolerancia)
+        if regresiones:
+            print(f"\n[WARN] {len(regresiones)} regresiones respecto al baseline:")
+            for r in regresiones:
+                print(f"- {r}")
+            raise SystemExit(1)
+        print("\n[OK] Sin regresiones respecto al baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/import_budget.py
+"""
+Control del tiempo de importación de los puntos de entrada del agente.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --presupuesto-ms 1200
+
+Importa cada módulo en un proceso nuevo con `python -X importtime`, toma el tiempo
+acumulado del módulo raíz y comprueba que las dependencias pesadas (Ollama, pdfplumber,
+scikit-learn, reportlab) no se carguen al importar: solo deben cargarse en la primera
+llamada que las usa. Los módulos livianos (planner, reasoner, reporter, traza) tampoco
+deben cargar pandas. Termina con código 1 si algo se sale del presupuesto.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Puntos de entrada que deben arrancar rápido
+MODULOS = ["main", "src.main", "src.agent", "src.executor"]
+
+# Dependencias que solo se importan bajo demanda
+PESADAS = ["ollama", "pdfplumber", "sklearn", "reportlab"]
+
+# Módulos que no trabajan con el dataset: además de PESADAS, no deben cargar pandas
+LIVIANOS = ["src.planner", "src.reasoner", "src.reporter", "src.trace"]
+PESADAS_LIVIANOS = PESADAS + ["pandas"]
+
+PRESUPUESTO_MS = 900.0
+
+LINEA_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def medir_importacion(modulo: str, pesadas: List[str] = PESADAS) -> Tuple[float, List[str]]:
+    """Devuelve (ms acumulados del módulo, dependencias pesadas cargadas)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proc.stderr[-2000:]}")
+
+    acumulados: Dict[str, int] = {}
+    for linea in proc.stderr.splitlines():
+        m = LINEA_IMPORTTIME.match(linea)
+        if m:
+            acumulados[m.group(4)] = int(m.group(2))
+
+    cargadas = [p for p in pesadas if p in acumulados]
+    return acumulados.get(modulo, 0) / 1000.0, cargadas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación.")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS)
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se toma el mínimo (menos ruido).")
+    args = parser.parse_args()
+
+    violaciones = []
+    for modulo in MODULOS + LIVIANOS:
+        pesadas = PESADAS_LIVIANOS if modulo in LIVIANOS else PESADAS
+        mediciones = [medir_importacion(modulo, pesadas) for _ in range(args.repeticiones)]
+        ms = min(t for t, _ in mediciones)
+        cargadas = mediciones[0][1]
+        print(f"{modulo:<16} {ms:8.1f} ms  pesadas={cargadas or '-'}")
+        if ms > args.presupuesto_ms:
+            violaciones.append(f"{modulo}: {ms:.1f} ms > {args.presupuesto_ms:.0f} ms")
+        if cargadas:
+            violaciones.append(f"{modulo}: importa en el arranque {', '.join(cargadas)}")
+
+    if violaciones:
+        print(f"\n[WARN] {len(violaciones)} violaciones del presupuesto de importación:")
+        for v in violaciones:
+            print(f"- {v}")
+        raise SystemExit(1)
+    print("\n[OK] Importaciones dentro del presupuesto.")
+
+
+if __name__ == "__main__":
+    main()
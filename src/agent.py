@@ -0,0 +1,129 @@
+# src/agent.py
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Tuple
+
+from .config import CATALOGO_REPORTES_ENABLED, EXPLICACION_ESPERA_LLM, EXPLICACION_MODO, TOP_K_DOCS
+from .planner import plan_from_instruction
+from .retriever import KnowledgeBase
+from .executor import ExecutionContext, ejecutar_plan
+from .reasoner import MODOS_EXPLICACION, explain_soat_calculation, render_explicacion_plantilla
+from .reporter import construir_reporte, persistir_reporte
+from .evaluator import simple_evaluate_report
+from .report_catalog import catalogo_reportes
+
+
+def _explicar(ctx: ExecutionContext, limite_llm, modo: str, datos: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Explicación según el modo pedido; devuelve (texto, modo usado).
+
+    En "auto" se espera como mucho EXPLICACION_ESPERA_LLM segundos por un cupo del
+    modelo: si no se libera (modelo saturado) o la llamada falla, se usa la plantilla.
+    """
+    if modo == "plantilla":
+        return render_explicacion_plantilla(**datos), "plantilla"
+    if modo == "llm":
+        with limite_llm:
+            return explain_soat_calculation(**datos, modo="llm"), "llm"
+
+    adquirir = getattr(limite_llm, "acquire", None)
+    if adquirir is not None and not adquirir(timeout=EXPLICACION_ESPERA_LLM):
+        ctx.log("Modelo saturado: explicación generada por plantilla.", tipo="explicacion")
+        return render_explicacion_plantilla(**datos), "plantilla"
+    try:
+        with nullcontext() if adquirir is not None else limite_llm:
+            return explain_soat_calculation(**datos, modo="llm"), "llm"
+    except Exception as e:
+        ctx.log(f"[WARN] El modelo falló ({e}); explicación generada por plantilla.", tipo="explicacion")
+        return render_explicacion_plantilla(**datos), "plantilla"
+    finally:
+        if adquirir is not None:
+            limite_llm.release()
+
+
+def run_agent(
+    instruction: str,
+    kb: KnowledgeBase,
+    ctx: Optional[ExecutionContext] = None,
+    limite_llm=None,
+    modo_explicacion: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Ejecuta el pipeline completo (planner → RAG → executor → reasoner → reporter → evaluator)
+    con una base de conocimiento ya indexada.
+
+    - ctx: contexto a reutilizar (p. ej. con el dataset ya cargado); si es None se crea uno.
+    - limite_llm: context manager que envuelve cada llamada al modelo (p. ej. un semáforo
+      para limitar llamadas concurrentes a Ollama).
+    - modo_explicacion: "llm", "plantilla" o "auto"; por defecto EXPLICACION_MODO.
+    """
+    modo_explicacion = modo_explicacion or EXPLICACION_MODO
+    if modo_explicacion not in MODOS_EXPLICACION:
+        raise ValueError(f"Modo de explicación desconocido: {modo_explicacion}")
+    ctx = ctx or ExecutionContext()
+    limite_llm = limite_llm or nullcontext()
+
+    # 1) Planner
+    with limite_llm:
+        actions = plan_from_instruction(instruction)
+
+    # 2) RAG
+    rag_evidence = kb.retrieve(instruction, top_k=TOP_K_DOCS)
+
+    # 3) Executor
+    resultados = ejecutar_plan(ctx, actions)
+    calc_result = resultados["calc_result"]
+    global_stats = resultados["global_stats"]
+    otros_resultados = resultados["otros_resultados"]
+
+    # 4) Reasoner
+    explanation, modo_usado = _explicar(
+        ctx,
+        limite_llm,
+        modo_explicacion,
+        {
+            "instruction": instruction,
+            "calc_result": calc_result,
+            "global_stats": global_stats,
+            "rag_evidence": rag_evidence,
+            "otros_resultados": otros_resultados,
+        },
+    )
+
+    # 5) Reporter: armado en memoria; la escritura depende de REPORTES_PERSISTENCIA
+    reporte = construir_reporte(
+        instruction=instruction,
+        rag_evidence=rag_evidence,
+        explanation_text=explanation,
+        calc_result=calc_result,
+        global_stats=global_stats,
+        logs=ctx.traza.resumen(),
+        otros_resultados=otros_resultados,
+    )
+
+    # 6) Evaluator (sobre el reporte en memoria, sin releer el archivo)
+    eval_result = simple_evaluate_report(reporte)
+
+    # 7) Persistencia según REPORTES_PERSISTENCIA; el catálogo se actualiza cuando el
+    # archivo ya existe (en modo asíncrono, desde el hilo escritor)
+    def registrar(guardado):
+        try:
+            catalogo_reportes().registrar(guardado, score=eval_result["score"], acciones=actions)
+        except Exception as e:
+            ctx.log(f"[WARN] No se pudo registrar el reporte en el catálogo: {e}", tipo="catalogo")
+
+    report_path = persistir_reporte(reporte, al_guardar=registrar if CATALOGO_REPORTES_ENABLED else None)
+
+    return {
+        "actions": actions,
+        "rag_evidence": rag_evidence,
+        "explanation": explanation,
+        "modo_explicacion": modo_usado,
+        "report_path_md": str(report_path) if report_path else None,
+        "reporte": reporte,
+        "calc_result": calc_result,
+        "global_stats": global_stats,
+        "otros_resultados": otros_resultados,
+        "eval_result": eval_result,
+        "logs": ctx.logs,
+        "traza": ctx.traza.resumen(),
+    }
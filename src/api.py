@@ -0,0 +1,298 @@
+# src/api.py
+"""
+Servidor HTTP del agente SOAT.
+
+    uvicorn src.api:app --host 127.0.0.1 --port 8000
+    python -m src.api
+
+Mantiene en memoria la base de conocimiento indexada, el dataset y sus índices
+(caché de cotizaciones, índice de vencimientos), ejecuta el trabajo de CPU en un
+pool acotado de hilos y limita con un semáforo las llamadas concurrentes a Ollama.
+Las peticiones que llaman al modelo (/plan, /report) van a un pool aparte, así que
+las que esperan el semáforo no ocupan los hilos de /quote o /stats.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from .agent import run_agent
+from .config import API_HOST, API_LLM_CONCURRENCY, API_LLM_WORKERS, API_PORT, API_WORKERS
+from .executor import (
+    ExecutionContext,
+    cache_cotizaciones,
+    calcular_nueva_poliza_para_placa,
+    estadisticas_generales,
+    indice_vencimientos,
+    load_dataset,
+)
+from .planner import estadisticas_planner, plan_from_instruction
+from .quote_cache import version_dataset
+from .report_catalog import catalogo_reportes
+from .reporter import vaciar_reportes
+from .retriever import KnowledgeBase
+from .trace import descartados_sinks
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+BUCKETS_LATENCIA = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+MAX_PLACAS_LOTE = 10_000
+
+
+class InstruccionRequest(BaseModel):
+    instruction: str
+
+
+class ReporteRequest(InstruccionRequest):
+    # None: EXPLICACION_MODO de la configuración
+    modo_explicacion: Optional[Literal["auto", "llm", "plantilla"]] = None
+
+
+class LoteRequest(BaseModel):
+    placas: List[str]
+
+
+class HistogramaLatencia:
+    """Histograma acumulado por endpoint, en formato compatible con Prometheus."""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.conteos: Dict[str, List[int]] = {}
+        self.sumas: Dict[str, float] = {}
+        self.errores: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, endpoint: str, segundos: float, error: bool = False):
+        with self._lock:
+            conteos = self.conteos.setdefault(endpoint, [0] * (len(self.buckets) + 1))
+            conteos[bisect_left(self.buckets, segundos)] += 1
+            self.sumas[endpoint] = self.sumas.get(endpoint, 0.0) + segundos
+            if error:
+                self.errores[endpoint] = self.errores.get(endpoint, 0) + 1
+
+    def exportar(self) -> str:
+        lineas = [
+            "# HELP soat_request_latency_seconds Latencia de las peticiones por endpoint.",
+            "# TYPE soat_request_latency_seconds histogram",
+        ]
+        with self._lock:
+            for endpoint, conteos in sorted(self.conteos.items()):
+                acumulado = 0
+                for limite, n in zip(self.buckets, conteos):
+                    acumulado += n
+                    lineas.append(f'soat_request_latency_seconds_bucket{{endpoint="{endpoint}",le="{limite}"}} {acumulado}')
+                acumulado += conteos[-1]
+                lineas.append(f'soat_request_latency_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {acumulado}')
+                lineas.append(f'soat_request_latency_seconds_sum{{endpoint="{endpoint}"}} {self.sumas[endpoint]:.6f}')
+                lineas.append(f'soat_request_latency_seconds_count{{endpoint="{endpoint}"}} {acumulado}')
+            lineas.append("# TYPE soat_request_errors_total counter")
+            for endpoint, n in sorted(self.errores.items()):
+                lineas.append(f'soat_request_errors_total{{endpoint="{endpoint}"}} {n}')
+        return "\n".join(lineas) + "\n"
+
+
+class EstadoAgente:
+    """Estado caliente compartido por todas las peticiones."""
+
+    def __init__(self):
+        self.kb = KnowledgeBase()
+        self.base = ExecutionContext()
+        self.pool = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="soat-worker")
+        self.pool_llm = ThreadPoolExecutor(max_workers=API_LLM_WORKERS, thread_name_prefix="soat-llm")
+        self.limite_llm = threading.BoundedSemaphore(API_LLM_CONCURRENCY)
+        self._recarga = threading.Lock()
+        self.metricas = HistogramaLatencia(BUCKETS_LATENCIA)
+
+    def calentar(self):
+        self.kb.index_documents()
+        load_dataset(self.base)
+        cache_cotizaciones(self.base)
+        indice_vencimientos(self.base)
+
+    def actualizar(self):
+        """Si el CSV cambió desde la última carga, relee el dataset base y rehace sus índices."""
+        with self._recarga:
+            if version_dataset(self.base.dataset_path) != self.base.dataset_version:
+                load_dataset(self.base, self.base.dataset_path.name)
+                cache_cotizaciones(self.base)
+                indice_vencimientos(self.base)
+
+    def contexto(self) -> ExecutionContext:
+        """
+        Contexto por petición: comparte (solo lectura) dataset e índices, logs propios.
+        Puede releer el dataset (ver actualizar), así que se llama desde los pools.
+        """
+        self.actualizar()
+        return ExecutionContext(
+            dataset=self.base.dataset,
+            dataset_path=self.base.dataset_path,
+            dataset_version=self.base.dataset_version,
+            dataset_arrow=self.base.dataset_arrow,
+            indices=self.base.indices,
+        )
+
+    async def en_pool(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    async def en_pool_llm(self, fn: Callable, *args) -> Any:
+        """Trabajo que espera al modelo (limite_llm): fuera del pool de CPU."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool_llm, fn, *args)
+
+
+def a_json(obj: Any) -> Any:
+    """Convierte resultados del executor (DataFrames, tipos NumPy, fechas) a JSON."""
+    if isinstance(obj, dict):
+        return {str(k): a_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [a_json(v) for v in obj]
+    if isinstance(obj, pd.DataFrame):
+        return a_json(obj.reset_index().to_dict(orient="records"))
+    if isinstance(obj, pd.Series):
+        return a_json(obj.to_dict())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    return obj
+
+
+estado = EstadoAgente()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await estado.en_pool(estado.calentar)
+    yield
+    estado.pool.shutdown(wait=False)
+    estado.pool_llm.shutdown(wait=False)
+    vaciar_reportes()
+
+
+app = FastAPI(title="Agente Cognitivo SOAT", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def medir_latencia(request: Request, call_next):
+    inicio = time.perf_counter()
+    error = True
+    try:
+        response = await call_next(request)
+        error = response.status_code >= 500
+        return response
+    finally:
+        ruta = request.scope.get("route")
+        endpoint = ruta.path if ruta is not None else "desconocido"
+        estado.metricas.observar(endpoint, time.perf_counter() - inicio, error)
+
+
+@app.get("/health")
+async def health():
+    return {"ok": True, "chunks": len(estado.kb.chunks), "polizas": len(estado.base.dataset)}
+
+
+@app.post("/plan")
+async def plan(req: InstruccionRequest):
+    def tarea():
+        with estado.limite_llm:
+            return plan_from_instruction(req.instruction)
+
+    return {"actions": await estado.en_pool_llm(tarea)}
+
+
+@app.get("/quote/{placa}")
+async def quote(placa: str):
+    def tarea():
+        return calcular_nueva_poliza_para_placa(estado.contexto(), placa.upper())
+
+    resultado = await estado.en_pool(tarea)
+    if "error" in resultado:
+        raise HTTPException(status_code=404, detail=resultado["error"])
+    return a_json(resultado)
+
+
+@app.post("/quote/batch")
+async def quote_batch(req: LoteRequest):
+    if len(req.placas) > MAX_PLACAS_LOTE:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_PLACAS_LOTE} placas por lote.")
+
+    def tarea():
+        ctx = estado.contexto()
+        return [calcular_nueva_poliza_para_placa(ctx, p.upper()) for p in req.placas]
+
+    resultados = await estado.en_pool(tarea)
+    return {
+        "total": len(resultados),
+        "encontradas": sum(1 for r in resultados if "error" not in r),
+        "resultados": a_json(resultados),
+    }
+
+
+@app.get("/stats")
+async def stats():
+    def tarea():
+        return estadisticas_generales(estado.contexto())
+
+    return a_json(await estado.en_pool(tarea))
+
+
+@app.post("/report")
+async def report(req: ReporteRequest):
+    def tarea():
+        return run_agent(
+            req.instruction, estado.kb, estado.contexto(), estado.limite_llm, req.modo_explicacion
+        )
+
+    resultado = await estado.en_pool_llm(tarea)
+    resultado.pop("rag_evidence", None)
+    resultado["report_markdown"] = resultado.pop("reporte").markdown
+    return a_json(resultado)
+
+
+@app.get("/reports")
+async def reports(
+    placa: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    q: Optional[str] = None,
+    limite: int = 50,
+):
+    def tarea():
+        return catalogo_reportes().buscar(placa, desde, hasta, q, min(limite, 500))
+
+    return {"reportes": await estado.en_pool(tarea)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    lineas = ["# TYPE soat_planner_total counter"]
+    for clave, n in estadisticas_planner().items():
+        if not clave.startswith("tasa_"):
+            lineas.append(f'soat_planner_total{{evento="{clave}"}} {n}')
+    cache_rag = estado.kb.estadisticas_cache()
+    lineas.append("# TYPE soat_rag_cache_total counter")
+    lineas.append(f'soat_rag_cache_total{{evento="aciertos"}} {cache_rag["aciertos"]}')
+    lineas.append(f'soat_rag_cache_total{{evento="fallos"}} {cache_rag["fallos"]}')
+    lineas.append("# TYPE soat_rag_cache_entradas gauge")
+    lineas.append(f"soat_rag_cache_entradas {cache_rag['entradas']}")
+    lineas.append("# TYPE soat_trace_descartados_total counter")
+    for sink, n in descartados_sinks().items():
+        lineas.append(f'soat_trace_descartados_total{{sink="{sink}"}} {n}')
+    return estado.metricas.exportar() + "\n".join(lineas) + "\n"
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -0,0 +1,122 @@
+# src/bm25.py
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Tildes y diéresis fuera; la ñ se conserva (año != ano)
+_PLEGADO = str.maketrans("áéíóúàèìòùäëïöüâêîôû", "aeiouaeiouaeiouaeiou")
+
+_TOKEN = re.compile(r"[a-zñ0-9]+")
+
+# Palabras vacías del español (ya plegadas, sin tildes)
+STOP_WORDS_ES = frozenset(
+    """
+    a al algo algun alguna algunas alguno algunos ante antes aqui asi aun aunque bajo bien
+    cada como con contra cual cuales cuando cuanto de del desde donde dos e el ella ellas
+    ello ellos en entre era eran es esa esas ese eso esos esta estaba estado estan estar
+    estas este esto estos fue fueron ha habia han hasta hay la las le les lo los mas me
+    mi mis mismo mucho muy nada ni no nos nosotros o os otra otras otro otros para pero
+    poco por porque que quien quienes se sea segun ser si sido sin sino sobre solo son su
+    sus tal tambien tan tanto te tiene tienen toda todas todo todos tu tus un una unas uno
+    unos usted ustedes y ya yo
+    """.split()
+)
+
+
+def plegar(texto: str) -> str:
+    """Minúsculas y sin tildes ('Vehículo' -> 'vehiculo')."""
+    return texto.lower().translate(_PLEGADO)
+
+
+def raiz(token: str) -> str:
+    """
+    Stemming ligero del español: quita plural y vocal final de género
+    ('siniestros', 'siniestro' -> 'siniestr'; 'tarifas' -> 'tarif').
+    Deliberadamente conservador: no toca números ni palabras cortas.
+    """
+    if token.isdigit() or len(token) <= 3:
+        return token
+    if len(token) > 5 and token.endswith("ces"):
+        token = token[:-3] + "z"
+    elif len(token) > 5 and token.endswith("es") and token[-3] not in "aeiou":
+        token = token[:-2]
+    elif token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+@lru_cache(maxsize=200_000)
+def _termino(token: str) -> str:
+    """Raíz del token ya plegado, o '' si se descarta (palabra vacía o de una letra)."""
+    if len(token) < 2 or token in STOP_WORDS_ES:
+        return ""
+    return raiz(token)
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Tokens normalizados (plegado, sin palabras vacías, con raíz) de un texto."""
+    return [t for t in map(_termino, _TOKEN.findall(plegar(texto))) if t]
+
+
+def analizador_identidad(tokens: List[str]) -> List[str]:
+    """Analizador para los vectorizadores de sklearn cuando el texto ya viene tokenizado."""
+    return tokens
+
+
+class IndiceBM25:
+    """
+    Índice invertido con puntuación BM25.
+
+    Las listas de postings se guardan en formato tipo CSR por término: para el término j,
+    docs[inicio[j]:inicio[j + 1]] son los chunks que lo contienen y tfs[...] sus
+    frecuencias. Una consulta solo recorre los postings de sus términos, no todo el corpus.
+    """
+
+    def __init__(self, documentos: Iterable[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulario: Dict[str, int] = {}
+
+        terminos: List[int] = []
+        docs: List[int] = []
+        tfs: List[int] = []
+        longitudes: List[int] = []
+        for d, tokens in enumerate(documentos):
+            conteo = Counter(tokens)
+            terminos.extend(self.vocabulario.setdefault(t, len(self.vocabulario)) for t in conteo)
+            docs.extend([d] * len(conteo))
+            tfs.extend(conteo.values())
+            longitudes.append(len(tokens))
+
+        self.n_docs = len(longitudes)
+        terminos_arr = np.asarray(terminos, dtype=np.int64)
+        orden = np.argsort(terminos_arr, kind="stable")
+        self.docs = np.asarray(docs, dtype=np.int32)[orden]
+        self.tfs = np.asarray(tfs, dtype=np.float32)[orden]
+        df = np.bincount(terminos_arr, minlength=len(self.vocabulario))
+        self.inicio = np.concatenate([[0], np.cumsum(df)])
+
+        longitudes_arr = np.asarray(longitudes, dtype=np.float32)
+        promedio = float(longitudes_arr.mean()) if self.n_docs else 0.0
+        # Denominador constante por documento: k1 * (1 - b + b * dl / avgdl)
+        self.norma = k1 * (1 - b + b * longitudes_arr / max(promedio, 1e-9))
+        self.idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def puntuar(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(posiciones de chunks candidatos, score BM25) para los tokens de la consulta."""
+        ids = sorted({self.vocabulario[t] for t in tokens if t in self.vocabulario})
+        if not ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        docs = np.concatenate([self.docs[self.inicio[j]:self.inicio[j + 1]] for j in ids])
+        tfs = np.concatenate([self.tfs[self.inicio[j]:self.inicio[j + 1]] for j in ids])
+        idf = np.concatenate([np.full(self.inicio[j + 1] - self.inicio[j], self.idf[j]) for j in ids])
+        aportes = idf * tfs * (self.k1 + 1) / (tfs + self.norma[docs])
+
+        candidatos, inversa = np.unique(docs, return_inverse=True)
+        return candidatos, np.bincount(inversa, weights=aportes).astype(np.float32)
@@ -1,53 +1,130 @@
 # src/business_rules.py
+import hashlib
+import json
 from math import ceil
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Súbelo cuando cambie la lógica de cálculo (no solo los parámetros)
+VERSION_REGLAS = "2025.1"
+
+# Parámetros de la tarifa (única fuente de verdad para el cálculo escalar y el vectorizado).
+# Los escenarios de simulación sobrescriben estas claves.
+PARAMETROS_TARIFA: Dict[str, float] = {
+    "tarifa_auto_particular": 600_000,
+    "tarifa_taxi": 750_000,
+    "tarifa_bus": 900_000,
+    "tarifa_camion": 1_000_000,
+    "tarifa_moto_menor_100": 400_000,
+    "tarifa_moto_100_200": 500_000,
+    "tarifa_moto_mayor_200": 600_000,
+    "tarifa_otro": 600_000,
+    "factor_edad_menor_25": 1.20,
+    "factor_edad_25_60": 1.00,
+    "factor_edad_mayor_60": 1.10,
+    "factor_siniestros_0": 1.00,
+    "factor_siniestros_1": 1.10,
+    "factor_siniestros_2": 1.25,
+    "factor_siniestros_3_mas": 1.50,
+    "factor_zona_baja": 0.95,
+    "factor_zona_media": 1.00,
+    "factor_zona_alta": 1.15,
+    "factor_zona_otra": 1.00,
+    "factor_historial_0": 1.00,
+    "factor_historial_1": 0.98,
+    "factor_historial_2": 0.96,
+    "factor_historial_3_mas": 0.93,
+    "limite_min_factor": 0.7,
+    "limite_max_factor": 2.5,
+}
+
+# Orden de los códigos de cada grupo de factores (ver codificar_portafolio)
+GRUPOS_TARIFA: Dict[str, List[str]] = {
+    "tarifa": [
+        "tarifa_auto_particular",
+        "tarifa_taxi",
+        "tarifa_bus",
+        "tarifa_camion",
+        "tarifa_moto_menor_100",
+        "tarifa_moto_100_200",
+        "tarifa_moto_mayor_200",
+        "tarifa_otro",
+    ],
+    "edad": ["factor_edad_menor_25", "factor_edad_25_60", "factor_edad_mayor_60"],
+    "siniestros": [
+        "factor_siniestros_0",
+        "factor_siniestros_1",
+        "factor_siniestros_2",
+        "factor_siniestros_3_mas",
+    ],
+    "zona": ["factor_zona_baja", "factor_zona_media", "factor_zona_alta", "factor_zona_otra"],
+    "historial": [
+        "factor_historial_0",
+        "factor_historial_1",
+        "factor_historial_2",
+        "factor_historial_3_mas",
+    ],
+}
+
+
+def version_reglas() -> str:
+    """Huella de la lógica + parámetros vigentes; cambia si cualquiera de los dos cambia."""
+    contenido = VERSION_REGLAS + json.dumps(PARAMETROS_TARIFA, sort_keys=True)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:12]
+
 
 def tarifa_base(tipo_vehiculo: str, cilindraje: int) -> int:
     if tipo_vehiculo == "auto_particular":
-        return 600_000
+        return PARAMETROS_TARIFA["tarifa_auto_particular"]
     if tipo_vehiculo == "taxi":
-        return 750_000
+        return PARAMETROS_TARIFA["tarifa_taxi"]
     if tipo_vehiculo == "bus":
-        return 900_000
+        return PARAMETROS_TARIFA["tarifa_bus"]
     if tipo_vehiculo == "camion":
-        return 1_000_000
+        return PARAMETROS_TARIFA["tarifa_camion"]
     if tipo_vehiculo == "moto":
         if cilindraje < 100:
-            return 400_000
+            return PARAMETROS_TARIFA["tarifa_moto_menor_100"]
         elif 100 <= cilindraje <= 200:
-            return 500_000
+            return PARAMETROS_TARIFA["tarifa_moto_100_200"]
         else:
-            return 600_000
+            return PARAMETROS_TARIFA["tarifa_moto_mayor_200"]
     # fallback
-    return 600_000
+    return PARAMETROS_TARIFA["tarifa_otro"]
 
 def factor_edad(edad: int) -> float:
     if edad < 25:
-        return 1.20
+        return PARAMETROS_TARIFA["factor_edad_menor_25"]
     if edad <= 60:
-        return 1.00
-    return 1.10
+        return PARAMETROS_TARIFA["factor_edad_25_60"]
+    return PARAMETROS_TARIFA["factor_edad_mayor_60"]
 
 def factor_siniestros(numero_siniestros_12m: int) -> float:
     if numero_siniestros_12m == 0:
-        return 1.00
+        return PARAMETROS_TARIFA["factor_siniestros_0"]
     if numero_siniestros_12m == 1:
-        return 1.10
+        return PARAMETROS_TARIFA["factor_siniestros_1"]
     if numero_siniestros_12m == 2:
-        return 1.25
-    return 1.50  # 3 o más
+        return PARAMETROS_TARIFA["factor_siniestros_2"]
+    return PARAMETROS_TARIFA["factor_siniestros_3_mas"]  # 3 o más
 
 def factor_zona(zona_riesgo: str) -> float:
-    mapping = {"baja": 0.95, "media": 1.00, "alta": 1.15}
-    return mapping.get(zona_riesgo, 1.00)
+    mapping = {
+        "baja": PARAMETROS_TARIFA["factor_zona_baja"],
+        "media": PARAMETROS_TARIFA["factor_zona_media"],
+        "alta": PARAMETROS_TARIFA["factor_zona_alta"],
+    }
+    return mapping.get(zona_riesgo, PARAMETROS_TARIFA["factor_zona_otra"])
 
 def factor_historial(anios_sin_siniestros: int) -> float:
     if anios_sin_siniestros <= 0:
-        return 1.00
+        return PARAMETROS_TARIFA["factor_historial_0"]
     if anios_sin_siniestros == 1:
-        return 0.98
+        return PARAMETROS_TARIFA["factor_historial_1"]
     if anios_sin_siniestros == 2:
-        return 0.96
-    return 0.93  # 3 o más
+        return PARAMETROS_TARIFA["factor_historial_2"]
+    return PARAMETROS_TARIFA["factor_historial_3_mas"]  # 3 o más
 
 def calcular_soat_estimado(
     tipo_vehiculo: str,
@@ -73,8 +150,8 @@ def calcular_soat_estimado(
 
     bruto = base * f_edad * f_sin * f_zona * f_hist
 
-    minimo = base * 0.7
-    maximo = base * 2.5
+    minimo = base * PARAMETROS_TARIFA["limite_min_factor"]
+    maximo = base * PARAMETROS_TARIFA["limite_max_factor"]
 
     ajustado = max(minimo, min(maximo, bruto))
     estimado = int(ceil(ajustado / 1000.0) * 1000)
@@ -91,3 +168,105 @@ def calcular_soat_estimado(
         "limite_max": maximo,
         "valor_ajustado": ajustado,
     }
+
+
+# -----------------------
+# Versión vectorizada (portafolio completo)
+# -----------------------
+
+def validar_factores(factores: Dict[str, float]) -> Dict[str, float]:
+    """Valida un dict de overrides sobre PARAMETROS_TARIFA y devuelve los parámetros completos."""
+    if factores is not None and not isinstance(factores, dict):
+        raise ValueError(f"Los factores deben ser un objeto {{parametro: valor}}: {factores!r}")
+    params = dict(PARAMETROS_TARIFA)
+    for nombre, valor in (factores or {}).items():
+        if nombre not in PARAMETROS_TARIFA:
+            raise ValueError(f"Parámetro de tarifa desconocido: {nombre}")
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor <= 0:
+            raise ValueError(f"Valor inválido para {nombre}: {valor!r}")
+        params[nombre] = valor
+    return params
+
+
+def codificar_portafolio(
+    tipo_vehiculo: np.ndarray,
+    cilindraje: np.ndarray,
+    edad_conductor: np.ndarray,
+    numero_siniestros_12m: np.ndarray,
+    zona_riesgo: np.ndarray,
+    anios_sin_siniestros: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Traduce las columnas de entrada a códigos enteros (int8) por grupo de factores,
+    con el mismo orden que GRUPOS_TARIFA y las mismas reglas que las funciones escalares.
+    """
+    tipo = np.asarray(tipo_vehiculo, dtype=object)
+    cil = np.asarray(cilindraje)
+    edad = np.asarray(edad_conductor)
+    n_sin = np.asarray(numero_siniestros_12m)
+    zona = np.asarray(zona_riesgo, dtype=object)
+    anios = np.asarray(anios_sin_siniestros)
+
+    tarifa = np.select(
+        [
+            tipo == "auto_particular",
+            tipo == "taxi",
+            tipo == "bus",
+            tipo == "camion",
+            (tipo == "moto") & (cil < 100),
+            (tipo == "moto") & (cil <= 200),
+            tipo == "moto",
+        ],
+        [0, 1, 2, 3, 4, 5, 6],
+        default=7,
+    )
+    return {
+        "tarifa": tarifa.astype(np.int8),
+        "edad": np.select([edad < 25, edad <= 60], [0, 1], default=2).astype(np.int8),
+        "siniestros": np.select([n_sin == 0, n_sin == 1, n_sin == 2], [0, 1, 2], default=3).astype(np.int8),
+        "zona": np.select([zona == "baja", zona == "media", zona == "alta"], [0, 1, 2], default=3).astype(np.int8),
+        "historial": np.select([anios <= 0, anios == 1, anios == 2], [0, 1, 2], default=3).astype(np.int8),
+    }
+
+
+def tabla_grupo(grupo: str, escenarios: List[Dict[str, float]]) -> np.ndarray:
+    """Matriz (escenarios × códigos) con el valor de cada código del grupo en cada escenario."""
+    claves = GRUPOS_TARIFA[grupo]
+    return np.array([[params[k] for k in claves] for params in escenarios], dtype=np.float64)
+
+
+def calcular_soat_vectorizado(
+    codigos: Dict[str, np.ndarray],
+    params: Optional[Dict[str, float]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Equivalente vectorizado de calcular_soat_estimado sobre los códigos de
+    codificar_portafolio. Devuelve arrays con las mismas claves que la versión escalar.
+    """
+    params = params or PARAMETROS_TARIFA
+    base = tabla_grupo("tarifa", [params])[0][codigos["tarifa"]]
+    f_edad = tabla_grupo("edad", [params])[0][codigos["edad"]]
+    f_sin = tabla_grupo("siniestros", [params])[0][codigos["siniestros"]]
+    f_zona = tabla_grupo("zona", [params])[0][codigos["zona"]]
+    f_hist = tabla_grupo("historial", [params])[0][codigos["historial"]]
+
+    bruto = base * f_edad * f_sin * f_zona * f_hist
+
+    minimo = base * params["limite_min_factor"]
+    maximo = base * params["limite_max_factor"]
+
+    ajustado = np.maximum(minimo, np.minimum(maximo, bruto))
+    estimado = (np.ceil(ajustado / 1000.0) * 1000).astype(np.int64)
+
+    return {
+        "valor_estimado": estimado,
+        "tarifa_base": base,
+        "factor_edad": f_edad,
+        "factor_siniestros": f_sin,
+        "factor_zona": f_zona,
+        "factor_historial": f_hist,
+        "valor_bruto": bruto,
+        "limite_min": minimo,
+        "limite_max": maximo,
+        "valor_ajustado": ajustado,
+    }
@@ -10,11 +10,95 @@ DATASETS_DIR = DATA_DIR / "datasets"
 OUTPUT_DIR = BASE_DIR / "outputs"
 REPORTS_DIR = OUTPUT_DIR / "reports"
 LOGS_DIR = OUTPUT_DIR / "logs"
+REPRICING_DIR = OUTPUT_DIR / "repricing"
+CACHE_DIR = OUTPUT_DIR / "cache"
 
 # Modelo de Ollama que tengas descargado (ajusta si usas otro)
 OLLAMA_MODEL = "llama3.1:8b"
 
+# Tipos de acción que el planner puede proponer y el executor ejecuta (ver executor.ACCIONES)
+TIPOS_ACCION = (
+    "load_dataset",
+    "calc_for_plate",
+    "global_stats",
+    "simulate_scenarios",
+    "portfolio_repricing",
+    "expiring_policies",
+    "query",
+)
+
+# Planner: tope de tokens generados (un plan JSON cabe de sobra) y temperatura
+PLANNER_NUM_PREDICT = 384
+PLANNER_TEMPERATURE = 0.0
+
+# Explicación del reasoner: "llm", "plantilla" (determinista, sin modelo) o "auto"
+# (modelo si hay cupo libre; si está saturado o falla, plantilla)
+EXPLICACION_MODO = "auto"
+EXPLICACION_ESPERA_LLM = 2.0   # segundos que "auto" espera un cupo del modelo
+
 # Parámetros de RAG
 CHUNK_SIZE = 1200
 CHUNK_OVERLAP = 200
 TOP_K_DOCS = 5
+RAG_CACHE_SIZE = 256       # consultas (normalizadas) con su top-k en caché LRU
+# Puntuación del RAG: "tfidf", "bm25" o "hibrido" (fusión de BM25 y TF-IDF)
+RAG_SCORER = "hibrido"
+RAG_PESO_BM25 = 0.6        # peso de BM25 en la fusión (TF-IDF pesa 1 - RAG_PESO_BM25)
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Índice de términos: "vocabulario" (TfidfVectorizer) o "hashing" (memoria fija,
+# documentos agregables sin reajuste y guardable con memoria mapeada)
+RAG_INDEX_MODE = "vocabulario"
+RAG_HASH_FEATURES = 2 ** 20
+RAG_INDEX_DIR = CACHE_DIR / "rag"
+
+# Procesamiento por bloques del portafolio completo (filas por bloque)
+REPRICING_CHUNK_SIZE = 200_000
+# Filas marcadas del repricing que se ordenan en memoria; si hay más, se vuelcan a
+# disco en corridas ordenadas que se mezclan al escribir el archivo de diferencias
+REPRICING_MARCADAS_EN_MEMORIA = 500_000
+
+# Ejecución por shards en varios procesos (estadísticas, repricing y consultas);
+# 0 o 1 = un solo proceso. Solo se usa con datasets de al menos SHARDING_MIN_FILAS.
+SHARDING_WORKERS = 0
+SHARDING_POR = "filas"          # "filas" (rangos contiguos) o "ciudad"
+SHARDING_MIN_FILAS = 1_000_000
+
+# Tabla precalculada de cotizaciones por placa (calc_for_plate sin recalcular)
+QUOTE_CACHE_ENABLED = True
+
+# Dataset en un archivo Arrow con memoria mapeada, compartido (solo lectura) entre
+# sesiones y procesos en lugar de una copia por contexto (requiere pyarrow)
+DATASET_SHARED_ENABLED = False
+
+# Servidor HTTP (src/api.py)
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+API_WORKERS = 4            # hilos para trabajo de CPU (cotizaciones, estadísticas, catálogo)
+API_LLM_WORKERS = 4        # hilos para peticiones que llaman al modelo (/plan, /report)
+API_LLM_CONCURRENCY = 1    # llamadas simultáneas a Ollama
+
+# Traza de ejecución (src/trace.py)
+TRACE_BUFFER_SIZE = 1000      # eventos retenidos por contexto (buffer circular)
+TRACE_RESUMEN_N = 20          # primeros/últimos eventos que se muestran en el reporte
+TRACE_STDOUT_NIVEL = "INFO"   # nivel mínimo que se imprime en consola
+TRACE_JSONL_ENABLED = True    # todos los eventos a LOGS_DIR/traza_AAAAMMDD.jsonl
+
+# Persistencia de reportes (src/reporter.py): "sincrona" (se escribe antes de responder),
+# "asincrona" (en lotes desde un hilo en segundo plano) o "ninguna" (solo en memoria)
+REPORTES_PERSISTENCIA = "sincrona"
+REPORTES_LOTE = 32            # reportes por lote de escritura en modo asíncrono
+
+# Catálogo de reportes (src/report_catalog.py)
+CATALOGO_REPORTES_ENABLED = True
+CATALOGO_REPORTES_DB = REPORTS_DIR / "catalogo.sqlite"
+CATALOGO_RETENCION_DIAS = 90  # reportes más viejos se archivan en .zip mensuales
+
+# Evaluación por lotes (src/evaluator.py): procesos; 0 o 1 = en el proceso actual
+EVALUADOR_WORKERS = 0
+
+# Interfaz Streamlit (app.py)
+APP_HISTORIAL_VISIBLE = 20       # mensajes recientes que siempre se dibujan
+APP_HISTORIAL_PAGINA = 20        # mensajes por página al revisar los anteriores
+APP_MAX_MENSAJES = 500           # tope del historial por sesión (se descartan los más viejos)
+APP_MAX_CHARS_MENSAJE = 20_000   # tope de texto guardado por mensaje
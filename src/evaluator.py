@@ -1,34 +1,250 @@
+# src/evaluator.py
+"""
+Evaluación de reportes del agente.
+
+    python -m src.evaluator                       # todos los .md de outputs/reports
+    python -m src.evaluator ruta1.md ruta2.md --workers 4 --json metricas.json
+
+Sobre cada reporte (en memoria o un .md ya escrito) se verifica la estructura
+(secciones presentes) y se hacen dos chequeos cuantitativos baratos: que las citas
+[Fuente i] de la explicación existan en la evidencia recuperada y que los montos en
+COP de la explicación salgan de los datos (cálculo individual y resultados del plan).
+evaluar_lote evalúa muchos reportes (en paralelo si se pide) y agrega las métricas.
+"""
+import argparse
+import json
+import multiprocessing
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, Iterable, List, Union
+
+import numpy as np
+
+from .config import EVALUADOR_WORKERS, REPORTS_DIR
+from .reporter import Reporte, reporte_desde_markdown, secciones_markdown, titulo
+
+# Secciones que suman un punto cada una (puntaje sobre 5)
+SECCIONES_PUNTAJE = ("explicacion", "evidencia", "calculo", "estadisticas", "traza")
+
+_CITA = re.compile(r"\[Fuente (\d+)")
+# Montos: 1,582,000 / 1.582.000 / 1582000 seguidos de COP o pesos (los decimales se ignoran)
+_MONTO = re.compile(r"(\d{1,3}(?:[.,]\d{3})+|\d+)(?:[.,]\d+)?\s*(?:COP|pesos)", re.IGNORECASE)
+_NUMERO = re.compile(r"-?\d+(?:\.\d+)?(?:e[+-]?\d+)?")
+_ESCALAR = re.compile(r"^\w+: (-?\d+(?:\.\d+)?(?:e[+-]?\d+)?)$", re.MULTILINE)
+
+# Diferencia relativa admitida entre un monto citado y el dato (redondeos al redactar)
+TOLERANCIA_CIFRAS = 0.005
+# Listas de un resultado cuyos elementos cuentan como cifras verificables (p. ej. escenarios)
+MAX_LISTA_CIFRAS = 10
+
+
+def verificar_citas(explicacion: str, rag_evidence: List[Dict]) -> Dict[str, Any]:
+    """Citas [Fuente i] de la explicación y cuáles no corresponden a ninguna evidencia."""
+    citas = [int(i) for i in _CITA.findall(explicacion)]
+    invalidas = sorted({i for i in citas if not 1 <= i <= len(rag_evidence)})
+    return {
+        "total": len(citas),
+        "distintas": len(set(citas)),
+        "invalidas": invalidas,
+        "n_invalidas": sum(1 for i in citas if i in invalidas),
+    }
+
+
+def _montos(texto: str) -> List[int]:
+    return [int(re.sub(r"[.,]", "", m)) for m in _MONTO.findall(texto)]
+
 
+def _numeros(valor: Any) -> List[float]:
+    """Números escalares de un valor (se ignoran bool, texto y estructuras)."""
+    if isinstance(valor, (int, float, np.integer, np.floating)) and not isinstance(valor, (bool, np.bool_)):
+        return [abs(float(valor))] if np.isfinite(valor) else []
+    return []
 
-def simple_evaluate_report(report_path: Path) -> dict:
+
+def _cifras_conocidas(reporte: Reporte, cuerpos: Dict[str, str]) -> np.ndarray:
     """
-    Evalúa de forma muy básica la estructura del reporte:
-    - presencia de secciones clave
-    - longitud del contenido
+    Cifras contra las que se verifican los montos (ordenadas, para búsqueda binaria):
+    el cálculo individual (más la diferencia con el valor actual), las estadísticas por
+    tipo y los totales de cada acción del plan (escalares de primer nivel y de listas
+    cortas como escenarios o mayores diferencias). Las filas de consultas, tablas por
+    segmento y demás detalle no cuentan: cualquier monto coincidiría con alguna.
     """
-    text = report_path.read_text(encoding="utf-8")
-    score = 0
-    feedback = []
+    conocidas: List[float] = []
+    calc = reporte.calc_result or {}
+    for v in calc.values():
+        conocidas += _numeros(v)
+    if isinstance(calc.get("valor_estimado"), (int, float)) and isinstance(calc.get("valor_soat_actual"), (int, float)):
+        conocidas.append(float(abs(calc["valor_estimado"] - calc["valor_soat_actual"])))
+
+    stats = reporte.global_stats
+    if stats:
+        for v in stats.values():
+            if hasattr(v, "select_dtypes"):
+                conocidas += np.abs(v.select_dtypes("number").to_numpy(dtype=np.float64)).ravel().tolist()
+            else:
+                conocidas += _numeros(v)
+    else:
+        # Reporte leído de disco: la sección es la tabla corta de estadísticas por tipo
+        conocidas += [abs(float(n)) for n in _NUMERO.findall(cuerpos.get(titulo("estadisticas"), ""))]
+
+    otros = reporte.otros_resultados or {}
+    if any(isinstance(r, dict) for r in otros.values()):
+        for resultado in otros.values():
+            for v in (resultado or {}).values() if isinstance(resultado, dict) else []:
+                if isinstance(v, list) and len(v) <= MAX_LISTA_CIFRAS:
+                    for item in v:
+                        for x in item.values() if isinstance(item, dict) else [item]:
+                            conocidas += _numeros(x)
+                else:
+                    conocidas += _numeros(v)
+    else:
+        # Reporte leído de disco: solo las líneas "clave: número" (totales de cada acción)
+        conocidas += [abs(float(n)) for n in _ESCALAR.findall(cuerpos.get(titulo("otros"), ""))]
+
+    arr = np.asarray(conocidas, dtype=np.float64)
+    return np.unique(arr[np.isfinite(arr)])
+
+
+def verificar_cifras(reporte: Reporte, cuerpos: Dict[str, str]) -> Dict[str, Any]:
+    """Montos en COP de la explicación que no coinciden con ningún dato del reporte."""
+    montos = _montos(reporte.explanation_text)
+    conocidas = _cifras_conocidas(reporte, cuerpos)
+    no_coinciden = montos
+    if len(montos) and len(conocidas):
+        # Con tolerancia relativa al dato basta mirar el vecino inmediato de cada lado
+        m = np.asarray(montos, dtype=np.float64)
+        i = np.searchsorted(conocidas, m)
+        coincide = np.zeros(len(m), dtype=bool)
+        for vecino in (np.clip(i - 1, 0, len(conocidas) - 1), np.clip(i, 0, len(conocidas) - 1)):
+            c = conocidas[vecino]
+            coincide |= np.abs(m - c) <= TOLERANCIA_CIFRAS * np.maximum(np.abs(c), 1.0)
+        no_coinciden = [monto for monto, ok in zip(montos, coincide) if not ok]
+    return {"total": len(montos), "no_coinciden": no_coinciden, "n_no_coinciden": len(no_coinciden)}
+
+
+def evaluar_reporte(reporte: Reporte) -> Dict[str, Any]:
+    """
+    Evaluación de un reporte estructurado:
+    - score: secciones clave presentes (0 a 5)
+    - citas: [Fuente i] que no existen en la evidencia
+    - cifras: montos de la explicación que no salen de los datos
+    - feedback: observaciones en texto
+    """
+    cuerpos = secciones_markdown(reporte.markdown)
+    faltantes = [clave for clave in SECCIONES_PUNTAJE if titulo(clave) not in cuerpos]
+    score = len(SECCIONES_PUNTAJE) - len(faltantes)
+    citas = verificar_citas(reporte.explanation_text, reporte.rag_evidence)
+    cifras = verificar_cifras(reporte, cuerpos)
 
-    # Chequeo de secciones esperadas
-    if "## 2. Explicación del agente" in text:
-        score += 1
-    if "## 3. Evidencia documental (RAG)" in text:
-        score += 1
-    if "## 4. Resultado de cálculo individual (debug)" in text:
-        score += 1
-    if "## 5. Estadísticas generales (debug)" in text:
-        score += 1
-    if "## 6. Trazabilidad de acciones" in text:
-        score += 1
-
-    # Comentario sobre longitud
-    if len(text) < 800:
+    feedback = []
+    if faltantes:
+        feedback.append("Faltan secciones: " + ", ".join(titulo(c) for c in faltantes) + ".")
+    if len(reporte.markdown) < 800:
         feedback.append(
             "El reporte es relativamente corto; podrías ampliar la explicación o el análisis."
         )
     else:
         feedback.append("La longitud del reporte es adecuada para la sustentación.")
+    if citas["invalidas"]:
+        feedback.append(
+            f"La explicación cita fuentes que no están en la evidencia: {citas['invalidas']} "
+            f"(hay {len(reporte.rag_evidence)})."
+        )
+    elif reporte.rag_evidence and not citas["total"]:
+        feedback.append("La explicación no cita ninguna fuente del manual.")
+    if cifras["no_coinciden"]:
+        feedback.append(
+            f"Montos en la explicación que no aparecen en los datos: {cifras['no_coinciden'][:5]}."
+        )
+
+    return {
+        "score": score,
+        "feedback": feedback,
+        "secciones_faltantes": faltantes,
+        "citas": citas,
+        "cifras": cifras,
+    }
+
+
+def simple_evaluate_report(report: Union[Reporte, Path]) -> dict:
+    """Evalúa un reporte en memoria o un .md en disco (ver evaluar_reporte)."""
+    if not isinstance(report, Reporte):
+        report = reporte_desde_markdown(Path(report))
+    return evaluar_reporte(report)
+
+
+def _evaluar_item(item: Union[Reporte, Path, str]) -> Dict[str, Any]:
+    reporte = item if isinstance(item, Reporte) else reporte_desde_markdown(Path(item))
+    resultado = evaluar_reporte(reporte)
+    resultado["nombre"] = reporte.nombre
+    return resultado
+
+
+def agregar_metricas(resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Métricas de calidad del lote a partir de las evaluaciones individuales."""
+    n = len(resultados)
+    citas = sum(r["citas"]["total"] for r in resultados)
+    citas_invalidas = sum(r["citas"]["n_invalidas"] for r in resultados)
+    cifras = sum(r["cifras"]["total"] for r in resultados)
+    cifras_mal = sum(r["cifras"]["n_no_coinciden"] for r in resultados)
+    return {
+        "n_reportes": n,
+        "score_promedio": sum(r["score"] for r in resultados) / n if n else 0.0,
+        "distribucion_score": dict(sorted(Counter(r["score"] for r in resultados).items())),
+        "tasa_estructura_completa": sum(1 for r in resultados if not r["secciones_faltantes"]) / n if n else 0.0,
+        "secciones_faltantes": dict(Counter(c for r in resultados for c in r["secciones_faltantes"])),
+        "citas_total": citas,
+        "citas_invalidas": citas_invalidas,
+        "tasa_citas_validas": 1 - citas_invalidas / citas if citas else None,
+        "reportes_sin_citas": sum(1 for r in resultados if not r["citas"]["total"]),
+        "reportes_con_citas_invalidas": sum(1 for r in resultados if r["citas"]["n_invalidas"]),
+        "cifras_total": cifras,
+        "cifras_no_coinciden": cifras_mal,
+        "tasa_cifras_verificadas": 1 - cifras_mal / cifras if cifras else None,
+        "reportes_con_cifras_no_verificadas": sum(1 for r in resultados if r["cifras"]["n_no_coinciden"]),
+    }
+
+
+def evaluar_lote(
+    reportes: Iterable[Union[Reporte, Path, str]],
+    workers: int = EVALUADOR_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Evalúa un lote de reportes (objetos en memoria o rutas .md) y devuelve
+    {"reportes": [evaluación por reporte], "agregado": métricas del lote}.
+    Con workers > 1 se reparte en un pool de procesos, en bloques.
+    """
+    items = list(reportes)
+    inicio = time.perf_counter()
+    if workers > 1 and len(items) > 1:
+        bloque = max(1, len(items) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            resultados = list(pool.map(_evaluar_item, items, chunksize=bloque))
+    else:
+        resultados = [_evaluar_item(item) for item in items]
+    agregado = agregar_metricas(resultados)
+    agregado["segundos"] = round(time.perf_counter() - inicio, 3)
+    return {"reportes": resultados, "agregado": agregado}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluación por lotes de reportes del agente SOAT.")
+    parser.add_argument("rutas", nargs="*", help="Archivos .md (por defecto, todos los de outputs/reports).")
+    parser.add_argument("--workers", type=int, default=EVALUADOR_WORKERS)
+    parser.add_argument("--json", help="Ruta donde guardar las evaluaciones y métricas en JSON.")
+    args = parser.parse_args()
+
+    rutas = [Path(r) for r in args.rutas] or sorted(REPORTS_DIR.glob("reporte_soat_*.md"))
+    resultado = evaluar_lote(rutas, workers=args.workers)
+    for clave, valor in resultado["agregado"].items():
+        print(f"{clave}: {valor}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[OK] Evaluaciones en {args.json}")
+
 
-    return {"score": score, "feedback": feedback}
\ No newline at end of file
+if __name__ == "__main__":
+    main()
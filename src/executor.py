@@ -1,41 +1,117 @@
 # src/executor.py
 from dataclasses import dataclass, field
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 import pandas as pd
 
-from .config import DATASETS_DIR
+from .config import (
+    DATASETS_DIR,
+    REPRICING_CHUNK_SIZE,
+    QUOTE_CACHE_ENABLED,
+    DATASET_SHARED_ENABLED,
+    SHARDING_WORKERS,
+    SHARDING_POR,
+    SHARDING_MIN_FILAS,
+    TIPOS_ACCION,
+)
 from .business_rules import calcular_soat_estimado
+from .simulator import simular_escenarios_portafolio
+from .repricing import repricing_por_bloques, validar_parametros
+from .indices import IndiceFechas, normalizar_categoria
+from .query import LIMITE_DEFECTO, LIMITE_MAXIMO, validar_consulta, ejecutar_consulta
+from .quote_cache import CacheCotizaciones, version_dataset
+from .shared_dataset import dataset_compartido, ruta_compartida
+from .trace import Traza
+from . import sharding
 
 @dataclass
 class ExecutionContext:
     dataset: Optional[pd.DataFrame] = None
     dataset_path: Optional[Path] = None
+    # Versión del archivo (quote_cache.version_dataset) tomada al leer `dataset`
+    dataset_version: Optional[str] = None
+    # Archivo Arrow que respalda `dataset` (None si está en memoria privada)
+    dataset_arrow: Optional[Path] = None
     artifacts: list = field(default_factory=list)
-    logs: list = field(default_factory=list)
+    # Traza acotada (buffer circular + contadores); se imprime y guarda de forma asíncrona
+    traza: Traza = field(default_factory=Traza)
+    # Índices construidos bajo demanda sobre el dataset (se invalidan al recargarlo)
+    indices: dict = field(default_factory=dict)
 
-    def log(self, msg: str):
-        print(msg)
-        self.logs.append(msg)
+    @property
+    def logs(self) -> List[str]:
+        """Mensajes de los eventos más recientes de la traza."""
+        return self.traza.mensajes()
+
+    def log(self, msg: str, nivel: Optional[str] = None, tipo: str = "log", **datos):
+        if nivel is None:
+            nivel = "WARN" if msg.startswith("[WARN]") else "ERROR" if msg.startswith("[ERROR]") else "INFO"
+        self.traza.evento(msg, nivel=nivel, tipo=tipo, **datos)
 
 def load_dataset(ctx: ExecutionContext, filename: str = "vehiculos_soat.csv"):
     path = DATASETS_DIR / filename
-    ctx.dataset = pd.read_csv(path)
+    # La versión se toma antes de leer: si el archivo cambia durante la lectura, la
+    # próxima carga verá otra versión y reconstruirá lo que dependa de ella
+    version = version_dataset(path)
+    if ctx.dataset is not None and ctx.dataset_path == path and ctx.dataset_version == version:
+        # Contextos con el dataset precargado (p. ej. el servidor HTTP) no lo releen
+        # mientras el archivo no cambie
+        ctx.log(f"Dataset ya cargado desde: {path}", tipo="dataset")
+        return
+    df = dataset_compartido(path, ctx.log, version) if DATASET_SHARED_ENABLED else None
+    ctx.dataset = df if df is not None else pd.read_csv(path)
     ctx.dataset_path = path
-    ctx.log(f"Dataset cargado desde: {path}")
+    ctx.dataset_version = version
+    ctx.dataset_arrow = ruta_compartida(path, version) if df is not None else None
+    ctx.indices = {}
+    ctx.log(
+        f"Dataset cargado desde: {path}" + (" (memoria compartida)" if df is not None else ""),
+        tipo="dataset",
+        filas=len(ctx.dataset),
+    )
 
 def buscar_por_placa(ctx: ExecutionContext, placa: str) -> Optional[pd.Series]:
     if ctx.dataset is None:
         raise RuntimeError("Dataset no cargado.")
     fila = ctx.dataset[ctx.dataset["placa"] == placa]
     if fila.empty:
-        ctx.log(f"No se encontró la placa {placa} en el dataset.")
+        ctx.log(f"No se encontró la placa {placa} en el dataset.", nivel="WARN", tipo="placa_no_encontrada", placa=placa)
         return None
-    ctx.log(f"Se encontró registro para la placa {placa}.")
+    ctx.log(f"Se encontró registro para la placa {placa}.", nivel="DEBUG", tipo="placa", placa=placa)
     return fila.iloc[0]
 
+def cache_cotizaciones(ctx: ExecutionContext) -> Optional[CacheCotizaciones]:
+    """Tabla de cotizaciones precalculadas del dataset cargado (None si no aplica)."""
+    if not QUOTE_CACHE_ENABLED or ctx.dataset is None or ctx.dataset_path is None or ctx.dataset_version is None:
+        return None
+    if "cotizaciones" not in ctx.indices:
+        cache = CacheCotizaciones.cargar_o_construir(ctx.dataset, ctx.dataset_path, ctx.dataset_version)
+        ctx.indices["cotizaciones"] = cache
+        ctx.log(f"Caché de cotizaciones lista ({len(cache)} placas, versión {cache.clave}).", tipo="indice")
+    return ctx.indices["cotizaciones"]
+
 def calcular_nueva_poliza_para_placa(ctx: ExecutionContext, placa: str) -> Dict[str, Any]:
+    cache = cache_cotizaciones(ctx)
+    if cache is not None:
+        resultado = cache.cotizar(placa)
+        if resultado is None and placa in cache.incompletas:
+            ctx.log(f"[WARN] La placa {placa} tiene datos incompletos en el dataset.", tipo="placa_incompleta", placa=placa)
+            return {"error": f"La placa {placa} tiene datos incompletos en el dataset."}
+        if resultado is None:
+            ctx.log(f"No se encontró la placa {placa} en el dataset.", nivel="WARN", tipo="placa_no_encontrada", placa=placa)
+            return {"error": f"No se encontró la placa {placa}."}
+        ctx.log(
+            f"Cálculo nueva póliza para {placa} (caché): "
+            f"base={resultado['tarifa_base']}, "
+            f"estimado={resultado['valor_estimado']}",
+            nivel="DEBUG",
+            tipo="cotizacion",
+            placa=placa,
+        )
+        return resultado
+
     registro = buscar_por_placa(ctx, placa)
     if registro is None:
         return {"error": f"No se encontró la placa {placa}."}
@@ -59,7 +135,10 @@ def calcular_nueva_poliza_para_placa(ctx: ExecutionContext, placa: str) -> Dict[
     ctx.log(
         f"Cálculo nueva póliza para {placa}: "
         f"base={resultado['tarifa_base']}, "
-        f"estimado={resultado['valor_estimado']}"
+        f"estimado={resultado['valor_estimado']}",
+        nivel="DEBUG",
+        tipo="cotizacion",
+        placa=placa,
     )
 
     resultado["placa"] = placa
@@ -73,16 +152,285 @@ def calcular_nueva_poliza_para_placa(ctx: ExecutionContext, placa: str) -> Dict[
 
     return resultado
 
+def usar_shards(ctx: ExecutionContext) -> bool:
+    """Ejecución por shards activada y dataset suficientemente grande."""
+    return SHARDING_WORKERS > 1 and ctx.dataset is not None and len(ctx.dataset) >= SHARDING_MIN_FILAS
+
+def _por_shards(ctx: ExecutionContext, tarea: str, params: Dict[str, Any]) -> List[Any]:
+    parciales = sharding.ejecutar_por_shards(
+        ctx.dataset, ctx.dataset_arrow, tarea, params, workers=SHARDING_WORKERS, por=SHARDING_POR
+    )
+    ctx.log(
+        f"Acción '{tarea}' ejecutada en {len(parciales)} shards ({SHARDING_WORKERS} procesos, por {SHARDING_POR}).",
+        tipo="shards",
+    )
+    return parciales
+
 def estadisticas_generales(ctx: ExecutionContext) -> Dict[str, Any]:
     if ctx.dataset is None:
         raise RuntimeError("Dataset no cargado.")
+    if usar_shards(ctx):
+        stats = sharding.combinar_estadisticas(_por_shards(ctx, "estadisticas", {}))
+        ctx.log("Calculadas estadísticas generales del portafolio SOAT.", tipo="estadisticas")
+        return stats
     df = ctx.dataset
 
     stats_por_tipo = df.groupby("tipo_vehiculo")["valor_soat_actual"].agg(["count", "mean", "min", "max"])
     porcentaje_con_siniestros = (df[df["numero_siniestros_12m"] > 0].shape[0] / len(df)) * 100
 
-    ctx.log("Calculadas estadísticas generales del portafolio SOAT.")
+    ctx.log("Calculadas estadísticas generales del portafolio SOAT.", tipo="estadisticas")
     return {
         "stats_por_tipo": stats_por_tipo,
         "porcentaje_con_siniestros": porcentaje_con_siniestros,
     }
+
+def simular_escenarios(
+    ctx: ExecutionContext,
+    escenarios: List[Dict[str, Any]],
+    segmentos: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Simulación "what-if" de tarifa sobre todo el portafolio.
+    Ver simulator.simular_escenarios_portafolio para el formato de los escenarios.
+    """
+    if ctx.dataset is None:
+        raise RuntimeError("Dataset no cargado.")
+    try:
+        resultado = simular_escenarios_portafolio(ctx.dataset, escenarios, segmentos)
+    except ValueError as e:
+        ctx.log(f"[WARN] Simulación inválida: {e}", tipo="simulacion")
+        return {"error": str(e)}
+
+    ctx.log(
+        f"Simulados {resultado['n_escenarios']} escenarios sobre "
+        f"{resultado['n_polizas']} pólizas ({resultado['n_combinaciones']} combinaciones de factores).",
+        tipo="simulacion",
+    )
+    return resultado
+
+def repricing_portafolio(
+    ctx: ExecutionContext,
+    umbral: float = 0.10,
+    formato: str = "csv",
+    chunk_size: int = REPRICING_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Repricing de todo el portafolio: estimado vs. valor actual por póliza.
+    Si el dataset no está cargado en memoria, se lee el CSV por bloques.
+    """
+    try:
+        validar_parametros(umbral, formato)
+    except ValueError as e:
+        ctx.log(f"[WARN] Repricing inválido: {e}", tipo="repricing")
+        return {"error": str(e)}
+
+    if ctx.dataset is not None:
+        df = ctx.dataset
+        chunks = (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    else:
+        path = ctx.dataset_path or DATASETS_DIR / "vehiculos_soat.csv"
+        ctx.log(f"Repricing leyendo {path} por bloques de {chunk_size} filas.", tipo="repricing")
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+
+    try:
+        if usar_shards(ctx):
+            params = {"umbral": umbral, "chunk_size": chunk_size}
+            resultado = sharding.combinar_repricing(_por_shards(ctx, "repricing", params), umbral, formato, ctx.log)
+        else:
+            resultado = repricing_por_bloques(chunks, umbral=umbral, formato=formato, log=ctx.log)
+    except ValueError as e:
+        ctx.log(f"[WARN] Repricing inválido: {e}", tipo="repricing")
+        return {"error": str(e)}
+
+    ctx.log(
+        f"Repricing de {resultado['n_polizas']} pólizas: "
+        f"{resultado['n_subvaloradas']} subvaloradas, {resultado['n_sobrevaloradas']} sobrevaloradas "
+        f"(umbral {resultado['umbral_pct']:.1f}%). Diferencias en {resultado['archivo']}",
+        tipo="repricing",
+    )
+    return resultado
+
+def indice_vencimientos(ctx: ExecutionContext) -> IndiceFechas:
+    if ctx.dataset is None:
+        raise RuntimeError("Dataset no cargado.")
+    if "fecha_vencimiento" not in ctx.indices:
+        ctx.indices["fecha_vencimiento"] = IndiceFechas(ctx.dataset["fecha_vencimiento"])
+        ctx.log("Construido índice ordenado sobre fecha_vencimiento.", tipo="indice")
+    return ctx.indices["fecha_vencimiento"]
+
+def consultar_vencimientos(
+    ctx: ExecutionContext,
+    dias: int = 30,
+    ciudad: Optional[str] = None,
+    zona_riesgo: Optional[str] = None,
+    tipo_vehiculo: Optional[str] = None,
+    fecha_referencia: Optional[str] = None,
+    limite: int = LIMITE_DEFECTO,
+) -> Dict[str, Any]:
+    """
+    Pólizas que vencen en los próximos `dias` a partir de fecha_referencia (hoy por defecto),
+    opcionalmente filtradas por ciudad, zona de riesgo y tipo de vehículo. Se listan hasta
+    `limite` pólizas (el total y los agregados cubren todas).
+    """
+    indice = indice_vencimientos(ctx)
+    desde = pd.Timestamp(date.today())
+    if fecha_referencia:
+        try:
+            desde = pd.Timestamp(fecha_referencia)
+        except (ValueError, TypeError, OverflowError):
+            desde = pd.NaT
+        if pd.isna(desde):
+            ctx.log(f"[WARN] fecha_referencia inválida: {fecha_referencia!r}", tipo="vencimientos")
+            return {"error": f"fecha_referencia inválida: {fecha_referencia!r} (se espera AAAA-MM-DD)."}
+    hasta = desde + timedelta(days=int(dias))
+
+    # Búsqueda binaria por fecha; los filtros categóricos solo se aplican a ese rango
+    posiciones = indice.rango(desde, hasta)
+    ventana = ctx.dataset.iloc[posiciones]
+    filtros = {"ciudad": ciudad, "zona_riesgo": zona_riesgo, "tipo_vehiculo": tipo_vehiculo}
+    for columna, valor in filtros.items():
+        if valor:
+            objetivo = normalizar_categoria(valor)
+            # Normalizamos solo los valores distintos, no cada fila
+            coincidentes = [v for v in ventana[columna].unique() if normalizar_categoria(v) == objetivo]
+            ventana = ventana[ventana[columna].isin(coincidentes)]
+
+    total = len(ventana)
+    filtros_activos = {k: v for k, v in filtros.items() if v}
+    ctx.log(
+        f"Vencimientos entre {desde.date()} y {hasta.date()}: {total} pólizas "
+        f"(filtros: {filtros_activos}).",
+        tipo="vencimientos",
+        total=total,
+    )
+
+    polizas = ventana.head(limite)[
+        ["placa", "tipo_vehiculo", "ciudad", "zona_riesgo", "valor_soat_actual", "fecha_vencimiento"]
+    ].to_dict(orient="records")
+    return {
+        "desde": str(desde.date()),
+        "hasta": str(hasta.date()),
+        "filtros": filtros_activos,
+        "total": total,
+        "valor_total_a_renovar": int(ventana["valor_soat_actual"].sum()),
+        "por_ciudad": ventana["ciudad"].value_counts().to_dict(),
+        "polizas": polizas,
+    }
+
+def consultar_dataset(ctx: ExecutionContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Consulta genérica sobre el dataset: filtros estructurados (campo, op, valor),
+    proyección, orden, agrupación y límite. Ver query.validar_consulta.
+    """
+    if ctx.dataset is None:
+        raise RuntimeError("Dataset no cargado.")
+    try:
+        consulta = validar_consulta(params)
+    except ValueError as e:
+        ctx.log(f"[WARN] Consulta inválida: {e}", tipo="consulta")
+        return {"error": str(e)}
+
+    if usar_shards(ctx):
+        resultado = sharding.combinar_consulta(_por_shards(ctx, "consulta", {"consulta": consulta}), consulta)
+    else:
+        resultado = ejecutar_consulta(ctx.dataset, consulta, ctx.indices)
+    ctx.log(
+        f"Consulta con {len(consulta['filtros'])} filtros: {resultado['total']} pólizas coinciden.",
+        tipo="consulta",
+        total=resultado["total"],
+    )
+    return resultado
+
+
+# -----------------------
+# Ejecución del plan
+# -----------------------
+
+def _accion_load_dataset(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    load_dataset(ctx)
+
+def _accion_calc_for_plate(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    placa = params.get("placa")
+    if placa:
+        resultados["calc_result"] = calcular_nueva_poliza_para_placa(ctx, placa)
+    else:
+        ctx.log("[WARN] Acción calc_for_plate sin 'placa' en params.", tipo="plan")
+
+def _accion_global_stats(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    resultados["global_stats"] = estadisticas_generales(ctx)
+
+def _accion_simulate_scenarios(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    escenarios = params.get("escenarios")
+    if not escenarios:
+        ctx.log("[WARN] Acción simulate_scenarios sin 'escenarios' en params.", tipo="plan")
+        return
+    resultados["otros_resultados"]["simulate_scenarios"] = simular_escenarios(
+        ctx, escenarios, params.get("segmentos")
+    )
+
+def _accion_portfolio_repricing(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    resultados["otros_resultados"]["portfolio_repricing"] = repricing_portafolio(
+        ctx,
+        umbral=params.get("umbral", 0.10),
+        formato=params.get("formato", "csv"),
+    )
+
+def _accion_expiring_policies(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    dias = params.get("dias", 30)
+    if isinstance(dias, bool) or not isinstance(dias, int) or dias < 0:
+        ctx.log(f"[WARN] 'dias' inválido en expiring_policies: {dias!r}", tipo="plan")
+        resultados["otros_resultados"]["expiring_policies"] = {
+            "error": f"'dias' inválido: {dias!r} (se espera un entero >= 0)."
+        }
+        return
+    limite = params.get("limite", LIMITE_DEFECTO)
+    if isinstance(limite, bool) or not isinstance(limite, int) or limite < 0:
+        ctx.log(f"[WARN] 'limite' inválido en expiring_policies: {limite!r}; se usa {LIMITE_DEFECTO}.", tipo="plan")
+        limite = LIMITE_DEFECTO
+    resultados["otros_resultados"]["expiring_policies"] = consultar_vencimientos(
+        ctx,
+        dias=dias,
+        ciudad=params.get("ciudad"),
+        zona_riesgo=params.get("zona_riesgo"),
+        tipo_vehiculo=params.get("tipo_vehiculo"),
+        fecha_referencia=params.get("fecha_referencia"),
+        limite=min(limite, LIMITE_MAXIMO),
+    )
+
+def _accion_query(ctx: ExecutionContext, params: Dict[str, Any], resultados: Dict[str, Any]):
+    resultados["otros_resultados"]["query"] = consultar_dataset(ctx, params)
+
+# Registro de acciones soportadas por el executor: type -> handler
+ACCIONES = {
+    "load_dataset": _accion_load_dataset,
+    "calc_for_plate": _accion_calc_for_plate,
+    "global_stats": _accion_global_stats,
+    "simulate_scenarios": _accion_simulate_scenarios,
+    "portfolio_repricing": _accion_portfolio_repricing,
+    "expiring_policies": _accion_expiring_policies,
+    "query": _accion_query,
+}
+if set(ACCIONES) != set(TIPOS_ACCION):
+    raise RuntimeError("executor.ACCIONES y config.TIPOS_ACCION deben tener los mismos tipos.")
+
+def ejecutar_plan(ctx: ExecutionContext, actions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Ejecuta en orden las acciones del plan y devuelve un dict con:
+      - calc_result
+      - global_stats
+      - otros_resultados (resultado de las demás acciones, por type)
+    """
+    resultados: Dict[str, Any] = {
+        "calc_result": None,
+        "global_stats": None,
+        "otros_resultados": {},
+    }
+    for action in actions:
+        t = action.get("type")
+        params = action.get("params", {}) or {}
+        handler = ACCIONES.get(t)
+        if handler is None:
+            ctx.log(f"[WARN] Acción no soportada: {t}", tipo="plan")
+            continue
+        handler(ctx, params, resultados)
+    return resultados
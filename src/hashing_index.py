@@ -0,0 +1,178 @@
+# src/hashing_index.py
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from .bm25 import analizador_identidad
+
+# Archivos .npy de un índice guardado en disco (matriz CSR + estadísticas)
+ARCHIVOS = ("data", "indices", "indptr", "df", "longitudes")
+# Copia por columnas (CSC) de la matriz; se guarda para mapearla igual que la CSR
+ARCHIVOS_CSC = ("csc_data", "csc_indices", "csc_indptr")
+
+
+class IndiceHashing:
+    """
+    Índice de términos sin vocabulario: cada token se proyecta con HashingVectorizer a
+    una de n_features columnas, así que el modelo ocupa lo mismo (el vector df) sin
+    importar cuántos términos distintos tenga el corpus.
+
+    La matriz de frecuencias (CSR) y el vector df se mantienen por separado y la IDF se
+    deriva de ellos, de modo que agregar documentos es apilar filas y sumar al df, sin
+    reajustar nada. Se puede guardar como arrays .npy y abrir con memoria mapeada para
+    que varios procesos compartan una sola copia.
+
+    Para puntuar se usa una copia CSC (listas de documentos por columna): sacar las
+    columnas de la consulta de la CSR recorre todos los no ceros, de la CSC solo los de
+    esas columnas. Se guarda junto a la CSR, así que un índice abierto con memoria
+    mapeada no la reconstruye en cada proceso; en memoria se construye bajo demanda.
+    """
+
+    def __init__(self, n_features: int, k1: float = 1.5, b: float = 0.75):
+        from scipy import sparse
+
+        self.n_features = n_features
+        self.k1 = k1
+        self.b = b
+        self.matriz = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.longitudes = np.zeros(0, dtype=np.float32)
+        self._normas = None  # normas L2 de las filas TF-IDF, se recalculan al cambiar la IDF
+        self._csc = None     # copia por columnas de `matriz`, se rehace al agregar documentos
+
+    @property
+    def n_docs(self) -> int:
+        return self.matriz.shape[0]
+
+    def _vectorizador(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        # Los documentos ya llegan tokenizados (bm25.tokenizar)
+        return HashingVectorizer(
+            analyzer=analizador_identidad,
+            n_features=self.n_features,
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32,
+        )
+
+    def agregar(self, documentos: List[List[str]]) -> None:
+        """Agrega documentos tokenizados al final del índice."""
+        from scipy import sparse
+
+        if not documentos:
+            return
+        nuevas = self._vectorizador().transform(documentos).tocsr()
+        nuevas.sum_duplicates()
+        self.df += np.bincount(nuevas.indices, minlength=self.n_features).astype(np.int32)
+        self.longitudes = np.concatenate(
+            [self.longitudes, np.asarray(nuevas.sum(axis=1), dtype=np.float32).ravel()]
+        )
+        self.matriz = sparse.vstack([self.matriz, nuevas], format="csr")
+        self._normas = None
+        self._csc = None
+
+    def idf(self) -> np.ndarray:
+        # Misma IDF suavizada que TfidfVectorizer
+        return (np.log((1 + self.n_docs) / (1 + self.df.astype(np.float64))) + 1).astype(np.float32)
+
+    def _columnas(self, tokens: List[str]) -> np.ndarray:
+        return np.unique(self._vectorizador().transform([tokens]).indices)
+
+    def _por_columnas(self):
+        csc = self._csc
+        if csc is None:
+            csc = self._csc = self.matriz.tocsc()
+        return csc
+
+    def puntuar(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(posiciones de documentos candidatos, score BM25), como IndiceBM25.puntuar."""
+        columnas = self._columnas(tokens)
+        if len(columnas) == 0 or self.n_docs == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        sub = self._por_columnas()[:, columnas].tocoo()
+        df = self.df[columnas][sub.col].astype(np.float32)
+        idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+        promedio = max(float(self.longitudes.mean()), 1e-9)
+        norma = self.k1 * (1 - self.b + self.b * self.longitudes[sub.row] / promedio)
+        aportes = idf * sub.data * (self.k1 + 1) / (sub.data + norma)
+
+        candidatos, inversa = np.unique(sub.row, return_inverse=True)
+        return candidatos.astype(np.int32), np.bincount(inversa, weights=aportes).astype(np.float32)
+
+    def coseno(self, candidatos: np.ndarray, tokens: List[str]) -> np.ndarray:
+        """Similitud coseno TF-IDF de la consulta con las filas candidatas."""
+        idf = self.idf()
+        if self._normas is None:
+            filas = np.repeat(np.arange(self.n_docs), np.diff(self.matriz.indptr))
+            ponderada = self.matriz.data * idf[self.matriz.indices]
+            self._normas = np.sqrt(
+                np.bincount(filas, weights=ponderada ** 2, minlength=self.n_docs)
+            ).astype(np.float32)
+
+        consulta = self._vectorizador().transform([tokens]).tocsr()
+        # Como en TfidfVectorizer, los términos que no aparecen en el corpus no cuentan
+        consulta.data[self.df[consulta.indices] == 0] = 0
+        pesos = consulta.multiply(idf).tocsr()
+        norma_q = float(np.sqrt(pesos.multiply(pesos).sum()))
+        if norma_q == 0:
+            return np.zeros(len(candidatos), dtype=np.float32)
+
+        productos = (self.matriz[candidatos] @ pesos.multiply(idf).T).toarray().ravel()
+        return productos / np.maximum(self._normas[candidatos] * norma_q, 1e-12)
+
+    def guardar(self, directorio: Path) -> None:
+        """Escribe el índice (arrays .npy + meta.json) de forma atómica."""
+        directorio = Path(directorio)
+        directorio.parent.mkdir(parents=True, exist_ok=True)
+        tmp = directorio.parent / f".{directorio.name}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        csc = self._por_columnas()
+        arrays = {
+            "data": self.matriz.data,
+            "indices": self.matriz.indices,
+            "indptr": self.matriz.indptr,
+            "df": self.df,
+            "longitudes": self.longitudes,
+            "csc_data": csc.data,
+            "csc_indices": csc.indices,
+            "csc_indptr": csc.indptr,
+        }
+        for nombre, valores in arrays.items():
+            np.save(tmp / f"{nombre}.npy", np.asarray(valores))
+        meta = {"n_features": self.n_features, "n_docs": self.n_docs, "k1": self.k1, "b": self.b}
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        shutil.rmtree(directorio, ignore_errors=True)
+        os.replace(tmp, directorio)
+
+    @classmethod
+    def cargar(cls, directorio: Path, mmap: bool = True) -> "IndiceHashing":
+        """Abre un índice guardado; con mmap=True los arrays no se copian a memoria."""
+        from scipy import sparse
+
+        directorio = Path(directorio)
+        meta = json.loads((directorio / "meta.json").read_text(encoding="utf-8"))
+        modo = "r" if mmap else None
+        arrays = {nombre: np.load(directorio / f"{nombre}.npy", mmap_mode=modo) for nombre in ARCHIVOS}
+
+        indice = cls(meta["n_features"], k1=meta["k1"], b=meta["b"])
+        forma = (meta["n_docs"], meta["n_features"])
+        indice.matriz = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=forma, copy=False
+        )
+        # Índices guardados antes de incluir la CSC: se construye bajo demanda
+        if all((directorio / f"{nombre}.npy").exists() for nombre in ARCHIVOS_CSC):
+            csc = {nombre: np.load(directorio / f"{nombre}.npy", mmap_mode=modo) for nombre in ARCHIVOS_CSC}
+            indice._csc = sparse.csc_matrix(
+                (csc["csc_data"], csc["csc_indices"], csc["csc_indptr"]), shape=forma, copy=False
+            )
+        # df y longitudes son pequeños y cambian al agregar: se copian
+        indice.df = np.array(arrays["df"])
+        indice.longitudes = np.array(arrays["longitudes"])
+        return indice
@@ -0,0 +1,75 @@
+# src/indices.py
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar_categoria(valor) -> str:
+    """Minúsculas y sin tildes, para comparar valores como 'Medellín' y 'medellin'."""
+    texto = unicodedata.normalize("NFKD", str(valor).strip().lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+class IndiceFechas:
+    """
+    Índice ordenado sobre una columna de fechas (datetime64).
+
+    Guarda las fechas ordenadas y la permutación a posiciones del DataFrame, de modo
+    que una consulta por rango es una búsqueda binaria (np.searchsorted) y no un
+    recorrido completo de la columna.
+    """
+
+    def __init__(self, fechas: pd.Series):
+        valores = pd.to_datetime(fechas, errors="coerce").to_numpy(dtype="datetime64[ns]")
+        # NaT queda al final con argsort, lo excluimos de las búsquedas
+        self.orden = np.argsort(valores, kind="stable")
+        ordenadas = valores[self.orden]
+        self.n_validas = int((~np.isnat(ordenadas)).sum())
+        self.fechas = ordenadas[: self.n_validas]
+
+    def rango(self, desde, hasta) -> np.ndarray:
+        """Posiciones (iloc) de las filas con desde <= fecha <= hasta, ordenadas por fecha."""
+        lo = np.searchsorted(self.fechas, np.datetime64(desde, "ns"), side="left")
+        hi = np.searchsorted(self.fechas, np.datetime64(hasta, "ns"), side="right")
+        return self.orden[lo:hi]
+
+
+class IndiceCategorico:
+    """
+    Índice de bitmaps para una columna categórica: un bitmap empaquetado (1 bit por fila)
+    por cada valor distinto normalizado. Los filtros == / in / != se resuelven combinando
+    bitmaps con operaciones bit a bit, sin volver a comparar strings fila por fila.
+    """
+
+    def __init__(self, valores: pd.Series):
+        self.n_filas = len(valores)
+        codigos, categorias = pd.factorize(valores, use_na_sentinel=True)
+        self.bitmaps = {}
+        for codigo, categoria in enumerate(categorias):
+            clave = normalizar_categoria(categoria)
+            bitmap = np.packbits(codigos == codigo)
+            if clave in self.bitmaps:
+                bitmap = self.bitmaps[clave] | bitmap
+            self.bitmaps[clave] = bitmap
+
+    def vacio(self) -> np.ndarray:
+        return np.zeros((self.n_filas + 7) // 8, dtype=np.uint8)
+
+    def bitmap(self, valor) -> np.ndarray:
+        return self.bitmaps.get(normalizar_categoria(valor), self.vacio())
+
+    def bitmap_de(self, valores) -> np.ndarray:
+        """OR de los bitmaps de varios valores."""
+        resultado = self.vacio()
+        for v in valores:
+            resultado = resultado | self.bitmap(v)
+        return resultado
+
+
+def empaquetar(mascara: np.ndarray) -> np.ndarray:
+    return np.packbits(mascara.astype(bool))
+
+
+def desempaquetar(bitmap: np.ndarray, n_filas: int) -> np.ndarray:
+    return np.unpackbits(bitmap, count=n_filas).astype(bool)
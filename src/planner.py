@@ -1,11 +1,23 @@
 # src/planner.py
 import json
 import re
+import threading
 from typing import List, Dict, Any, Optional
 
-import ollama
+# Solo config: el planner no necesita cargar el executor (pandas, numpy, ...)
+from .config import OLLAMA_MODEL, PLANNER_NUM_PREDICT, PLANNER_TEMPERATURE, TIPOS_ACCION
 
-from .config import OLLAMA_MODEL
+# ollama se importa en la primera llamada al modelo, no al importar el módulo
+# (arranque en frío más rápido para la CLI y los workers)
+ollama = None
+
+
+def _ollama():
+    global ollama
+    if ollama is None:
+        import ollama as cliente
+        ollama = cliente
+    return ollama
 
 
 PLANNER_SYSTEM_PROMPT = """Eres el módulo de PLANIFICACIÓN de un agente cognitivo
@@ -57,6 +69,73 @@ Acciones disponibles (type):
      "analiza el archivo", "estadísticas", "porcentaje con siniestros",
      "promedio por tipo de vehículo", etc.
 
+4) "simulate_scenarios"
+   - Simulación "qué pasaría si" de cambios en la tarifa sobre TODO el portafolio.
+   - params:
+       {
+         "escenarios": [
+           {"nombre": "zona alta 1.20", "factores": {"factor_zona_alta": 1.20}},
+           {"nombre": "sin recargo menores 25", "factores": {"factor_edad_menor_25": 1.00}}
+         ],
+         "segmentos": ["tipo_vehiculo", "zona_riesgo"]
+       }
+   - Parámetros que se pueden modificar en "factores":
+       tarifa_auto_particular, tarifa_taxi, tarifa_bus, tarifa_camion,
+       tarifa_moto_menor_100, tarifa_moto_100_200, tarifa_moto_mayor_200,
+       factor_edad_menor_25, factor_edad_25_60, factor_edad_mayor_60,
+       factor_siniestros_0, factor_siniestros_1, factor_siniestros_2, factor_siniestros_3_mas,
+       factor_zona_baja, factor_zona_media, factor_zona_alta,
+       factor_historial_0, factor_historial_1, factor_historial_2, factor_historial_3_mas,
+       limite_min_factor, limite_max_factor
+   - Segmentos posibles: tipo_vehiculo, zona_riesgo, ciudad, uso_vehiculo, genero_conductor.
+   - Úsala cuando el usuario pregunte qué pasa con los ingresos si cambia un factor o una tarifa.
+
+5) "portfolio_repricing"
+   - Compara el valor estimado con el valor actual de TODAS las pólizas y marca las
+     subvaloradas / sobrevaloradas por encima de un umbral.
+   - params: { "umbral": 0.10, "formato": "csv" }
+   - "umbral" es una fracción entre 0 y 1 (0.10 = 10 %); "formato" es "csv" o "parquet".
+   - Úsala cuando el usuario pida revisar precios del portafolio, pólizas mal tarifadas,
+     subvaloradas o sobrevaloradas.
+
+6) "expiring_policies"
+   - Pólizas que vencen (fecha_vencimiento) en los próximos N días, con filtros opcionales.
+   - params:
+       {
+         "dias": 30,
+         "ciudad": "Bogotá",
+         "zona_riesgo": "alta",
+         "tipo_vehiculo": "moto",
+         "fecha_referencia": "2025-01-15",
+         "limite": 50
+       }
+   - "ciudad", "zona_riesgo", "tipo_vehiculo", "fecha_referencia" (AAAA-MM-DD, hoy por defecto)
+     y "limite" (pólizas listadas) son opcionales; omítelos si el usuario no los menciona.
+   - Úsala cuando el usuario pregunte por vencimientos, renovaciones o pólizas por vencer.
+
+7) "query"
+   - Consulta general sobre el dataset con filtros estructurados (se combinan con Y lógico).
+   - params:
+       {
+         "filtros": [
+           {"campo": "ciudad", "op": "==", "valor": "Bogotá"},
+           {"campo": "edad_conductor", "op": "<", "valor": 25},
+           {"campo": "tipo_vehiculo", "op": "in", "valor": ["moto", "taxi"]}
+         ],
+         "columnas": ["placa", "tipo_vehiculo", "valor_soat_actual"],
+         "ordenar_por": "valor_soat_actual",
+         "descendente": true,
+         "agrupar_por": "tipo_vehiculo",
+         "limite": 20
+       }
+   - Campos: placa, tipo_vehiculo, cilindraje, modelo, edad_conductor, numero_siniestros_12m,
+     anios_sin_siniestros, valor_soat_actual, ciudad, zona_riesgo, genero_conductor,
+     uso_vehiculo, fecha_vencimiento.
+   - Operadores: ==, !=, <, <=, >, >=, in, not_in, between (between usa [min, max]).
+     Los campos de texto solo admiten ==, !=, in, not_in.
+   - "agrupar_por" admite: tipo_vehiculo, ciudad, zona_riesgo, genero_conductor, uso_vehiculo.
+   - Úsala para preguntas sobre segmentos del portafolio que no cubren las otras acciones.
+
 REGLAS IMPORTANTES:
 - Siempre responde ÚNICAMENTE con el JSON, sin texto adicional.
 - Si la instrucción menciona una placa (ej: ABC123), incluye una acción "calc_for_plate" con esa placa.
@@ -69,6 +148,83 @@ REGLAS IMPORTANTES:
 """
 
 
+# Esquema JSON del plan: Ollama restringe la generación a este formato
+PLAN_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "actions": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "type": {"type": "string", "enum": list(TIPOS_ACCION)},
+                    "params": {"type": "object"},
+                },
+                "required": ["id", "type", "params"],
+            },
+        }
+    },
+    "required": ["actions"],
+}
+
+# Contadores del planner (compartidos entre hilos del servidor). "modelo_no_disponible"
+# cuenta las caídas de Ollama (conexión, modelo, cliente); "fallback", los planes que el
+# modelo sí devolvió pero no se pudieron leer o validar. Ambos terminan en el respaldo.
+PLANNER_STATS: Dict[str, int] = {
+    "llamadas": 0,
+    "llm_ok": 0,
+    "modelo_no_disponible": 0,
+    "fallback": 0,
+    "json_invalido": 0,
+    "acciones_descartadas": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _contar(clave: str, n: int = 1):
+    with _stats_lock:
+        PLANNER_STATS[clave] += n
+
+
+def estadisticas_planner() -> Dict[str, Any]:
+    """Copia de los contadores del planner con las tasas de fallback y de caídas del modelo."""
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(PLANNER_STATS)
+    llamadas = stats["llamadas"]
+    stats["tasa_fallback"] = stats["fallback"] / llamadas if llamadas else 0.0
+    stats["tasa_modelo_no_disponible"] = stats["modelo_no_disponible"] / llamadas if llamadas else 0.0
+    return stats
+
+
+def validar_acciones(actions: Any) -> List[Dict[str, Any]]:
+    """
+    Valida el plan contra el registro de acciones del executor.
+    Descarta (con WARN) las acciones de tipo desconocido o mal formadas y lanza
+    ValueError si no queda ninguna.
+    """
+    if not isinstance(actions, list):
+        raise ValueError("'actions' no es una lista")
+
+    validas: List[Dict[str, Any]] = []
+    for i, action in enumerate(actions, 1):
+        if not isinstance(action, dict) or action.get("type") not in TIPOS_ACCION:
+            tipo = action.get("type") if isinstance(action, dict) else action
+            print(f"[WARN] Planner: acción descartada (tipo no soportado): {tipo!r}")
+            _contar("acciones_descartadas")
+            continue
+        params = action.get("params") or {}
+        if not isinstance(params, dict):
+            print(f"[WARN] Planner: params inválidos en acción {action['type']}, se ignoran.")
+            params = {}
+        validas.append({"id": str(action.get("id") or f"a{i}"), "type": action["type"], "params": params})
+
+    if not validas:
+        raise ValueError("Lista de acciones vacía")
+    return validas
+
+
 def _extract_plate_regex(text: str) -> Optional[str]:
     """Extrae una placa tipo ABC123 (tres letras + tres dígitos) si existe en el texto."""
     match = re.search(r"\b([A-Z]{3}\d{3})\b", text.upper())
@@ -80,44 +236,47 @@ def _extract_plate_regex(text: str) -> Optional[str]:
 def plan_from_instruction(instruction: str) -> List[Dict[str, Any]]:
     """Genera un plan de acciones usando un modelo local de Ollama.
 
-    Intenta parsear la respuesta como JSON. Si falla,
+    La respuesta se restringe a JSON con PLAN_SCHEMA (salida estructurada de Ollama)
+    y se valida contra el registro de acciones del executor. Si falla,
     usa un plan de respaldo basado en reglas simples.
     """
+    _contar("llamadas")
+
     # 1) Intento con LLM (Ollama)
+    response = None
     try:
-        response = ollama.chat(
+        response = _ollama().chat(
             model=OLLAMA_MODEL,
             messages=[
                 {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
                 {"role": "user", "content": instruction},
             ],
+            format=PLAN_SCHEMA,
+            options={"num_predict": PLANNER_NUM_PREDICT, "temperature": PLANNER_TEMPERATURE},
         )
-        content = response["message"]["content"].strip()
-
-        # A veces el modelo puede envolver el JSON con texto, intentamos aislarlo
-        # Buscamos el primer y último corchete/llave coherentes
-        # Simple intento: si empieza con ```json, limpiamos eso
-        if content.startswith("```"):
-            # Eliminar fences tipo ```json ... ```
-            content = content.strip("`").strip()
-            # En algunos casos queda algo como 'json{...}' → eliminamos 'json' si está pegado
-            if content.lower().startswith("json"):
-                content = content[4:].strip()
+    except Exception as e:
+        # Ollama caído, modelo no descargado, cliente no instalado, ...
+        _contar("modelo_no_disponible")
+        print(f"[WARN] Planner: modelo no disponible: {e}")
 
-        data = json.loads(content)
-        actions = data.get("actions", [])
-        # Validación básica
-        if not isinstance(actions, list):
-            raise ValueError("'actions' no es una lista")
+    if response is not None:
+        try:
+            content = response["message"]["content"]
 
-        if not actions:
-            raise ValueError("Lista de acciones vacía")
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError:
+                _contar("json_invalido")
+                raise
 
-        return actions
+            actions = validar_acciones(data.get("actions") if isinstance(data, dict) else None)
+            _contar("llm_ok")
+            return actions
 
-    except Exception as e:
-        print(f"[WARN] Planner LLM falló o devolvió JSON inválido: {e}")
-        print("[INFO] Usando planner de respaldo basado en reglas.")
+        except Exception as e:
+            _contar("fallback")
+            print(f"[WARN] Planner LLM devolvió un plan inválido: {e}")
+    print("[INFO] Usando planner de respaldo basado en reglas.")
 
     # 2) Fallback rule-based simple
     actions: List[Dict[str, Any]] = []
@@ -145,5 +304,30 @@ def plan_from_instruction(instruction: str) -> List[Dict[str, Any]]:
             "params": {}
         })
 
+    # Si pide revisar precios de todo el portafolio
+    keywords_repricing = ["subvalorad", "sobrevalorad", "repricing", "mal tarifad"]
+    if any(k in lower for k in keywords_repricing):
+        actions.append({
+            "id": "a4",
+            "type": "portfolio_repricing",
+            "params": {}
+        })
+
+    # Si pregunta por vencimientos / renovaciones
+    keywords_vencimiento = ["vence", "vencen", "vencimiento", "renovar", "renovación", "renovacion"]
+    if any(k in lower for k in keywords_vencimiento):
+        params: Dict[str, Any] = {"dias": 30}
+        match_dias = re.search(r"(\d+)\s*d[ií]as", lower)
+        if match_dias:
+            params["dias"] = int(match_dias.group(1))
+        match_zona = re.search(r"zona\s+(?:de\s+riesgo\s+)?(baja|media|alta)", lower)
+        if match_zona:
+            params["zona_riesgo"] = match_zona.group(1)
+        actions.append({
+            "id": "a5",
+            "type": "expiring_policies",
+            "params": params
+        })
+
     # Si solo dijo algo muy genérico, al menos dejamos load_dataset
     return actions
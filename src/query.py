@@ -0,0 +1,230 @@
+# src/query.py
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .indices import IndiceCategorico, desempaquetar, empaquetar
+
+# Columnas del dataset que se pueden consultar, por tipo
+COLUMNAS_NUMERICAS = [
+    "cilindraje",
+    "modelo",
+    "edad_conductor",
+    "numero_siniestros_12m",
+    "anios_sin_siniestros",
+    "valor_soat_actual",
+]
+COLUMNAS_CATEGORICAS = [
+    "placa",
+    "tipo_vehiculo",
+    "ciudad",
+    "zona_riesgo",
+    "genero_conductor",
+    "uso_vehiculo",
+]
+COLUMNAS_FECHA = ["fecha_vencimiento"]
+COLUMNAS_CONSULTABLES = COLUMNAS_NUMERICAS + COLUMNAS_CATEGORICAS + COLUMNAS_FECHA
+
+# Columnas de baja cardinalidad con índice de bitmaps (placa se compara directo)
+COLUMNAS_BITMAP = ["tipo_vehiculo", "ciudad", "zona_riesgo", "genero_conductor", "uso_vehiculo"]
+
+OPERADORES = ["==", "!=", "<", "<=", ">", ">=", "in", "not_in", "between"]
+OPERADORES_CATEGORICOS = ["==", "!=", "in", "not_in"]
+
+LIMITE_DEFECTO = 50
+LIMITE_MAXIMO = 1000
+
+
+def _fecha(campo: str, valor: Any) -> str:
+    """Fecha del filtro normalizada a ISO; ValueError si no se puede interpretar."""
+    if not isinstance(valor, str):
+        raise ValueError(f"El campo {campo} requiere fechas como texto (AAAA-MM-DD): {valor!r}")
+    try:
+        fecha = pd.Timestamp(valor)
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError(f"Fecha inválida para {campo}: {valor!r}") from None
+    if pd.isna(fecha):
+        raise ValueError(f"Fecha inválida para {campo}: {valor!r}")
+    return fecha.isoformat()
+
+
+def validar_consulta(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valida y normaliza los params de la acción "query":
+
+    {
+      "filtros": [{"campo": "ciudad", "op": "==", "valor": "Bogotá"}, ...],   # AND
+      "columnas": ["placa", "valor_soat_actual"],                              # proyección
+      "ordenar_por": "valor_soat_actual", "descendente": true,
+      "agrupar_por": "tipo_vehiculo",
+      "limite": 50
+    }
+
+    Lanza ValueError con un mensaje claro si algo no es válido.
+    """
+    filtros = params.get("filtros") or []
+    if not isinstance(filtros, list):
+        raise ValueError("'filtros' debe ser una lista.")
+
+    validados = []
+    for f in filtros:
+        if not isinstance(f, dict):
+            raise ValueError(f"Filtro inválido: {f!r}")
+        campo, op, valor = f.get("campo"), f.get("op", "=="), f.get("valor")
+        if campo not in COLUMNAS_CONSULTABLES:
+            raise ValueError(f"Campo no consultable: {campo}")
+        if op not in OPERADORES:
+            raise ValueError(f"Operador no soportado: {op}")
+        if campo in COLUMNAS_CATEGORICAS and op not in OPERADORES_CATEGORICOS:
+            raise ValueError(f"Operador {op} no aplica al campo categórico {campo}")
+        if op in ("in", "not_in"):
+            if not isinstance(valor, list) or not valor:
+                raise ValueError(f"El operador {op} requiere una lista de valores ({campo}).")
+        elif op == "between":
+            if not isinstance(valor, list) or len(valor) != 2:
+                raise ValueError(f"El operador between requiere [min, max] ({campo}).")
+        elif valor is None or isinstance(valor, (list, dict)):
+            raise ValueError(f"Valor inválido para {campo} {op}: {valor!r}")
+        if campo in COLUMNAS_NUMERICAS:
+            valores = valor if isinstance(valor, list) else [valor]
+            for v in valores:
+                if isinstance(v, bool) or not isinstance(v, (int, float)):
+                    raise ValueError(f"El campo {campo} requiere valores numéricos: {v!r}")
+        if campo in COLUMNAS_FECHA:
+            valor = [_fecha(campo, v) for v in valor] if isinstance(valor, list) else _fecha(campo, valor)
+        validados.append({"campo": campo, "op": op, "valor": valor})
+
+    columnas = params.get("columnas") or ["placa", "tipo_vehiculo", "ciudad", "zona_riesgo", "valor_soat_actual"]
+    for c in columnas:
+        if c not in COLUMNAS_CONSULTABLES:
+            raise ValueError(f"Columna de proyección desconocida: {c}")
+
+    ordenar_por = params.get("ordenar_por")
+    if ordenar_por is not None and ordenar_por not in COLUMNAS_CONSULTABLES:
+        raise ValueError(f"No se puede ordenar por {ordenar_por}")
+
+    agrupar_por = params.get("agrupar_por")
+    if agrupar_por is not None and agrupar_por not in COLUMNAS_BITMAP:
+        raise ValueError(f"No se puede agrupar por {agrupar_por}")
+
+    limite = params.get("limite", LIMITE_DEFECTO)
+    if isinstance(limite, bool) or not isinstance(limite, int) or limite < 0:
+        raise ValueError(f"'limite' inválido: {limite!r}")
+
+    return {
+        "filtros": validados,
+        "columnas": list(columnas),
+        "ordenar_por": ordenar_por,
+        "descendente": bool(params.get("descendente", False)),
+        "agrupar_por": agrupar_por,
+        "limite": min(limite, LIMITE_MAXIMO),
+    }
+
+
+def _mascara_valores(columna: np.ndarray, op: str, valor) -> np.ndarray:
+    """Máscara vectorizada para columnas numéricas, de fecha o placa."""
+    if op == "==":
+        return columna == valor
+    if op == "!=":
+        return columna != valor
+    if op == "<":
+        return columna < valor
+    if op == "<=":
+        return columna <= valor
+    if op == ">":
+        return columna > valor
+    if op == ">=":
+        return columna >= valor
+    if op == "in":
+        return np.isin(columna, valor)
+    if op == "not_in":
+        return ~np.isin(columna, valor)
+    # between (inclusivo)
+    return (columna >= valor[0]) & (columna <= valor[1])
+
+
+def _bitmap_filtro(df: pd.DataFrame, filtro: Dict[str, Any], indices: Dict[str, Any]) -> np.ndarray:
+    campo, op, valor = filtro["campo"], filtro["op"], filtro["valor"]
+
+    if campo in COLUMNAS_BITMAP:
+        clave = f"bitmap:{campo}"
+        if clave not in indices:
+            indices[clave] = IndiceCategorico(df[campo])
+        indice = indices[clave]
+        valores = valor if isinstance(valor, list) else [valor]
+        bitmap = indice.bitmap_de(valores)
+        return ~bitmap if op in ("!=", "not_in") else bitmap
+
+    if campo in COLUMNAS_FECHA:
+        columna = pd.to_datetime(df[campo], errors="coerce").to_numpy(dtype="datetime64[ns]")
+        if isinstance(valor, list):
+            valor = [np.datetime64(pd.Timestamp(v), "ns") for v in valor]
+        else:
+            valor = np.datetime64(pd.Timestamp(valor), "ns")
+        return empaquetar(_mascara_valores(columna, op, valor))
+
+    if campo == "placa":
+        columna = df[campo].astype(str).str.upper().to_numpy()
+        valor = [str(v).upper() for v in valor] if isinstance(valor, list) else str(valor).upper()
+        return empaquetar(_mascara_valores(columna, op, valor))
+
+    return empaquetar(_mascara_valores(df[campo].to_numpy(), op, valor))
+
+
+def compilar_filtros(df: pd.DataFrame, filtros: List[Dict[str, Any]], indices: Dict[str, Any]) -> np.ndarray:
+    """AND de todos los filtros como bitmaps empaquetados; devuelve la máscara booleana final."""
+    n = len(df)
+    resultado: Optional[np.ndarray] = None
+    for filtro in filtros:
+        bitmap = _bitmap_filtro(df, filtro, indices)
+        resultado = bitmap if resultado is None else resultado & bitmap
+    if resultado is None:
+        return np.ones(n, dtype=bool)
+    return desempaquetar(resultado, n)
+
+
+def ejecutar_consulta(df: pd.DataFrame, consulta: Dict[str, Any], indices: Dict[str, Any]) -> Dict[str, Any]:
+    """Ejecuta una consulta ya validada (ver validar_consulta)."""
+    mascara = compilar_filtros(df, consulta["filtros"], indices)
+    posiciones = np.flatnonzero(mascara)
+    total = len(posiciones)
+
+    columnas = consulta["columnas"]
+    ordenar_por = consulta["ordenar_por"]
+    limite = consulta["limite"]
+
+    if ordenar_por is not None and total:
+        valores = df[ordenar_por].to_numpy()[posiciones]
+        orden = np.argsort(valores, kind="stable")
+        if consulta["descendente"]:
+            orden = orden[::-1]
+        posiciones = posiciones[orden]
+
+    filas = df.iloc[posiciones[:limite]][columnas]
+    resultado = {
+        "filtros": consulta["filtros"],
+        "total": total,
+        "columnas": columnas,
+        "filas": filas.to_dict(orient="records"),
+    }
+    if total:
+        valores = df["valor_soat_actual"].to_numpy()[mascara]
+        resultado["valor_soat_actual_total"] = int(valores.sum())
+        resultado["valor_soat_actual_promedio"] = float(valores.mean())
+
+    agrupar_por = consulta["agrupar_por"]
+    if agrupar_por is not None:
+        seleccion = pd.DataFrame(
+            {
+                agrupar_por: df[agrupar_por].to_numpy()[mascara],
+                "valor_soat_actual": df["valor_soat_actual"].to_numpy()[mascara],
+                "con_siniestros": df["numero_siniestros_12m"].to_numpy()[mascara] > 0,
+            }
+        )
+        resultado["por_grupo"] = seleccion.groupby(agrupar_por).agg(
+            polizas=("valor_soat_actual", "count"),
+            valor_promedio=("valor_soat_actual", "mean"),
+            con_siniestros=("con_siniestros", "sum"),
+        )
+    return resultado
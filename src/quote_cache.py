@@ -0,0 +1,195 @@
+# src/quote_cache.py
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .business_rules import calcular_soat_vectorizado, codificar_portafolio, version_reglas
+from .config import CACHE_DIR
+
+QUOTES_DIR = CACHE_DIR / "quotes"
+
+# Campos numéricos guardados por placa y su tipo en el dict de resultado
+CAMPOS_ENTEROS = [
+    "valor_estimado",
+    "tarifa_base",
+    "cilindraje",
+    "edad_conductor",
+    "numero_siniestros_12m",
+    "anios_sin_siniestros",
+    "valor_soat_actual",
+]
+CAMPOS_REALES = [
+    "factor_edad",
+    "factor_siniestros",
+    "factor_zona",
+    "factor_historial",
+    "valor_bruto",
+    "limite_min",
+    "limite_max",
+    "valor_ajustado",
+]
+# Columnas de texto guardadas como códigos + categorías
+CAMPOS_CATEGORICOS = ["tipo_vehiculo", "zona_riesgo"]
+
+# Mismo orden de claves que calcular_nueva_poliza_para_placa
+ORDEN_RESULTADO = [
+    "valor_estimado",
+    "tarifa_base",
+    "factor_edad",
+    "factor_siniestros",
+    "factor_zona",
+    "factor_historial",
+    "valor_bruto",
+    "limite_min",
+    "limite_max",
+    "valor_ajustado",
+    "placa",
+    "tipo_vehiculo",
+    "cilindraje",
+    "edad_conductor",
+    "numero_siniestros_12m",
+    "zona_riesgo",
+    "anios_sin_siniestros",
+    "valor_soat_actual",
+]
+
+
+def huella_ruta(path: Path) -> str:
+    """Huella corta de la ruta absoluta del dataset (agrupa sus versiones en la caché)."""
+    return hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()[:8]
+
+
+def version_dataset(path: Path) -> str:
+    """Huella del archivo del dataset (ruta, tamaño y fecha de modificación)."""
+    st = Path(path).stat()
+    contenido = f"{Path(path).resolve()}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:12]
+
+
+class CacheCotizaciones:
+    """
+    Tabla precalculada placa -> resultado completo de calcular_soat_estimado.
+
+    Se construye en bloque (vectorizado) para todo el dataset y se guarda en columnas
+    .npy dentro de un directorio cuya clave combina la ruta del dataset, su versión y la
+    de las reglas; al cambiar cualquiera de las dos versiones se reconstruye. Las columnas
+    se abren con memoria mapeada, así que una cotización cuesta una búsqueda binaria
+    sobre las placas. Las placas con datos faltantes (NaN) no se cotizan y quedan
+    listadas en `incompletas`.
+    """
+
+    def __init__(self, directorio: Path):
+        self.directorio = directorio
+        meta = json.loads((directorio / "meta.json").read_text(encoding="utf-8"))
+        self.clave = meta["clave"]
+        self.categorias = meta["categorias"]
+        self.incompletas = set(meta.get("incompletas", []))
+        self.columnas = {
+            nombre: np.load(directorio / f"{nombre}.npy", mmap_mode="r")
+            for nombre in ["placa"] + CAMPOS_ENTEROS + CAMPOS_REALES + CAMPOS_CATEGORICOS
+        }
+
+    def __len__(self) -> int:
+        return len(self.columnas["placa"])
+
+    def cotizar(self, placa: str) -> Optional[Dict[str, Any]]:
+        placas = self.columnas["placa"]
+        i = int(np.searchsorted(placas, placa))
+        if i >= len(placas) or placas[i] != placa:
+            return None
+
+        resultado: Dict[str, Any] = {}
+        for nombre in ORDEN_RESULTADO:
+            if nombre == "placa":
+                resultado[nombre] = placa
+            elif nombre in CAMPOS_CATEGORICOS:
+                resultado[nombre] = self.categorias[nombre][int(self.columnas[nombre][i])]
+            elif nombre in CAMPOS_ENTEROS:
+                resultado[nombre] = int(self.columnas[nombre][i])
+            else:
+                resultado[nombre] = float(self.columnas[nombre][i])
+        return resultado
+
+    @classmethod
+    def cargar_o_construir(cls, df: pd.DataFrame, dataset_path: Path, version: str) -> "CacheCotizaciones":
+        """
+        `version` es la de version_dataset tomada al leer `df` (no al construir), para
+        que la clave corresponda al DataFrame con el que se arma la tabla.
+        """
+        prefijo = f"{huella_ruta(dataset_path)}_"
+        clave = f"{prefijo}{version}_{version_reglas()}"
+        directorio = QUOTES_DIR / clave
+        if not (directorio / "meta.json").exists():
+            construir_cache(df, directorio, clave, prefijo)
+        return cls(directorio)
+
+
+def construir_cache(df: pd.DataFrame, directorio: Path, clave: str, prefijo: str = "") -> None:
+    """
+    Precalcula las cotizaciones de todas las placas y las escribe de forma atómica.
+    Si se da `prefijo`, borra las tablas anteriores con ese prefijo (mismo dataset).
+    """
+    placas = df["placa"].astype(str).to_numpy().astype(str)
+    # Igual que buscar_por_placa: ante placas repetidas manda la primera aparición
+    placas_unicas, primeras = np.unique(placas, return_index=True)
+    filas = df.iloc[primeras]
+
+    # Filas con datos faltantes no se pueden cotizar (ni pasar a enteros)
+    requeridas = [c for c in CAMPOS_ENTEROS if c in df.columns] + CAMPOS_CATEGORICOS
+    faltantes = filas[requeridas].isna().any(axis=1).to_numpy()
+    incompletas = placas_unicas[faltantes].tolist()
+    if faltantes.any():
+        placas_unicas = placas_unicas[~faltantes]
+        filas = filas[~faltantes]
+
+    codigos = codificar_portafolio(
+        filas["tipo_vehiculo"].to_numpy(),
+        filas["cilindraje"].to_numpy(),
+        filas["edad_conductor"].to_numpy(),
+        filas["numero_siniestros_12m"].to_numpy(),
+        filas["zona_riesgo"].to_numpy(),
+        filas["anios_sin_siniestros"].to_numpy(),
+    )
+    calculo = calcular_soat_vectorizado(codigos)
+
+    columnas: Dict[str, np.ndarray] = {"placa": placas_unicas}
+    for nombre in CAMPOS_ENTEROS:
+        origen = calculo[nombre] if nombre in calculo else filas[nombre].to_numpy()
+        columnas[nombre] = np.asarray(origen).astype(np.int64)
+    for nombre in CAMPOS_REALES:
+        columnas[nombre] = np.asarray(calculo[nombre], dtype=np.float64)
+    categorias = {}
+    for nombre in CAMPOS_CATEGORICOS:
+        cods, cats = pd.factorize(filas[nombre].astype(str))
+        columnas[nombre] = cods.astype(np.int16)
+        categorias[nombre] = [str(c) for c in cats]
+
+    QUOTES_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = QUOTES_DIR / f".{clave}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    for nombre, valores in columnas.items():
+        np.save(tmp / f"{nombre}.npy", valores)
+    (tmp / "meta.json").write_text(
+        json.dumps(
+            {"clave": clave, "filas": len(placas_unicas), "categorias": categorias, "incompletas": incompletas}
+        ),
+        encoding="utf-8",
+    )
+    try:
+        os.replace(tmp, directorio)
+    except OSError:
+        # Otro proceso la construyó primero: usamos la suya
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Las tablas de versiones anteriores del mismo dataset ya no se pueden servir
+    if prefijo:
+        for viejo in QUOTES_DIR.glob(f"{prefijo}*"):
+            if viejo.is_dir() and viejo.name != clave:
+                shutil.rmtree(viejo, ignore_errors=True)
@@ -1,9 +1,22 @@
 # src/reasoner.py
 from typing import List, Dict, Any
-import ollama
 
+from .bm25 import plegar
 from .config import OLLAMA_MODEL
 
+MODOS_EXPLICACION = ("auto", "llm", "plantilla")
+
+# ollama se importa en la primera llamada al modelo, no al importar el módulo
+# (arranque en frío más rápido para la CLI y los workers)
+ollama = None
+
+def _ollama():
+    global ollama
+    if ollama is None:
+        import ollama as cliente
+        ollama = cliente
+    return ollama
+
 # aca es donde le pasamos 
 def build_evidence_text(rag_evidence: List[Dict]) -> str:
     text = ""
@@ -12,11 +25,243 @@ def build_evidence_text(rag_evidence: List[Dict]) -> str:
         text += f"[Fuente {i} - {ev['doc_id']}]: {snippet[:500]}...\n\n"
     return text
 
+# Máximo de escenarios cuyo detalle por segmento se pasa al modelo
+MAX_ESCENARIOS_DETALLE = 10
+
+def build_simulation_text(simulacion: Dict[str, Any]) -> str:
+    if "error" in simulacion:
+        return f"La simulación de escenarios falló: {simulacion['error']}"
+    text = (
+        f"Pólizas simuladas: {simulacion['n_polizas']}\n"
+        f"Ingreso actual del portafolio: {simulacion['ingreso_actual']:,} COP\n"
+        f"Ingreso estimado con la tarifa vigente (base): {simulacion['ingreso_base_estimado']:,} COP\n"
+    )
+    for esc in simulacion["escenarios"][1:]:
+        text += (
+            f"- Escenario '{esc['nombre']}' (factores {esc['factores']}): "
+            f"ingreso {esc['ingreso_total']:,} COP, delta {esc['delta']:+,} COP "
+            f"({esc['delta_pct']:+.2f}%), pólizas que suben {esc['polizas_suben']}, "
+            f"pólizas que bajan {esc['polizas_bajan']}\n"
+        )
+    if simulacion["n_escenarios"] <= MAX_ESCENARIOS_DETALLE:
+        for seg, tabla in simulacion["por_segmento"].items():
+            text += f"\nDetalle por {seg}:\n"
+            text += tabla[["ingreso", "delta_pct", "cambio_participacion_pp"]].to_string() + "\n"
+    return text
+
+def build_repricing_text(repricing: Dict[str, Any]) -> str:
+    if "error" in repricing:
+        return f"El repricing del portafolio falló: {repricing['error']}"
+    text = (
+        f"Pólizas evaluadas: {repricing['n_polizas']} (umbral {repricing['umbral_pct']:.1f}%)\n"
+        f"Ingreso actual: {repricing['ingreso_actual']:,} COP\n"
+        f"Ingreso estimado con la tarifa: {repricing['ingreso_estimado']:,} COP "
+        f"(delta {repricing['delta_total']:+,} COP)\n"
+        f"Pólizas subvaloradas: {repricing['n_subvaloradas']}\n"
+        f"Pólizas sobrevaloradas: {repricing['n_sobrevaloradas']}\n"
+        f"\nPor tipo de vehículo:\n{repricing['por_tipo'].to_string()}\n"
+        "\nMayores diferencias:\n"
+    )
+    for fila in repricing["mayores_diferencias"]:
+        text += (
+            f"- {fila['placa']} ({fila['tipo_vehiculo']}, {fila['ciudad']}): actual {fila['valor_soat_actual']:,}, "
+            f"estimado {fila['valor_estimado']:,} ({fila['estado']}, {fila['diferencia_pct']:+.1f}%)\n"
+        )
+    return text
+
+def build_expiring_text(vencimientos: Dict[str, Any]) -> str:
+    if "error" in vencimientos:
+        return f"La consulta de vencimientos falló: {vencimientos['error']}"
+    text = (
+        f"Ventana: {vencimientos['desde']} a {vencimientos['hasta']} "
+        f"(filtros: {vencimientos['filtros'] or 'ninguno'})\n"
+        f"Pólizas por vencer: {vencimientos['total']}\n"
+        f"Valor actual total a renovar: {vencimientos['valor_total_a_renovar']:,} COP\n"
+        f"Por ciudad: {vencimientos['por_ciudad']}\n"
+    )
+    for p in vencimientos["polizas"][:10]:
+        text += f"- {p['placa']} ({p['tipo_vehiculo']}, {p['ciudad']}, zona {p['zona_riesgo']}) vence {p['fecha_vencimiento']}\n"
+    return text
+
+def build_query_text(consulta: Dict[str, Any]) -> str:
+    if "error" in consulta:
+        return f"La consulta sobre el dataset falló: {consulta['error']}"
+    text = f"Filtros: {consulta['filtros']}\nPólizas que coinciden: {consulta['total']}\n"
+    if consulta["total"]:
+        text += (
+            f"Valor SOAT actual total: {consulta['valor_soat_actual_total']:,} COP "
+            f"(promedio {consulta['valor_soat_actual_promedio']:,.0f} COP)\n"
+        )
+    if "por_grupo" in consulta:
+        text += f"\nPor grupo:\n{consulta['por_grupo'].to_string()}\n"
+    for fila in consulta["filas"][:10]:
+        text += "- " + ", ".join(f"{k}={v}" for k, v in fila.items()) + "\n"
+    return text
+
+def build_other_results_text(otros_resultados: Dict[str, Any] | None) -> str:
+    if not otros_resultados:
+        return ""
+    text = ""
+    simulacion = otros_resultados.get("simulate_scenarios")
+    if simulacion is not None:
+        text += "Simulación de escenarios de tarifa:\n" + build_simulation_text(simulacion)
+    repricing = otros_resultados.get("portfolio_repricing")
+    if repricing is not None:
+        text += "\nRepricing del portafolio (estimado vs. actual):\n" + build_repricing_text(repricing)
+    vencimientos = otros_resultados.get("expiring_policies")
+    if vencimientos is not None:
+        text += "\nPólizas por vencer:\n" + build_expiring_text(vencimientos)
+    consulta = otros_resultados.get("query")
+    if consulta is not None:
+        text += "\nConsulta sobre el dataset:\n" + build_query_text(consulta)
+    return text
+
+# Pistas (texto plegado) para elegir, entre la evidencia recuperada, la fuente que se cita
+# en cada parte del cálculo
+PISTAS_FUENTE = {
+    "base": ("tarifa base", "cilindraje", "tipo de vehiculo"),
+    "edad": ("edad",),
+    "siniestros": ("siniestro",),
+    "zona": ("zona",),
+    "historial": ("historial", "sin siniestro"),
+    "limites": ("limite", "minimo", "maximo"),
+}
+
+def _citas(rag_evidence: List[Dict]) -> Dict[str, str]:
+    """Por cada parte del cálculo, la primera fuente (mejor rankeada) que la menciona."""
+    textos = [plegar(ev["text"]) for ev in rag_evidence]
+    citas = {}
+    for parte, pistas in PISTAS_FUENTE.items():
+        citas[parte] = ""
+        for i, texto in enumerate(textos, 1):
+            if any(p in texto for p in pistas):
+                citas[parte] = f" [Fuente {i} - {rag_evidence[i - 1]['doc_id']}]"
+                break
+    return citas
+
+def _efecto(factor: float) -> str:
+    if factor > 1:
+        return f"recargo del {(factor - 1) * 100:.0f}%"
+    if factor < 1:
+        return f"descuento del {(1 - factor) * 100:.0f}%"
+    return "sin ajuste"
+
+def _explicar_calculo(calc_result: Dict[str, Any], citas: Dict[str, str]) -> str:
+    c = calc_result
+    base = c["tarifa_base"]
+    text = (
+        f"**Cálculo para la placa {c['placa']}**\n\n"
+        f"- Tarifa base: {base:,} COP para {c['tipo_vehiculo']} de {c['cilindraje']} cc{citas['base']}.\n"
+        f"- Factor edad: {c['factor_edad']} ({_efecto(c['factor_edad'])}), "
+        f"conductor de {c['edad_conductor']} años{citas['edad']}.\n"
+        f"- Factor siniestros: {c['factor_siniestros']} ({_efecto(c['factor_siniestros'])}), "
+        f"{c['numero_siniestros_12m']} siniestros en los últimos 12 meses{citas['siniestros']}.\n"
+        f"- Factor zona: {c['factor_zona']} ({_efecto(c['factor_zona'])}), "
+        f"zona de riesgo {c['zona_riesgo']}{citas['zona']}.\n"
+        f"- Factor historial: {c['factor_historial']} ({_efecto(c['factor_historial'])}), "
+        f"{c['anios_sin_siniestros']} años sin siniestros{citas['historial']}.\n\n"
+    )
+
+    bruto, minimo, maximo = c["valor_bruto"], c["limite_min"], c["limite_max"]
+    if bruto < minimo:
+        limite = f"queda por debajo del mínimo, así que se aplica el mínimo de {minimo:,.0f} COP"
+    elif bruto > maximo:
+        limite = f"supera el máximo, así que se aplica el máximo de {maximo:,.0f} COP"
+    else:
+        limite = f"queda dentro de los límites ({minimo:,.0f} a {maximo:,.0f} COP)"
+    text += (
+        f"El valor bruto (tarifa base por los cuatro factores) es {bruto:,.0f} COP y {limite}"
+        f"{citas['limites']}. Redondeado al siguiente múltiplo de mil, "
+        f"el valor estimado del SOAT es **{c['valor_estimado']:,} COP**.\n\n"
+    )
+
+    actual = c["valor_soat_actual"]
+    diferencia = c["valor_estimado"] - actual
+    if diferencia == 0:
+        text += f"Coincide con el valor actual registrado en el dataset ({actual:,} COP).\n"
+    else:
+        pct = f" ({diferencia / actual * 100:+.1f}%)" if actual else ""
+        sentido = "por encima" if diferencia > 0 else "por debajo"
+        text += (
+            f"Frente al valor actual en el dataset ({actual:,} COP), el estimado está "
+            f"{abs(diferencia):,} COP {sentido}{pct}.\n"
+        )
+    return text
+
+def render_explicacion_plantilla(
+    instruction: str,
+    calc_result: Dict[str, Any] | None,
+    global_stats: Dict[str, Any] | None,
+    rag_evidence: List[Dict],
+    otros_resultados: Dict[str, Any] | None = None,
+) -> str:
+    """
+    Explicación determinista, sin modelo de lenguaje: narra el cálculo factor por factor
+    a partir del desglose de calcular_soat_estimado y cita directamente los chunks
+    recuperados. Solo usa cifras presentes en los resultados.
+    """
+    partes = ["_Explicación generada por plantilla (sin modelo de lenguaje)._\n"]
+
+    if calc_result is not None:
+        if "error" in calc_result:
+            partes.append(f"No se pudo calcular el SOAT: {calc_result['error']}\n")
+        else:
+            partes.append(_explicar_calculo(calc_result, _citas(rag_evidence)))
+
+    if global_stats is not None:
+        partes.append(
+            "**Portafolio**\n\n"
+            f"{global_stats['porcentaje_con_siniestros']:.2f}% de los vehículos tiene al menos "
+            "un siniestro en los últimos 12 meses. Valor SOAT actual por tipo de vehículo:\n\n"
+            f"```\n{global_stats['stats_por_tipo'].to_string()}\n```\n"
+        )
+
+    other_text = build_other_results_text(otros_resultados)
+    if other_text:
+        partes.append(f"**Otros análisis del portafolio**\n\n```\n{other_text.strip()}\n```\n")
+
+    if rag_evidence:
+        fuentes = ", ".join(
+            f"[Fuente {i} - {ev['doc_id']}] (chunk {ev['chunk_id']})" for i, ev in enumerate(rag_evidence, 1)
+        )
+        partes.append(f"Fuentes consultadas: {fuentes}.\n")
+    return "\n".join(partes)
+
 def explain_soat_calculation(
     instruction: str,
     calc_result: Dict[str, Any] | None,
     global_stats: Dict[str, Any] | None,
     rag_evidence: List[Dict],
+    otros_resultados: Dict[str, Any] | None = None,
+    modo: str = "llm",
+) -> str:
+    """
+    Explicación del resultado según el modo: "llm" (Ollama), "plantilla" (sin modelo) o
+    "auto" (Ollama y, si la llamada falla, la plantilla).
+
+    Por defecto "llm": quien la llama directamente recibe la excepción si el modelo
+    falla, como antes. El pipeline (agent.run_agent) usa EXPLICACION_MODO.
+    """
+    if modo not in MODOS_EXPLICACION:
+        raise ValueError(f"Modo de explicación desconocido: {modo}")
+    argumentos = (instruction, calc_result, global_stats, rag_evidence, otros_resultados)
+    if modo == "plantilla":
+        return render_explicacion_plantilla(*argumentos)
+    if modo == "llm":
+        return _explicar_con_llm(*argumentos)
+    try:
+        return _explicar_con_llm(*argumentos)
+    except Exception as e:
+        print(f"[WARN] Reasoner LLM falló: {e}")
+        print("[INFO] Usando explicación por plantilla.")
+        return render_explicacion_plantilla(*argumentos)
+
+def _explicar_con_llm(
+    instruction: str,
+    calc_result: Dict[str, Any] | None,
+    global_stats: Dict[str, Any] | None,
+    rag_evidence: List[Dict],
+    otros_resultados: Dict[str, Any] | None = None,
 ) -> str:
     evidence_text = build_evidence_text(rag_evidence)
 
@@ -51,6 +296,8 @@ Resumen portafolio (por tipo de vehículo):
 Porcentaje de vehículos con al menos un siniestro en 12 meses: {porcentaje:.2f}%
 """
 
+    other_text = build_other_results_text(otros_resultados)
+
     user_prompt = f"""
 Instrucción original del usuario:
 {instruction}
@@ -64,17 +311,24 @@ Resultados del cálculo individual (si aplica):
 Estadísticas generales (si se solicitaron):
 {stats_text}
 
+Otros análisis del portafolio (si se solicitaron):
+{other_text}
+
 Redacta un informe en español, claro y técnico, explicando:
 - Cómo se calculó el valor del SOAT para la placa (si aplica),
 - Qué factores de riesgo influyeron (edad, siniestros, zona, historial),
 - Cómo se relaciona el cálculo con las reglas del manual,
 - Un breve análisis del portafolio si hay estadísticas generales.
+- El impacto en ingresos y por segmento de los escenarios simulados (si aplica).
+- Las pólizas sub/sobrevaloradas detectadas en el repricing (si aplica).
+- Las pólizas próximas a vencer y su valor a renovar (si aplica).
+- Lo que muestra la consulta sobre el dataset (si aplica).
 
 Usa referencias del tipo [Fuente i - nombre_doc] cuando te apoyes en el manual.
 No inventes cifras adicionales que no estén en los datos.
 """
 
-    resp = ollama.chat(
+    resp = _ollama().chat(
         model=OLLAMA_MODEL,
         messages=[
             {"role": "system", "content": "Eres un analista de seguros que explica cálculos de SOAT basados en reglas documentadas."},
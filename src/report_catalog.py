@@ -0,0 +1,345 @@
+# src/report_catalog.py
+"""
+Catálogo de reportes en SQLite sobre outputs/reports.
+
+    python -m src.report_catalog buscar --placa ABC123 --desde 2025-11-01
+    python -m src.report_catalog buscar --texto "siniestros zona alta"
+    python -m src.report_catalog reindexar
+    python -m src.report_catalog archivar --dias 30
+
+Cada reporte que se escribe queda registrado con su instrucción, placas, tipos de
+acción, puntaje del evaluador y rutas (.md/.pdf). Las placas tienen su propia tabla
+indexada y la instrucción y la explicación van a un índice FTS5, así que buscar por
+placa, rango de fechas o texto no recorre los archivos. Los reportes viejos se
+archivan en un .zip por mes y el catálogo recuerda en cuál quedó cada uno.
+"""
+import argparse
+import re
+import sqlite3
+import threading
+import zipfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import CATALOGO_REPORTES_DB, CATALOGO_RETENCION_DIAS, REPORTS_DIR
+from .reporter import Reporte, reporte_desde_markdown
+
+ARCHIVO_DIR = REPORTS_DIR / "archivo"
+
+# Placas por reporte que se registran (un repricing o una consulta pueden listar miles)
+MAX_PLACAS_REPORTE = 200
+
+_PLACA = re.compile(r"\b([A-Z]{3}\d{3})\b")
+_TERMINO = re.compile(r"\w+")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS reportes (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL UNIQUE,
+    fecha TEXT NOT NULL,
+    instruccion TEXT NOT NULL,
+    acciones TEXT NOT NULL,
+    score INTEGER,
+    path_md TEXT,
+    path_pdf TEXT,
+    archivo TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reportes_fecha ON reportes (fecha);
+CREATE TABLE IF NOT EXISTS reporte_placas (
+    reporte_id INTEGER NOT NULL REFERENCES reportes (id) ON DELETE CASCADE,
+    placa TEXT NOT NULL,
+    PRIMARY KEY (placa, reporte_id)
+) WITHOUT ROWID;
+"""
+
+ESQUEMA_FTS = "CREATE VIRTUAL TABLE IF NOT EXISTS reportes_fts USING fts5(instruccion, explicacion)"
+
+
+def consulta_fts(texto: str) -> str:
+    """
+    Expresión MATCH de FTS5 para texto libre: cada palabra va entre comillas (sin
+    operadores ni sintaxis de columnas) y todas deben aparecer. "" si no hay palabras.
+    """
+    return " ".join('"' + t.replace('"', '""') + '"' for t in _TERMINO.findall(texto))
+
+
+def placas_de_reporte(reporte: Reporte) -> List[str]:
+    """Placas del cálculo individual, de la instrucción y de los demás resultados del plan."""
+    placas: List[str] = []
+    if reporte.calc_result and reporte.calc_result.get("placa"):
+        placas.append(str(reporte.calc_result["placa"]))
+    placas += _PLACA.findall(reporte.instruction.upper())
+    for resultado in (reporte.otros_resultados or {}).values():
+        if not isinstance(resultado, dict):
+            continue
+        for clave in ("mayores_diferencias", "polizas", "filas"):
+            for fila in resultado.get(clave) or []:
+                if isinstance(fila, dict) and fila.get("placa"):
+                    placas.append(str(fila["placa"]))
+    return list(dict.fromkeys(placas))[:MAX_PLACAS_REPORTE]
+
+
+def tipos_de_accion(reporte: Reporte, acciones: Optional[Iterable[Dict[str, Any]]] = None) -> List[str]:
+    """Tipos de acción del plan; sin plan, los que se deducen de los resultados del reporte."""
+    if acciones is not None:
+        return list(dict.fromkeys(a["type"] for a in acciones))
+    tipos = []
+    if reporte.calc_result is not None:
+        tipos.append("calc_for_plate")
+    if reporte.global_stats is not None:
+        tipos.append("global_stats")
+    return tipos + list(reporte.otros_resultados or {})
+
+
+class CatalogoReportes:
+    """Índice SQLite de los reportes; una conexión compartida protegida por un lock."""
+
+    def __init__(self, db_path: Path = CATALOGO_REPORTES_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(ESQUEMA)
+            try:
+                self._conn.execute(ESQUEMA_FTS)
+                self.fts = True
+            except sqlite3.OperationalError:
+                # SQLite compilado sin FTS5: la búsqueda de texto cae a LIKE
+                self.fts = False
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+    def registrar(
+        self,
+        reporte: Reporte,
+        score: Optional[int] = None,
+        acciones: Optional[Iterable[Dict[str, Any]]] = None,
+        path_pdf: Optional[Path] = None,
+    ) -> int:
+        """Agrega (o actualiza, si ya existe el nombre) un reporte; devuelve su id."""
+        fila = (
+            reporte.nombre,
+            reporte.fecha.isoformat(timespec="seconds"),
+            reporte.instruction,
+            ",".join(tipos_de_accion(reporte, acciones)),
+            score,
+            str(reporte.path) if reporte.path else None,
+            str(path_pdf) if path_pdf else None,
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO reportes (nombre, fecha, instruccion, acciones, score, path_md, path_pdf) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (nombre) DO UPDATE SET fecha = excluded.fecha, instruccion = excluded.instruccion, "
+                "acciones = excluded.acciones, score = excluded.score, path_md = excluded.path_md, "
+                "path_pdf = COALESCE(excluded.path_pdf, reportes.path_pdf)",
+                fila,
+            )
+            reporte_id = self._conn.execute(
+                "SELECT id FROM reportes WHERE nombre = ?", (reporte.nombre,)
+            ).fetchone()[0]
+            self._conn.execute("DELETE FROM reporte_placas WHERE reporte_id = ?", (reporte_id,))
+            self._conn.executemany(
+                "INSERT INTO reporte_placas (reporte_id, placa) VALUES (?, ?)",
+                [(reporte_id, p) for p in placas_de_reporte(reporte)],
+            )
+            if self.fts:
+                self._conn.execute("DELETE FROM reportes_fts WHERE rowid = ?", (reporte_id,))
+                self._conn.execute(
+                    "INSERT INTO reportes_fts (rowid, instruccion, explicacion) VALUES (?, ?, ?)",
+                    (reporte_id, reporte.instruction, reporte.explanation_text),
+                )
+        return reporte_id
+
+    def asignar_pdf(self, nombre: str, path_pdf: Path) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE reportes SET path_pdf = ? WHERE nombre = ?", (str(path_pdf), nombre))
+
+    def buscar(
+        self,
+        placa: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        texto: Optional[str] = None,
+        limite: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Reportes que cumplen todos los filtros dados, del más reciente al más antiguo.
+        `hasta` es inclusivo (todo ese día); `texto` es texto libre: se buscan todas sus
+        palabras (ver consulta_fts) y, si no tiene ninguna, no hay resultados.
+        """
+        condiciones, params = [], []
+        if placa:
+            condiciones.append("r.id IN (SELECT reporte_id FROM reporte_placas WHERE placa = ?)")
+            params.append(placa.upper())
+        if desde:
+            condiciones.append("r.fecha >= ?")
+            params.append(desde.isoformat())
+        if hasta:
+            condiciones.append("r.fecha < ?")
+            params.append((hasta + timedelta(days=1)).isoformat())
+        if texto:
+            if self.fts:
+                expresion = consulta_fts(texto)
+                if not expresion:
+                    return []
+                condiciones.append("r.id IN (SELECT rowid FROM reportes_fts WHERE reportes_fts MATCH ?)")
+                params.append(expresion)
+            else:
+                condiciones.append("r.instruccion LIKE ?")
+                params.append(f"%{texto}%")
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        consulta = (
+            "SELECT r.*, (SELECT group_concat(placa, ',') FROM reporte_placas WHERE reporte_id = r.id) AS placas "
+            f"FROM reportes r {where} ORDER BY r.fecha DESC, r.id DESC LIMIT ?"
+        )
+        with self._lock:
+            filas = self._conn.execute(consulta, [*params, limite]).fetchall()
+        resultados = []
+        for fila in filas:
+            d = dict(fila)
+            d["acciones"] = d["acciones"].split(",") if d["acciones"] else []
+            d["placas"] = d["placas"].split(",") if d["placas"] else []
+            resultados.append(d)
+        return resultados
+
+    def reindexar(self, directorio: Path = REPORTS_DIR) -> int:
+        """Registra los .md de `directorio` que aún no están en el catálogo (reportes previos)."""
+        from .evaluator import simple_evaluate_report
+
+        with self._lock:
+            conocidos = {f[0] for f in self._conn.execute("SELECT nombre FROM reportes")}
+        nuevos = 0
+        for path in sorted(Path(directorio).glob("reporte_soat_*.md")):
+            if path.stem in conocidos:
+                continue
+            reporte = reporte_desde_markdown(path)
+            pdf = path.with_suffix(".pdf")
+            self.registrar(
+                reporte,
+                score=simple_evaluate_report(reporte)["score"],
+                path_pdf=pdf if pdf.exists() else None,
+            )
+            nuevos += 1
+        return nuevos
+
+    def archivar(self, dias: int = CATALOGO_RETENCION_DIAS) -> Dict[str, int]:
+        """
+        Mueve los reportes con más de `dias` días a ARCHIVO_DIR/reportes_AAAAMM.zip (uno por
+        mes, comprimido) y borra los originales. El catálogo conserva la entrada y la ruta
+        del .zip, así que siguen apareciendo en las búsquedas y se pueden leer.
+
+        Las entradas cuyo Markdown ya no existe (ni en disco ni en el .zip) no se archivan:
+        se marcan sin archivo (path_md NULL) y se cuentan en "faltantes".
+        """
+        limite = (datetime.now() - timedelta(days=dias)).isoformat(timespec="seconds")
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT id, nombre, fecha, path_md, path_pdf FROM reportes "
+                "WHERE archivo IS NULL AND path_md IS NOT NULL AND fecha < ?",
+                (limite,),
+            ).fetchall()
+
+        por_mes: Dict[str, List[sqlite3.Row]] = {}
+        for fila in filas:
+            por_mes.setdefault(fila["fecha"][:7].replace("-", ""), []).append(fila)
+
+        ARCHIVO_DIR.mkdir(parents=True, exist_ok=True)
+        archivados = faltantes = 0
+        for mes, grupo in por_mes.items():
+            destino = ARCHIVO_DIR / f"reportes_{mes}.zip"
+            movidos, perdidos = [], []
+            with zipfile.ZipFile(destino, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+                existentes = set(zf.namelist())
+                for fila in grupo:
+                    md = Path(fila["path_md"])
+                    if not md.exists() and md.name not in existentes:
+                        perdidos.append(fila["id"])
+                        continue
+                    rutas = [Path(p) for p in (fila["path_md"], fila["path_pdf"]) if p]
+                    for ruta in rutas:
+                        if ruta.exists() and ruta.name not in existentes:
+                            zf.write(ruta, arcname=ruta.name)
+                    movidos.append((fila["id"], rutas))
+            # Los originales se borran solo después de cerrar (y escribir) el .zip
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "UPDATE reportes SET archivo = ? WHERE id = ?", [(str(destino), i) for i, _ in movidos]
+                )
+                self._conn.executemany(
+                    "UPDATE reportes SET path_md = NULL, path_pdf = NULL WHERE id = ?", [(i,) for i in perdidos]
+                )
+            for _, rutas in movidos:
+                for ruta in rutas:
+                    ruta.unlink(missing_ok=True)
+            archivados += len(movidos)
+            faltantes += len(perdidos)
+        return {"archivados": archivados, "bundles": len(por_mes), "faltantes": faltantes}
+
+    def leer_markdown(self, nombre: str) -> Optional[str]:
+        """Markdown de un reporte, esté en disco o ya archivado."""
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT path_md, archivo FROM reportes WHERE nombre = ?", (nombre,)
+            ).fetchone()
+        if fila is None:
+            return None
+        if fila["archivo"]:
+            try:
+                with zipfile.ZipFile(fila["archivo"]) as zf:
+                    return zf.read(f"{nombre}.md").decode("utf-8")
+            except (KeyError, OSError, zipfile.BadZipFile):
+                return None
+        if fila["path_md"] and Path(fila["path_md"]).exists():
+            return Path(fila["path_md"]).read_text(encoding="utf-8")
+        return None
+
+
+_catalogo: Optional[CatalogoReportes] = None
+_catalogo_lock = threading.Lock()
+
+
+def catalogo_reportes() -> CatalogoReportes:
+    """Catálogo compartido por el proceso (se abre al primer uso)."""
+    global _catalogo
+    with _catalogo_lock:
+        if _catalogo is None:
+            _catalogo = CatalogoReportes()
+        return _catalogo
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Catálogo de reportes del agente SOAT.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    buscar = sub.add_parser("buscar", help="Buscar reportes por placa, fechas o texto.")
+    buscar.add_argument("--placa")
+    buscar.add_argument("--desde", type=date.fromisoformat)
+    buscar.add_argument("--hasta", type=date.fromisoformat)
+    buscar.add_argument("--texto")
+    buscar.add_argument("--limite", type=int, default=20)
+    sub.add_parser("reindexar", help="Registrar los .md que aún no están en el catálogo.")
+    archivar = sub.add_parser("archivar", help="Comprimir en .zip mensuales los reportes viejos.")
+    archivar.add_argument("--dias", type=int, default=CATALOGO_RETENCION_DIAS)
+    args = parser.parse_args()
+
+    catalogo = catalogo_reportes()
+    if args.comando == "buscar":
+        for r in catalogo.buscar(args.placa, args.desde, args.hasta, args.texto, args.limite):
+            ubicacion = r["archivo"] or r["path_md"]
+            print(f"{r['fecha']}  score={r['score']}  placas={','.join(r['placas']) or '-'}  "
+                  f"acciones={','.join(r['acciones'])}\n    {r['instruccion']}\n    {ubicacion}")
+    elif args.comando == "reindexar":
+        print(f"[OK] {catalogo.reindexar()} reportes agregados al catálogo.")
+    else:
+        print(f"[OK] {catalogo.archivar(args.dias)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,118 @@
 # src/reporter.py
+import atexit
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
 
-from .config import REPORTS_DIR
+from .config import REPORTES_LOTE, REPORTES_PERSISTENCIA, REPORTS_DIR
 
+MODOS_PERSISTENCIA = ("sincrona", "asincrona", "ninguna")
 
-def build_markdown_report(
+# Títulos de las secciones del reporte (el evaluador verifica estos mismos)
+SECCIONES = {
+    "instruccion": "## 1. Instrucción del usuario",
+    "explicacion": "## 2. Explicación del agente (Razón + Evidencia)",
+    "evidencia": "## 3. Evidencia documental recuperada (RAG)",
+    "calculo": "## 4. Resultado de cálculo individual (DEBUG)",
+    "estadisticas": "## 5. Estadísticas generales del dataset (DEBUG)",
+    "otros": "## 6. Otros resultados del plan",
+    "traza": "## 7. Trazabilidad del agente (acciones ejecutadas)",
+}
+
+# Reportes en cola para escritura asíncrona; si se llena, quien envía espera (no se descartan)
+MAX_COLA_REPORTES = 1000
+
+
+@dataclass
+class Reporte:
+    """Reporte armado en memoria: el Markdown y los datos estructurados de los que sale."""
+
+    nombre: str
+    fecha: datetime
+    markdown: str
+    instruction: str
+    rag_evidence: List[Dict] = field(default_factory=list)
+    explanation_text: str = ""
+    calc_result: Dict[str, Any] | None = None
+    global_stats: Dict[str, Any] | None = None
+    otros_resultados: Dict[str, Any] | None = None
+    path: Optional[Path] = None  # ruta del .md, una vez escrito
+
+
+def nombre_reporte(fecha: datetime) -> str:
+    """Nombre único aunque coincidan el segundo (o el microsegundo) entre procesos."""
+    return f"reporte_soat_{fecha.strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+
+
+def _format_result(resultado: Any) -> str:
+    """Texto plano para un resultado de acción (dicts, listas y DataFrames anidados)."""
+    if isinstance(resultado, dict):
+        lines = []
+        for k, v in resultado.items():
+            if (isinstance(v, (dict, list)) and v) or hasattr(v, "to_string"):
+                lines.append(f"{k}:\n{_format_result(v)}")
+            else:
+                lines.append(f"{k}: {v}")
+        return "\n".join(lines)
+    if isinstance(resultado, list):
+        lines = []
+        for v in resultado:
+            if isinstance(v, dict):
+                lines.append("- " + ", ".join(f"{k}={x}" for k, x in v.items()))
+            else:
+                lines.append(f"- {v}")
+        return "\n".join(lines)
+    if hasattr(resultado, "to_string"):
+        return resultado.to_string()
+    return str(resultado)
+
+
+def _format_trace(resumen: Dict[str, Any]) -> str:
+    """Traza resumida (Traza.resumen): conteos y primeros/últimos eventos."""
+    niveles = ", ".join(f"{k}: {v}" for k, v in resumen["por_nivel"].items())
+    tipos = ", ".join(f"{k}={v}" for k, v in resumen["por_tipo"].items())
+    lines = [f"Eventos: {resumen['total']} ({niveles})", f"Por tipo: {tipos}"]
+    descartados = resumen.get("descartados")
+    if descartados:
+        lines.append(
+            "[WARN] Eventos no escritos por cola llena: "
+            + ", ".join(f"{sink}={n}" for sink, n in descartados.items())
+        )
+    lines.append("")
+    lines += [f"- [{e['nivel']}] {e['mensaje']}" for e in resumen["primeros"]]
+    if resumen["omitidos"]:
+        lines.append(f"... ({resumen['omitidos']} eventos omitidos) ...")
+    lines += [f"- [{e['nivel']}] {e['mensaje']}" for e in resumen["ultimos"]]
+    return "\n".join(lines)
+
+
+def construir_reporte(
     instruction: str,
     rag_evidence: List[Dict],
     explanation_text: str,
     calc_result: Dict[str, Any] | None,
     global_stats: Dict[str, Any] | None,
-    logs: List[str],
-) -> Path:
+    logs: Union[List[str], Dict[str, Any]],
+    otros_resultados: Dict[str, Any] | None = None,
+) -> Reporte:
     """
-    Construye un reporte en formato Markdown con:
+    Arma en memoria (sin tocar disco) un reporte en formato Markdown con:
       - Instrucción del usuario
       - Explicación generada por el LLM
       - Evidencia RAG (fragmentos del manual)
       - Cálculo individual (cuando aplica)
       - Estadísticas generales del dataset
-      - Trazabilidad (logs)
+      - Resultados de otras acciones del plan (simulaciones, etc.)
+      - Trazabilidad (logs: lista de mensajes o el resumen de ExecutionContext.traza)
     """
-
-    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_path = REPORTS_DIR / f"reporte_soat_{ts}.md"
+    fecha = datetime.now()
 
     # Evidencia RAG
     if rag_evidence:
@@ -53,8 +139,19 @@ def build_markdown_report(
     else:
         stats_block = "No se calcularon estadísticas globales."
 
+    # Otras acciones
+    if otros_resultados:
+        otros_block = "\n\n".join(
+            f"### {tipo}\n\n```text\n{_format_result(res)}\n```"
+            for tipo, res in otros_resultados.items()
+        )
+    else:
+        otros_block = "_No se ejecutaron otras acciones._"
+
     # Logs
-    if logs:
+    if isinstance(logs, dict) and logs.get("total"):
+        log_block = _format_trace(logs)
+    elif logs and not isinstance(logs, dict):
         log_block = "\n".join(f"- {line}" for line in logs)
     else:
         log_block = "_Sin trazabilidad registrada._"
@@ -62,29 +159,29 @@ def build_markdown_report(
     # Markdown final
     content = f"""# Reporte del Agente SOAT
 
-**Fecha:** {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+**Fecha:** {fecha.strftime("%Y-%m-%d %H:%M:%S")}
 
 ---
 
-## 1. Instrucción del usuario
+{SECCIONES['instruccion']}
 
 > {instruction}
 
 ---
 
-## 2. Explicación del agente (Razón + Evidencia)
+{SECCIONES['explicacion']}
 
 {explanation_text}
 
 ---
 
-## 3. Evidencia documental recuperada (RAG)
+{SECCIONES['evidencia']}
 
 {refs_block}
 
 ---
 
-## 4. Resultado de cálculo individual (DEBUG)
+{SECCIONES['calculo']}
 
 ```text
 {calc_block}
@@ -92,7 +189,7 @@ def build_markdown_report(
 
 ---
 
-## 5. Estadísticas generales del dataset (DEBUG)
+{SECCIONES['estadisticas']}
 
 ```text
 {stats_block}
@@ -100,7 +197,13 @@ def build_markdown_report(
 
 ---
 
-## 6. Trazabilidad del agente (acciones ejecutadas)
+{SECCIONES['otros']}
+
+{otros_block}
+
+---
+
+{SECCIONES['traza']}
 
 ```text
 {log_block}
@@ -111,5 +214,218 @@ def build_markdown_report(
 _Reporte generado automáticamente por el Agente Cognitivo SOAT_
 """
 
-    report_path.write_text(content, encoding="utf-8")
-    return report_path
+    return Reporte(
+        nombre=nombre_reporte(fecha),
+        fecha=fecha,
+        markdown=content,
+        instruction=instruction,
+        rag_evidence=rag_evidence,
+        explanation_text=explanation_text,
+        calc_result=calc_result,
+        global_stats=global_stats,
+        otros_resultados=otros_resultados,
+    )
+
+
+def guardar_reporte(reporte: Reporte, directorio: Path = REPORTS_DIR) -> Path:
+    """Escribe el .md de forma atómica (nadie ve un archivo a medio escribir)."""
+    directorio.mkdir(parents=True, exist_ok=True)
+    path = directorio / f"{reporte.nombre}.md"
+    tmp = directorio / f".{reporte.nombre}.md.tmp"
+    tmp.write_text(reporte.markdown, encoding="utf-8")
+    os.replace(tmp, path)
+    reporte.path = path
+    return path
+
+
+class PersistenciaReportes:
+    """
+    Escritura de reportes en segundo plano: enviar() encola y devuelve la ruta que tendrá
+    el archivo, y un hilo propio escribe los reportes en lotes. Reporte.path y el aviso
+    `al_guardar` (p. ej. registrar en el catálogo) llegan solo cuando el archivo ya existe.
+    A diferencia de los sinks de la traza, si la cola se llena quien envía espera, porque
+    un reporte no se puede descartar.
+    """
+
+    def __init__(self, directorio: Path = REPORTS_DIR, lote: int = REPORTES_LOTE):
+        self.directorio = directorio
+        self.lote = lote
+        self.escritos = 0
+        self.fallidos = 0
+        self._cola: "queue.Queue[Tuple[Reporte, Optional[Callable[[Reporte], None]]]]" = queue.Queue(
+            maxsize=MAX_COLA_REPORTES
+        )
+        self._hilo = threading.Thread(target=self._bucle, name="soat-report-writer", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, reporte: Reporte, al_guardar: Optional[Callable[[Reporte], None]] = None) -> Path:
+        self._cola.put((reporte, al_guardar))
+        return self.directorio / f"{reporte.nombre}.md"
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < self.lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            for reporte, al_guardar in lote:
+                try:
+                    guardar_reporte(reporte, self.directorio)
+                    self.escritos += 1
+                except Exception as e:
+                    self.fallidos += 1
+                    sys.stderr.write(f"[WARN] No se pudo guardar {reporte.nombre}: {e}\n")
+                    al_guardar = None
+                try:
+                    if al_guardar is not None:
+                        al_guardar(reporte)
+                except Exception as e:
+                    sys.stderr.write(f"[WARN] Falló el aviso de reporte guardado ({reporte.nombre}): {e}\n")
+                finally:
+                    self._cola.task_done()
+
+    def vaciar(self):
+        """Espera a que se escriban los reportes pendientes."""
+        self._cola.join()
+
+
+_persistencia: Optional[PersistenciaReportes] = None
+_persistencia_lock = threading.Lock()
+
+
+def persistencia_reportes() -> PersistenciaReportes:
+    """Escritor asíncrono compartido por el proceso (se crea al primer uso)."""
+    global _persistencia
+    with _persistencia_lock:
+        if _persistencia is None:
+            _persistencia = PersistenciaReportes()
+            atexit.register(vaciar_reportes)
+        return _persistencia
+
+
+def vaciar_reportes():
+    if _persistencia is not None:
+        _persistencia.vaciar()
+
+
+def persistir_reporte(
+    reporte: Reporte,
+    modo: str = REPORTES_PERSISTENCIA,
+    al_guardar: Optional[Callable[[Reporte], None]] = None,
+) -> Optional[Path]:
+    """
+    Guarda el reporte según el modo; devuelve su ruta (None si queda solo en memoria).
+    `al_guardar(reporte)` se llama cuando el archivo ya está escrito (en modo asíncrono,
+    desde el hilo escritor); no se llama si el reporte queda solo en memoria.
+    """
+    if modo not in MODOS_PERSISTENCIA:
+        raise ValueError(f"Modo de persistencia desconocido: {modo}")
+    if modo == "sincrona":
+        path = guardar_reporte(reporte)
+        if al_guardar is not None:
+            al_guardar(reporte)
+        return path
+    if modo == "asincrona":
+        return persistencia_reportes().enviar(reporte, al_guardar)
+    return None
+
+
+def build_markdown_report(
+    instruction: str,
+    rag_evidence: List[Dict],
+    explanation_text: str,
+    calc_result: Dict[str, Any] | None,
+    global_stats: Dict[str, Any] | None,
+    logs: Union[List[str], Dict[str, Any]],
+    otros_resultados: Dict[str, Any] | None = None,
+) -> Path:
+    """Arma el reporte (construir_reporte) y lo escribe en REPORTS_DIR; devuelve la ruta."""
+    reporte = construir_reporte(
+        instruction, rag_evidence, explanation_text, calc_result, global_stats, logs, otros_resultados
+    )
+    return guardar_reporte(reporte)
+
+
+_ENCABEZADO = re.compile(r"^## \d+\. (.+)$", re.MULTILINE)
+_REFERENCIA = re.compile(r"^- \[Fuente (\d+)\] (.+?) \(chunk (\d+)\) — (.*)$", re.MULTILINE)
+
+
+def titulo(clave: str) -> str:
+    """Título de una sección sin su número ('Instrucción del usuario')."""
+    return SECCIONES[clave].split(". ", 1)[1]
+
+
+def secciones_markdown(text: str) -> Dict[str, str]:
+    """
+    Cuerpo de cada sección '## n. Título' por título (sin el número, así que también
+    sirve con reportes viejos que numeraban distinto).
+
+    Solo cuentan como límites los títulos de SECCIONES; otros encabezados '## n.' (por
+    ejemplo en la explicación del modelo) quedan dentro del cuerpo. Si un título se
+    repite, vale el último: el texto libre (instrucción, explicación) va antes que las
+    secciones que genera el reporter.
+    """
+    titulos = {titulo(clave) for clave in SECCIONES}
+    ultimas = {}
+    for m in _ENCABEZADO.finditer(text):
+        if m.group(1).strip() in titulos:
+            ultimas[m.group(1).strip()] = m
+    marcas = sorted(ultimas.values(), key=lambda m: m.start())
+    cuerpos = {}
+    for i, m in enumerate(marcas):
+        if i + 1 < len(marcas):
+            cuerpo = text[m.end():marcas[i + 1].start()].strip().removesuffix("---").rstrip()
+        else:
+            cuerpo = text[m.end():].split("\n---\n")[0].strip()
+        cuerpos[m.group(1).strip()] = cuerpo
+    return cuerpos
+
+
+def _valor(texto: str) -> Any:
+    for tipo in (int, float):
+        try:
+            return tipo(texto)
+        except ValueError:
+            pass
+    return texto
+
+
+def reporte_desde_markdown(path: Path) -> Reporte:
+    """
+    Reconstruye un Reporte desde un .md ya escrito (reportes previos, catálogo, evaluación
+    por lotes): instrucción, explicación, referencias de evidencia, cálculo individual y
+    tipos de las otras acciones. Las estadísticas y resultados completos no se recuperan.
+    """
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    cuerpos = secciones_markdown(text)
+
+    fecha = re.search(r"\*\*Fecha:\*\* (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})", text)
+    evidencia = [
+        {"doc_id": m.group(2), "chunk_id": int(m.group(3)), "source_path": m.group(4), "text": ""}
+        for m in _REFERENCIA.finditer(cuerpos.get(titulo("evidencia"), ""))
+    ]
+    calc = {}
+    for linea in cuerpos.get(titulo("calculo"), "").splitlines():
+        clave, sep, valor = linea.partition(": ")
+        if sep and not clave.startswith("`"):
+            calc[clave.strip()] = _valor(valor.strip())
+    otros = re.findall(r"^### (\w+)$", cuerpos.get(titulo("otros"), ""), re.MULTILINE)
+
+    return Reporte(
+        nombre=path.stem,
+        fecha=(
+            datetime.strptime(fecha.group(1), "%Y-%m-%d %H:%M:%S")
+            if fecha
+            else datetime.fromtimestamp(path.stat().st_mtime)
+        ),
+        markdown=text,
+        instruction=cuerpos.get(titulo("instruccion"), "").removeprefix("> ").strip(),
+        rag_evidence=evidencia,
+        explanation_text=cuerpos.get(titulo("explicacion"), ""),
+        calc_result=calc or None,
+        otros_resultados={tipo: None for tipo in otros} or None,
+        path=path,
+    )
@@ -0,0 +1,311 @@
+# src/repricing.py
+import pickle
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .business_rules import calcular_soat_vectorizado, codificar_portafolio
+from .config import REPRICING_DIR, REPRICING_MARCADAS_EN_MEMORIA
+
+# Columnas del archivo de diferencias (solo las necesarias, para acotar memoria)
+COLUMNAS_DIFF = [
+    "placa",
+    "tipo_vehiculo",
+    "ciudad",
+    "zona_riesgo",
+    "valor_soat_actual",
+    "valor_estimado",
+    "diferencia",
+    "diferencia_pct",
+    "estado",
+]
+
+# Filas de mayor diferencia que se incluyen en el resumen
+TOP_RESUMEN = 5
+
+# Formatos del archivo de diferencias
+FORMATOS_DIFF = ("csv", "parquet")
+
+# Columnas auxiliares del orden: posición en el portafolio y -|diferencia|
+_POS = "__pos"
+_CLAVE = "__clave"
+
+
+def _repricing_chunk(chunk: pd.DataFrame, umbral: float):
+    """
+    Calcula estimado y diferencias de un bloque; devuelve (agregados por tipo, filas
+    marcadas, máscara de las filas marcadas dentro del bloque).
+    """
+    codigos = codificar_portafolio(
+        chunk["tipo_vehiculo"].to_numpy(),
+        chunk["cilindraje"].to_numpy(),
+        chunk["edad_conductor"].to_numpy(),
+        chunk["numero_siniestros_12m"].to_numpy(),
+        chunk["zona_riesgo"].to_numpy(),
+        chunk["anios_sin_siniestros"].to_numpy(),
+    )
+    estimado = calcular_soat_vectorizado(codigos)["valor_estimado"]
+    actual = chunk["valor_soat_actual"].to_numpy(dtype=np.int64)
+    diferencia = actual - estimado
+    diferencia_pct = diferencia / estimado * 100
+
+    sub = diferencia_pct < -umbral * 100
+    sobre = diferencia_pct > umbral * 100
+
+    agregados = pd.DataFrame(
+        {
+            "tipo_vehiculo": chunk["tipo_vehiculo"].to_numpy(),
+            "polizas": 1,
+            "ingreso_actual": actual,
+            "ingreso_estimado": estimado,
+            "subvaloradas": sub.astype(np.int64),
+            "sobrevaloradas": sobre.astype(np.int64),
+        }
+    ).groupby("tipo_vehiculo").sum()
+
+    marcadas = sub | sobre
+    filas = pd.DataFrame(
+        {
+            "placa": chunk["placa"].to_numpy()[marcadas],
+            "tipo_vehiculo": chunk["tipo_vehiculo"].to_numpy()[marcadas],
+            "ciudad": chunk["ciudad"].to_numpy()[marcadas],
+            "zona_riesgo": chunk["zona_riesgo"].to_numpy()[marcadas],
+            "valor_soat_actual": actual[marcadas],
+            "valor_estimado": estimado[marcadas],
+            "diferencia": diferencia[marcadas],
+            "diferencia_pct": diferencia_pct[marcadas].astype(np.float32),
+            "estado": np.where(sub[marcadas], "subvalorada", "sobrevalorada"),
+        },
+        columns=COLUMNAS_DIFF,
+    )
+    return agregados, filas, marcadas
+
+
+def validar_parametros(umbral: Any, formato: Any) -> None:
+    """ValueError si el umbral no es una fracción en (0, 1) o el formato no es soportado."""
+    if isinstance(umbral, bool) or not isinstance(umbral, (int, float)) or not 0 < umbral < 1:
+        raise ValueError(f"'umbral' inválido: {umbral!r} (se espera una fracción entre 0 y 1, p. ej. 0.10)")
+    if formato not in FORMATOS_DIFF:
+        raise ValueError(f"'formato' inválido: {formato!r} (opciones: {', '.join(FORMATOS_DIFF)})")
+
+
+def nombre_diff(fecha: datetime) -> str:
+    """Nombre único del archivo de diferencias (igual criterio que reporter.nombre_reporte)."""
+    return f"repricing_{fecha.strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+
+
+class _EscritorDiff:
+    """Escribe el archivo de diferencias por partes: Parquet si se pidió y hay pyarrow, si no CSV."""
+
+    def __init__(self, formato: str, log):
+        self.formato = formato
+        if formato == "parquet":
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except ImportError as e:
+                log(f"[WARN] No se pudo escribir Parquet ({e}); el archivo de diferencias se guarda en CSV.")
+                self.formato = "csv"
+        REPRICING_DIR.mkdir(parents=True, exist_ok=True)
+        self.path = REPRICING_DIR / f"{nombre_diff(datetime.now())}.{self.formato}"
+        self.filas = 0
+        self._parquet = None
+
+    def escribir(self, filas: pd.DataFrame):
+        if filas.empty:
+            return
+        if self.formato == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            tabla = pa.Table.from_pandas(filas, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(str(self.path), tabla.schema)
+            self._parquet.write_table(tabla)
+        else:
+            filas.to_csv(self.path, index=False, header=self.filas == 0, mode="w" if self.filas == 0 else "a")
+        self.filas += len(filas)
+
+    def cerrar(self) -> Path:
+        if self._parquet is not None:
+            self._parquet.close()
+        elif self.filas == 0:
+            vacio = pd.DataFrame(columns=COLUMNAS_DIFF)
+            if self.formato == "parquet":
+                vacio.to_parquet(self.path, index=False)
+            else:
+                vacio.to_csv(self.path, index=False)
+        return self.path
+
+
+class DiffOrdenado:
+    """
+    Filas marcadas ordenadas por |diferencia| descendente, con desempate por posición
+    en el portafolio (el mismo orden que un argsort estable sobre todo el portafolio).
+
+    La memoria queda acotada: se acumulan hasta `max_memoria` filas; al superarlo se
+    ordenan y se vuelcan a disco como una corrida, y al escribir se mezclan las
+    corridas (k-way) leyendo `bloque` filas de cada una a la vez.
+    """
+
+    def __init__(self, max_memoria: int = REPRICING_MARCADAS_EN_MEMORIA, bloque: int = 65_536):
+        self.max_memoria = max_memoria
+        self.bloque = bloque
+        self.n_filas = 0
+        self._pendientes: List[pd.DataFrame] = []
+        self._n_pendientes = 0
+        self._corridas: List[Path] = []
+        self._dir: Optional[Path] = None
+
+    def agregar(self, filas: pd.DataFrame, posiciones: np.ndarray):
+        """Filas marcadas (columnas COLUMNAS_DIFF) y su posición en el portafolio."""
+        if filas.empty:
+            return
+        filas = filas.assign(**{_POS: np.asarray(posiciones, dtype=np.int64)})
+        self._pendientes.append(filas)
+        self._n_pendientes += len(filas)
+        self.n_filas += len(filas)
+        if self._n_pendientes > self.max_memoria:
+            self._volcar()
+
+    def _ordenar_pendientes(self) -> pd.DataFrame:
+        df = pd.concat(self._pendientes, ignore_index=True)
+        self._pendientes, self._n_pendientes = [], 0
+        df[_CLAVE] = -np.abs(df["diferencia"].to_numpy(dtype=np.int64))
+        orden = np.lexsort((df[_POS].to_numpy(), df[_CLAVE].to_numpy()))
+        return df.iloc[orden].reset_index(drop=True)
+
+    def _volcar(self):
+        if self._dir is None:
+            REPRICING_DIR.mkdir(parents=True, exist_ok=True)
+            self._dir = Path(tempfile.mkdtemp(prefix=".corridas_", dir=REPRICING_DIR))
+        df = self._ordenar_pendientes()
+        path = self._dir / f"{len(self._corridas):05d}.pkl"
+        with open(path, "wb") as f:
+            for i in range(0, len(df), self.bloque):
+                pickle.dump(df.iloc[i:i + self.bloque], f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._corridas.append(path)
+
+    @staticmethod
+    def _leer(path: Path):
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def _lotes(self):
+        """Lotes de filas en el orden final (con las columnas auxiliares)."""
+        if not self._corridas:
+            if self._pendientes:
+                yield self._ordenar_pendientes()
+            return
+        if self._pendientes:
+            self._volcar()
+        lectores = [self._leer(p) for p in self._corridas]
+        actuales = [next(lector, None) for lector in lectores]
+        while True:
+            vivos = [i for i, b in enumerate(actuales) if b is not None]
+            if not vivos:
+                return
+            # Frontera: la menor de las últimas claves cargadas; todo lo que falta leer de
+            # cada corrida es mayor o igual que la última clave de su bloque
+            frontera = min((actuales[i][_CLAVE].iat[-1], actuales[i][_POS].iat[-1]) for i in vivos)
+            partes = []
+            for i in vivos:
+                bloque = actuales[i]
+                clave, pos = bloque[_CLAVE].to_numpy(), bloque[_POS].to_numpy()
+                n = int(((clave < frontera[0]) | ((clave == frontera[0]) & (pos <= frontera[1]))).sum())
+                partes.append(bloque.iloc[:n])
+                actuales[i] = bloque.iloc[n:] if n < len(bloque) else next(lectores[i], None)
+            lote = pd.concat(partes, ignore_index=True)
+            yield lote.iloc[np.lexsort((lote[_POS].to_numpy(), lote[_CLAVE].to_numpy()))]
+
+    def escribir(self, formato: str, log) -> Tuple[Path, pd.DataFrame]:
+        """Escribe el archivo de diferencias; devuelve (ruta, primeras TOP_RESUMEN filas)."""
+        escritor = _EscritorDiff(formato, log)
+        top: List[pd.DataFrame] = []
+        n_top = 0
+        try:
+            for lote in self._lotes():
+                lote = lote[COLUMNAS_DIFF]
+                if n_top < TOP_RESUMEN:
+                    top.append(lote.head(TOP_RESUMEN - n_top))
+                    n_top += len(top[-1])
+                escritor.escribir(lote)
+        finally:
+            path = escritor.cerrar()
+            if self._dir is not None:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir, self._corridas = None, []
+        mayores = pd.concat(top, ignore_index=True) if top else pd.DataFrame(columns=COLUMNAS_DIFF)
+        return path, mayores
+
+
+def repricing_por_bloques(
+    chunks: Iterable[pd.DataFrame],
+    umbral: float = 0.10,
+    formato: str = "csv",
+    log=print,
+) -> Dict[str, Any]:
+    """
+    Compara valor_soat_actual contra el valor estimado para cada póliza, bloque a bloque.
+
+    Marca como subvalorada/sobrevalorada toda póliza cuya diferencia relativa supere
+    el umbral (0.10 = 10 %), escribe el archivo de diferencias ordenado por magnitud
+    (con memoria acotada, ver DiffOrdenado) y devuelve solo un resumen agregado (apto
+    para el reasoner y el reporte).
+    """
+    agregados: Optional[pd.DataFrame] = None
+    diff = DiffOrdenado()
+    inicio = 0
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        ag, filas, mascara = _repricing_chunk(chunk, umbral)
+        agregados = ag if agregados is None else agregados.add(ag, fill_value=0)
+        diff.agregar(filas, inicio + np.flatnonzero(mascara))
+        inicio += len(chunk)
+
+    if agregados is None:
+        raise ValueError("El portafolio está vacío.")
+    return resumir_repricing(agregados, diff, umbral, formato, log)
+
+
+def resumir_repricing(
+    agregados: pd.DataFrame,
+    diff: DiffOrdenado,
+    umbral: float,
+    formato: str = "csv",
+    log=print,
+) -> Dict[str, Any]:
+    """
+    Resumen final a partir de los agregados por tipo y de las filas marcadas (lo
+    comparten el recorrido por bloques y la ejecución por shards).
+    """
+    path, mayores = diff.escribir(formato, log)
+
+    agregados = agregados.astype(np.int64)
+    agregados["delta"] = agregados["ingreso_estimado"] - agregados["ingreso_actual"]
+    ingreso_actual = int(agregados["ingreso_actual"].sum())
+    ingreso_estimado = int(agregados["ingreso_estimado"].sum())
+
+    return {
+        "n_polizas": int(agregados["polizas"].sum()),
+        "umbral_pct": umbral * 100,
+        "ingreso_actual": ingreso_actual,
+        "ingreso_estimado": ingreso_estimado,
+        "delta_total": ingreso_estimado - ingreso_actual,
+        "n_subvaloradas": int(agregados["subvaloradas"].sum()),
+        "n_sobrevaloradas": int(agregados["sobrevaloradas"].sum()),
+        "por_tipo": agregados,
+        "mayores_diferencias": mayores.to_dict(orient="records"),
+        "archivo": str(path),
+    }
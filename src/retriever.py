@@ -1,14 +1,33 @@
 # src/retriever.py
+import json
 import os
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, List, Dict, Tuple
 
-import pdfplumber
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 
-from .config import DOCS_DIR, CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_DOCS
+from .bm25 import IndiceBM25, analizador_identidad, tokenizar
+from .hashing_index import IndiceHashing
+from .config import (
+    DOCS_DIR,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    TOP_K_DOCS,
+    RAG_CACHE_SIZE,
+    RAG_SCORER,
+    RAG_PESO_BM25,
+    BM25_K1,
+    BM25_B,
+    RAG_INDEX_MODE,
+    RAG_HASH_FEATURES,
+    RAG_INDEX_DIR,
+)
+
+SCORERS = ("tfidf", "bm25", "hibrido")
+MODOS_INDICE = ("vocabulario", "hashing")
 
 @dataclass
 class DocumentChunk:
@@ -17,13 +36,54 @@ class DocumentChunk:
     text: str
     source_path: Path
 
+def normalizar_consulta(query: str) -> str:
+    """Minúsculas y espacios colapsados: no cambia los tokens que ve el vectorizador."""
+    return " ".join(query.lower().split())
+
+
+def _fusionar(bm25: np.ndarray, coseno: np.ndarray) -> np.ndarray:
+    """Suma ponderada de BM25 y coseno TF-IDF, cada uno normalizado por su máximo."""
+    return (
+        RAG_PESO_BM25 * bm25 / max(float(bm25.max()), 1e-12)
+        + (1 - RAG_PESO_BM25) * coseno / max(float(coseno.max()), 1e-12)
+    )
+
+
+def _mejores(candidatos: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    orden = np.argsort(-scores, kind="stable")[:top_k]
+    return [(int(candidatos[i]), float(scores[i])) for i in orden]
+
+
 class KnowledgeBase:
-    def __init__(self):
+    def __init__(
+        self,
+        cache_size: int = RAG_CACHE_SIZE,
+        scorer: str = RAG_SCORER,
+        modo: str = RAG_INDEX_MODE,
+    ):
+        if scorer not in SCORERS:
+            raise ValueError(f"scorer debe ser uno de {SCORERS}")
+        if modo not in MODOS_INDICE:
+            raise ValueError(f"modo debe ser uno de {MODOS_INDICE}")
+        self.scorer = scorer
+        self.modo = modo
         self.chunks: List[DocumentChunk] = []
         self.vectorizer = None
         self.tfidf_matrix = None
+        self.bm25: IndiceBM25 = None
+        self.hashing: IndiceHashing = None
+        # Versión del índice: cambia en cada (re)indexación e invalida la caché
+        self.version = 0
+        # LRU (versión, consulta normalizada, top_k) -> [(posición del chunk, score)]
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, str, int], List[Tuple[int, float]]]" = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_lock = threading.Lock()
 
     def _load_pdf(self, path: Path) -> str:
+        import pdfplumber  # solo hace falta al (re)indexar PDFs
+
         text = ""
         with pdfplumber.open(path) as pdf:
             for page in pdf.pages:
@@ -52,8 +112,7 @@ class KnowledgeBase:
         return chunks
 
     def index_documents(self, docs_dir: Path = DOCS_DIR):
-        self.chunks = []
-        texts = []
+        documentos: Dict[str, str] = {}
 
         for filename in os.listdir(docs_dir):
             path = docs_dir / filename
@@ -63,43 +122,178 @@ class KnowledgeBase:
                 continue
 
             try:
-                text = self._load_pdf(path)
+                documentos[filename] = self._load_pdf(path)
             except Exception as e:
                 print(f"[WARN] No se pudo leer {filename}: {e}")
                 continue
 
-            doc_chunks = self._chunk_text(text, filename, path)
-            self.chunks.extend(doc_chunks)
+        self.index_texts(documentos, docs_dir)
+
+    def index_texts(self, documentos: Dict[str, str], docs_dir: Path = DOCS_DIR):
+        """Indexa textos ya extraídos (doc_id -> texto); lo usa index_documents y los benchmarks."""
+        self._nueva_version()
+
+        self.chunks = []
+        for doc_id, text in documentos.items():
+            self.chunks.extend(self._chunk_text(text, doc_id, docs_dir / doc_id))
 
         if not self.chunks:
             print("[WARN] No hay chunks para indexar.")
             return
 
-        texts = [c.text for c in self.chunks]
-        # self.vectorizer = TfidfVectorizer(stop_words="spanish")
-        self.vectorizer = TfidfVectorizer(stop_words=None)
-
-        self.tfidf_matrix = self.vectorizer.fit_transform(texts)
+        # Se tokeniza una sola vez (plegado de tildes, palabras vacías y raíces del
+        # español) y todos los índices comparten los mismos tokens
+        tokens = [tokenizar(c.text) for c in self.chunks]
+        if self.modo == "hashing":
+            self.hashing = IndiceHashing(RAG_HASH_FEATURES, k1=BM25_K1, b=BM25_B)
+            self.hashing.agregar(tokens)
+        else:
+            self._ajustar_vocabulario(tokens)
         print(f"[INFO] Indexados {len(self.chunks)} chunks de documentación SOAT.")
 
+    def agregar_textos(self, documentos: Dict[str, str], docs_dir: Path = DOCS_DIR):
+        """
+        Agrega documentos al índice existente. En modo "hashing" solo se procesan los
+        nuevos; en modo "vocabulario" hay que reajustar el vectorizador con todo el corpus.
+        """
+        self._nueva_version()
+
+        nuevos: List[DocumentChunk] = []
+        for doc_id, text in documentos.items():
+            nuevos.extend(self._chunk_text(text, doc_id, docs_dir / doc_id))
+        if not nuevos:
+            return
+        self.chunks.extend(nuevos)
+
+        if self.modo == "hashing":
+            if self.hashing is None:
+                self.hashing = IndiceHashing(RAG_HASH_FEATURES, k1=BM25_K1, b=BM25_B)
+            self.hashing.agregar([tokenizar(c.text) for c in nuevos])
+        else:
+            self._ajustar_vocabulario([tokenizar(c.text) for c in self.chunks])
+        print(f"[INFO] Agregados {len(nuevos)} chunks (total {len(self.chunks)}).")
+
+    def _ajustar_vocabulario(self, tokens: List[List[str]]):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.vectorizer = TfidfVectorizer(analyzer=analizador_identidad)
+        self.tfidf_matrix = self.vectorizer.fit_transform(tokens)
+        self.bm25 = IndiceBM25(tokens, k1=BM25_K1, b=BM25_B) if self.scorer != "tfidf" else None
+
+    def _nueva_version(self):
+        with self._cache_lock:
+            self.version += 1
+            self._cache.clear()
+
+    def guardar_indice(self, directorio: Path = RAG_INDEX_DIR):
+        """Guarda el índice hashing y los chunks para abrirlos con cargar_indice."""
+        if self.hashing is None:
+            raise RuntimeError("Solo se puede guardar un índice en modo 'hashing'.")
+        self.hashing.guardar(directorio)
+        chunks = [
+            {"doc_id": c.doc_id, "chunk_id": c.chunk_id, "text": c.text, "source_path": str(c.source_path)}
+            for c in self.chunks
+        ]
+        tmp = directorio / f".chunks.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, directorio / "chunks.json")
+
+    def cargar_indice(self, directorio: Path = RAG_INDEX_DIR, mmap: bool = True):
+        """
+        Abre un índice guardado con guardar_indice. Con mmap=True la matriz se mapea
+        desde disco, así que varios procesos que la abren comparten las mismas páginas.
+        """
+        self._nueva_version()
+        self.modo = "hashing"
+        self.hashing = IndiceHashing.cargar(directorio, mmap=mmap)
+        chunks = json.loads((directorio / "chunks.json").read_text(encoding="utf-8"))
+        self.chunks = [
+            DocumentChunk(doc_id=c["doc_id"], chunk_id=c["chunk_id"], text=c["text"], source_path=Path(c["source_path"]))
+            for c in chunks
+        ]
+        print(f"[INFO] Índice cargado desde {directorio} ({len(self.chunks)} chunks).")
+
     def retrieve(self, query: str, top_k: int = TOP_K_DOCS) -> List[Dict]:
-        if self.vectorizer is None or self.tfidf_matrix is None:
+        if self.hashing is None and (self.vectorizer is None or self.tfidf_matrix is None):
             raise RuntimeError("La base de conocimiento no está indexada.")
 
-        query_vec = self.vectorizer.transform([query])
-        sims = cosine_similarity(query_vec, self.tfidf_matrix)[0]
-        indices = sims.argsort()[::-1][:top_k]
+        clave = (self.version, normalizar_consulta(query), top_k)
+        with self._cache_lock:
+            ranking = self._cache.get(clave)
+            if ranking is not None:
+                self._cache.move_to_end(clave)
+                self._cache_hits += 1
+            else:
+                self._cache_misses += 1
+
+        if ranking is None:
+            ranking = self._rankear(query, top_k)
+            with self._cache_lock:
+                # Si se reindexó mientras tanto, la clave ya no coincide y no se guarda
+                if self.cache_size > 0 and clave[0] == self.version:
+                    self._cache[clave] = ranking
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
 
         results = []
-        for idx in indices:
+        for idx, score in ranking:
             c = self.chunks[idx]
             results.append(
                 {
                     "doc_id": c.doc_id,
                     "chunk_id": c.chunk_id,
-                    "score": float(sims[idx]),
+                    "score": score,
                     "text": c.text,
                     "source_path": str(c.source_path),
                 }
             )
         return results
+
+    def _rankear(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        tokens = tokenizar(query)
+
+        if self.hashing is not None:
+            candidatos, scores = self.hashing.puntuar(tokens)
+            if len(candidatos) == 0:
+                return []
+            if self.scorer == "tfidf":
+                scores = self.hashing.coseno(candidatos, tokens)
+            elif self.scorer == "hibrido":
+                scores = _fusionar(scores, self.hashing.coseno(candidatos, tokens))
+            return _mejores(candidatos, scores, top_k)
+
+        query_vec = self.vectorizer.transform([tokens])
+
+        if self.scorer == "tfidf":
+            from sklearn.metrics.pairwise import cosine_similarity
+
+            sims = cosine_similarity(query_vec, self.tfidf_matrix)[0]
+            indices = sims.argsort()[::-1][:top_k]
+            return [(int(idx), float(sims[idx])) for idx in indices]
+
+        # BM25 solo recorre los postings de los términos de la consulta; los chunks que
+        # no comparten ningún término tienen score 0 y no se devuelven
+        candidatos, scores = self.bm25.puntuar(tokens)
+        if len(candidatos) == 0:
+            return []
+
+        if self.scorer == "hibrido":
+            # Mismo vocabulario que BM25, así que el coseno TF-IDF también es 0 fuera
+            # de los candidatos: basta con calcularlo sobre sus filas (vectores ya en norma L2)
+            coseno = (self.tfidf_matrix[candidatos] @ query_vec.T).toarray().ravel()
+            scores = _fusionar(scores, coseno)
+
+        return _mejores(candidatos, scores, top_k)
+
+    def estadisticas_cache(self) -> Dict[str, Any]:
+        """Aciertos/fallos de la caché de consultas, para dimensionar RAG_CACHE_SIZE."""
+        with self._cache_lock:
+            consultas = self._cache_hits + self._cache_misses
+            return {
+                "version_indice": self.version,
+                "capacidad": self.cache_size,
+                "entradas": len(self._cache),
+                "aciertos": self._cache_hits,
+                "fallos": self._cache_misses,
+                "tasa_aciertos": self._cache_hits / consultas if consultas else 0.0,
+            }
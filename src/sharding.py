@@ -0,0 +1,311 @@
+# src/sharding.py
+"""
+Ejecución por shards de las acciones sobre todo el portafolio (estadísticas,
+repricing y consultas) en un pool de procesos.
+
+El dataset se parte por rangos de filas o por ciudad; cada proceso calcula un
+resultado parcial de su shard y el proceso principal los combina con funciones de
+combinación que reproducen la salida de la ruta de un solo proceso.
+
+Si el dataset del contexto está respaldado por un archivo Arrow (DATASET_SHARED_ENABLED,
+ver shared_dataset), los procesos no reciben el DataFrame: abren ese archivo con memoria
+mapeada y toman su shard sin copia. Si no, a cada proceso se le envía su shard serializado.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import SHARDING_POR, SHARDING_WORKERS
+from .query import compilar_filtros
+from .repricing import COLUMNAS_DIFF, DiffOrdenado, _repricing_chunk, resumir_repricing
+from .shared_dataset import abrir_arrow
+
+PARTICIONES = ("filas", "ciudad")
+
+# Columna auxiliar con la posición de la fila en el portafolio completo
+POS = "__pos"
+ORDEN = "__orden"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# En cada proceso del pool: índices de filtros y posiciones por shard (se reutilizan)
+_cache_worker: Dict[Tuple, Dict[str, Any]] = {}
+
+
+def _pool_procesos(workers: int) -> ProcessPoolExecutor:
+    """Pool persistente; "spawn" porque el proceso principal tiene hilos (sinks de traza)."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def _cerrar_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+
+
+def particionar(df: pd.DataFrame, n_shards: int, por: str = SHARDING_POR) -> List[Tuple]:
+    """
+    Especificaciones de shards:
+      - por="filas":  ("filas", inicio, fin) con rangos contiguos de igual tamaño.
+      - por="ciudad": ("ciudad", [ciudades]) agrupando ciudades en shards de tamaño parecido.
+    """
+    if por not in PARTICIONES:
+        raise ValueError(f"Partición no soportada: {por} (use {PARTICIONES})")
+    n = len(df)
+    if por == "filas":
+        cortes = np.linspace(0, n, n_shards + 1).astype(np.int64)
+        return [("filas", int(a), int(b)) for a, b in zip(cortes[:-1], cortes[1:]) if b > a]
+
+    conteos = df["ciudad"].value_counts(dropna=False)
+    cargas = [0] * n_shards
+    grupos: List[List[Any]] = [[] for _ in range(n_shards)]
+    # Reparto voraz: la ciudad más grande al shard con menos filas
+    for ciudad, filas in conteos.items():
+        i = int(np.argmin(cargas))
+        grupos[i].append(ciudad)
+        cargas[i] += int(filas)
+    return [("ciudad", sorted(g, key=str)) for g in grupos if g]
+
+
+def _posiciones_ciudad(df: pd.DataFrame, ciudades: List[Any]) -> np.ndarray:
+    return np.flatnonzero(df["ciudad"].isin(ciudades).to_numpy())
+
+
+def _fuentes(df: pd.DataFrame, arrow: Optional[Path], shards: List[Tuple]) -> List[Tuple]:
+    """
+    Qué recibe cada proceso: ("arrow", ruta) si `df` está respaldado por ese archivo,
+    o ("df", shard, posiciones) con el shard ya recortado del DataFrame en memoria.
+    """
+    if arrow is not None and arrow.exists():
+        return [("arrow", str(arrow))] * len(shards)
+
+    fuentes = []
+    for spec in shards:
+        if spec[0] == "filas":
+            posiciones = np.arange(spec[1], spec[2])
+            fuentes.append(("df", df.iloc[spec[1]:spec[2]], posiciones))
+        else:
+            posiciones = _posiciones_ciudad(df, spec[1])
+            fuentes.append(("df", df.take(posiciones), posiciones))
+    return fuentes
+
+
+def _cargar_shard(fuente: Tuple, spec: Tuple) -> Tuple[pd.DataFrame, np.ndarray, Dict[str, Any]]:
+    """En el proceso del pool: (shard, posiciones globales, caché de índices del shard)."""
+    if fuente[0] == "df":
+        return fuente[1], fuente[2], {}
+
+    df = abrir_arrow(Path(fuente[1]))
+    clave = (fuente[1],) + tuple(
+        tuple(x) if isinstance(x, list) else x for x in spec
+    )
+    cache = _cache_worker.setdefault(clave, {})
+    if spec[0] == "filas":
+        posiciones = cache.setdefault("posiciones", np.arange(spec[1], spec[2]))
+        shard = df.iloc[spec[1]:spec[2]]
+    else:
+        if "posiciones" not in cache:
+            cache["posiciones"] = _posiciones_ciudad(df, spec[1])
+        posiciones = cache["posiciones"]
+        shard = df.take(posiciones)
+    indices = cache.setdefault("indices", {})
+    return shard, posiciones, indices
+
+
+def _ejecutar_shard(tarea: str, fuente: Tuple, spec: Tuple, params: Dict[str, Any]) -> Any:
+    shard, posiciones, indices = _cargar_shard(fuente, spec)
+    return TAREAS[tarea](shard, posiciones, indices, **params)
+
+
+def ejecutar_por_shards(
+    df: pd.DataFrame,
+    arrow: Optional[Path],
+    tarea: str,
+    params: Dict[str, Any],
+    workers: int = SHARDING_WORKERS,
+    por: str = SHARDING_POR,
+) -> List[Any]:
+    """
+    Resultados parciales de `tarea` para cada shard, en el orden de los shards.
+    `arrow` es el archivo que respalda `df` (ExecutionContext.dataset_arrow) o None.
+    """
+    shards = particionar(df, workers, por)
+    fuentes = _fuentes(df, arrow, shards)
+    pool = _pool_procesos(workers)
+    futuros = [pool.submit(_ejecutar_shard, tarea, f, s, params) for f, s in zip(fuentes, shards)]
+    return [f.result() for f in futuros]
+
+
+# -----------------------
+# Estadísticas generales
+# -----------------------
+
+def _parcial_estadisticas(shard: pd.DataFrame, posiciones: np.ndarray, indices: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "por_tipo": shard.groupby("tipo_vehiculo")["valor_soat_actual"].agg(["count", "sum", "min", "max"]),
+        "con_siniestros": int((shard["numero_siniestros_12m"].to_numpy() > 0).sum()),
+        "n": len(shard),
+    }
+
+
+def combinar_estadisticas(parciales: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Mismo resultado que executor.estadisticas_generales: count/mean/min/max por tipo."""
+    por_tipo = pd.concat([p["por_tipo"] for p in parciales]).groupby(level=0).agg(
+        {"count": "sum", "sum": "sum", "min": "min", "max": "max"}
+    )
+    por_tipo["mean"] = por_tipo["sum"] / por_tipo["count"]
+    n = sum(p["n"] for p in parciales)
+    return {
+        "stats_por_tipo": por_tipo[["count", "mean", "min", "max"]],
+        "porcentaje_con_siniestros": sum(p["con_siniestros"] for p in parciales) / n * 100,
+    }
+
+
+# -----------------------
+# Repricing
+# -----------------------
+
+def _parcial_repricing(
+    shard: pd.DataFrame,
+    posiciones: np.ndarray,
+    indices: Dict[str, Any],
+    umbral: float,
+    chunk_size: int,
+) -> Tuple[Optional[pd.DataFrame], pd.DataFrame]:
+    agregados: Optional[pd.DataFrame] = None
+    marcadas: List[pd.DataFrame] = []
+    for i in range(0, len(shard), chunk_size):
+        ag, filas, mascara = _repricing_chunk(shard.iloc[i:i + chunk_size], umbral)
+        agregados = ag if agregados is None else agregados.add(ag, fill_value=0)
+        if not filas.empty:
+            filas[POS] = posiciones[i:i + chunk_size][mascara]
+            marcadas.append(filas)
+    diff = pd.concat(marcadas, ignore_index=True) if marcadas else pd.DataFrame(columns=COLUMNAS_DIFF + [POS])
+    return agregados, diff
+
+
+def combinar_repricing(
+    parciales: List[Tuple[Optional[pd.DataFrame], pd.DataFrame]],
+    umbral: float,
+    formato: str = "csv",
+    log: Callable[[str], None] = print,
+) -> Dict[str, Any]:
+    """Suma los agregados y ordena las filas marcadas como en el recorrido por bloques."""
+    agregados: Optional[pd.DataFrame] = None
+    for ag, _ in parciales:
+        if ag is not None:
+            agregados = ag if agregados is None else agregados.add(ag, fill_value=0)
+    if agregados is None:
+        raise ValueError("El portafolio está vacío.")
+
+    # Con shards por ciudad las posiciones se intercalan: DiffOrdenado desempata por
+    # posición igual que el ordenamiento estable del recorrido secuencial
+    diff = DiffOrdenado()
+    for _, d in parciales:
+        diff.agregar(d[COLUMNAS_DIFF], d[POS].to_numpy())
+    return resumir_repricing(agregados, diff, umbral, formato, log)
+
+
+# -----------------------
+# Consultas
+# -----------------------
+
+def _parcial_consulta(
+    shard: pd.DataFrame,
+    posiciones: np.ndarray,
+    indices: Dict[str, Any],
+    consulta: Dict[str, Any],
+) -> Dict[str, Any]:
+    mascara = compilar_filtros(shard, consulta["filtros"], indices)
+    locales = np.flatnonzero(mascara)
+    ordenar_por = consulta["ordenar_por"]
+
+    # Candidatas: las `limite` primeras del shard en el orden final de la consulta
+    if ordenar_por is not None and len(locales):
+        orden = np.argsort(shard[ordenar_por].to_numpy()[locales], kind="stable")
+        if consulta["descendente"]:
+            orden = orden[::-1]
+        locales_top = locales[orden[:consulta["limite"]]]
+    else:
+        locales_top = locales[:consulta["limite"]]
+
+    candidatas = shard.iloc[locales_top][consulta["columnas"]].copy()
+    candidatas[POS] = posiciones[locales_top]
+    if ordenar_por is not None:
+        candidatas[ORDEN] = shard[ordenar_por].to_numpy()[locales_top]
+
+    valores = shard["valor_soat_actual"].to_numpy()[mascara]
+    parcial = {"total": len(locales), "suma": int(valores.sum()), "candidatas": candidatas}
+
+    agrupar_por = consulta["agrupar_por"]
+    if agrupar_por is not None:
+        seleccion = pd.DataFrame(
+            {
+                agrupar_por: shard[agrupar_por].to_numpy()[mascara],
+                "valor_soat_actual": valores,
+                "con_siniestros": shard["numero_siniestros_12m"].to_numpy()[mascara] > 0,
+            }
+        )
+        parcial["por_grupo"] = seleccion.groupby(agrupar_por).agg(
+            polizas=("valor_soat_actual", "count"),
+            suma=("valor_soat_actual", "sum"),
+            con_siniestros=("con_siniestros", "sum"),
+        )
+    return parcial
+
+
+def combinar_consulta(parciales: List[Dict[str, Any]], consulta: Dict[str, Any]) -> Dict[str, Any]:
+    """Mismo resultado que query.ejecutar_consulta sobre el dataset completo."""
+    total = sum(p["total"] for p in parciales)
+    candidatas = pd.concat([p["candidatas"] for p in parciales], ignore_index=True)
+    if consulta["ordenar_por"] is not None:
+        # argsort estable global = orden por (valor, posición) con NaN al final; descendente
+        # lo invierte entero, así que los NaN quedan primero
+        desc = consulta["descendente"]
+        candidatas = candidatas.sort_values(
+            [ORDEN, POS], ascending=not desc, kind="stable", na_position="first" if desc else "last"
+        )
+    else:
+        candidatas = candidatas.sort_values(POS, kind="stable")
+    filas = candidatas.head(consulta["limite"])[consulta["columnas"]]
+
+    resultado = {
+        "filtros": consulta["filtros"],
+        "total": total,
+        "columnas": consulta["columnas"],
+        "filas": filas.to_dict(orient="records"),
+    }
+    if total:
+        suma = sum(p["suma"] for p in parciales)
+        resultado["valor_soat_actual_total"] = suma
+        resultado["valor_soat_actual_promedio"] = suma / total
+
+    agrupar_por = consulta["agrupar_por"]
+    if agrupar_por is not None:
+        por_grupo = pd.concat([p["por_grupo"] for p in parciales]).groupby(level=0).sum()
+        por_grupo["valor_promedio"] = por_grupo["suma"] / por_grupo["polizas"]
+        por_grupo.index.name = agrupar_por
+        resultado["por_grupo"] = por_grupo[["polizas", "valor_promedio", "con_siniestros"]]
+    return resultado
+
+
+TAREAS: Dict[str, Callable[..., Any]] = {
+    "estadisticas": _parcial_estadisticas,
+    "repricing": _parcial_repricing,
+    "consulta": _parcial_consulta,
+}
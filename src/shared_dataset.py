@@ -0,0 +1,103 @@
+# src/shared_dataset.py
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from .config import CACHE_DIR
+from .quote_cache import huella_ruta, version_dataset
+
+DATASET_CACHE_DIR = CACHE_DIR / "dataset"
+
+# DataFrames ya mapeados en este proceso (ruta del .arrow -> DataFrame)
+_abiertos: Dict[Path, pd.DataFrame] = {}
+_lock = threading.Lock()
+
+
+def _prefijo(dataset_path: Path) -> str:
+    """Prefijo de los archivos Arrow de un dataset: nombre + huella de su ruta absoluta
+    (dos CSV con el mismo nombre en carpetas distintas no comparten prefijo)."""
+    dataset_path = Path(dataset_path)
+    return f"{dataset_path.stem}_{huella_ruta(dataset_path)}_"
+
+
+def ruta_compartida(dataset_path: Path, version: Optional[str] = None) -> Path:
+    """Archivo Arrow del dataset; la clave cambia si cambia el CSV (o `version` dada)."""
+    return DATASET_CACHE_DIR / f"{_prefijo(dataset_path)}{version or version_dataset(dataset_path)}.arrow"
+
+
+def construir_arrow(dataset_path: Path, destino: Path) -> None:
+    """Convierte el CSV a un archivo Arrow IPC sin compresión (requisito para mapearlo)."""
+    import pyarrow as pa
+
+    tabla = pa.Table.from_pandas(pd.read_csv(dataset_path), preserve_index=False)
+    DATASET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(f".{destino.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp), "wb") as salida:
+        with pa.ipc.new_file(salida, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    os.replace(tmp, destino)
+
+    # Las versiones anteriores del mismo dataset (misma ruta) ya no se usan
+    for viejo in DATASET_CACHE_DIR.glob(f"{_prefijo(dataset_path)}*.arrow"):
+        if viejo != destino:
+            viejo.unlink(missing_ok=True)
+
+
+def abrir_arrow(destino: Path) -> pd.DataFrame:
+    """DataFrame sobre un archivo Arrow ya construido (mapeado una vez por proceso)."""
+    import pyarrow as pa
+
+    with _lock:
+        df = _abiertos.get(destino)
+        if df is None:
+            df = _mapear(pa, destino)
+            _abiertos[destino] = df
+    return df.copy(deep=False)
+
+
+def _mapear(pa, destino: Path) -> pd.DataFrame:
+    tabla = pa.ipc.open_file(pa.memory_map(str(destino), "r")).read_all()
+    # split_blocks evita consolidar columnas numéricas en bloques nuevos (copias)
+    return tabla.to_pandas(split_blocks=True)
+
+
+def dataset_compartido(
+    dataset_path: Path,
+    log: Callable[[str], None] = print,
+    version: Optional[str] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Dataset respaldado por un archivo Arrow con memoria mapeada.
+
+    Las columnas del DataFrame apuntan directamente a las páginas del archivo (sin copia),
+    así que todas las sesiones de un proceso y todos los procesos que abren el mismo
+    dataset comparten una sola copia en la caché de páginas del sistema. Los arrays son
+    de solo lectura; con copy-on-write de pandas, agregar o modificar columnas en un
+    contexto no afecta a los demás.
+
+    `version` es la de version_dataset si el llamador ya la tomó. Devuelve None (y el
+    llamador lee el CSV) si pyarrow no está instalado.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        log("[WARN] pyarrow no está instalado; se carga el dataset en memoria privada.")
+        return None
+
+    destino = ruta_compartida(dataset_path, version)
+    with _lock:
+        df = _abiertos.get(destino)
+        if df is None:
+            if not destino.exists():
+                construir_arrow(dataset_path, destino)
+                log(f"Dataset convertido a Arrow: {destino.name}")
+            df = _mapear(pa, destino)
+            # Solo se conserva la versión vigente de cada dataset
+            for ruta in [r for r in _abiertos if r.name.startswith(_prefijo(dataset_path))]:
+                del _abiertos[ruta]
+            _abiertos[destino] = df
+    # Vista propia por contexto: mismas columnas, sin copiar datos
+    return df.copy(deep=False)
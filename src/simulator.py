@@ -0,0 +1,185 @@
+# src/simulator.py
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .business_rules import (
+    GRUPOS_TARIFA,
+    codificar_portafolio,
+    tabla_grupo,
+    validar_factores,
+)
+
+SEGMENTOS_SOPORTADOS = [
+    "tipo_vehiculo",
+    "zona_riesgo",
+    "ciudad",
+    "uso_vehiculo",
+    "genero_conductor",
+]
+
+
+def _combinaciones(df: pd.DataFrame, segmentos: List[str]):
+    """
+    Agrupa las pólizas por combinación única de (códigos de factores + segmentos).
+
+    El valor estimado de una póliza depende solo de sus códigos de factores, así que
+    basta con evaluar cada combinación distinta una vez por escenario y ponderar por
+    el número de pólizas que la comparten (K combinaciones << N pólizas).
+    """
+    codigos = codificar_portafolio(
+        df["tipo_vehiculo"].to_numpy(),
+        df["cilindraje"].to_numpy(),
+        df["edad_conductor"].to_numpy(),
+        df["numero_siniestros_12m"].to_numpy(),
+        df["zona_riesgo"].to_numpy(),
+        df["anios_sin_siniestros"].to_numpy(),
+    )
+
+    columnas = [codigos[g].astype(np.int64) for g in GRUPOS_TARIFA]
+    radios = [len(GRUPOS_TARIFA[g]) for g in GRUPOS_TARIFA]
+    categorias_seg = {}
+    for seg in segmentos:
+        cods, cats = pd.factorize(df[seg], use_na_sentinel=False)
+        categorias_seg[seg] = [str(c) for c in cats]
+        columnas.append(cods.astype(np.int64))
+        radios.append(max(len(cats), 1))
+
+    # Clave entera de radix mixto para agrupar con np.unique (mucho más rápido que axis=0)
+    clave = np.zeros(len(df), dtype=np.int64)
+    for col, radio in zip(columnas, radios):
+        clave = clave * radio + col
+    claves_unicas, conteos = np.unique(clave, return_counts=True)
+
+    # Decodificar cada columna de la clave
+    decodificadas = []
+    resto = claves_unicas
+    for radio in reversed(radios):
+        decodificadas.append(resto % radio)
+        resto = resto // radio
+    decodificadas.reverse()
+
+    n_grupos = len(GRUPOS_TARIFA)
+    combos = dict(zip(GRUPOS_TARIFA, decodificadas[:n_grupos]))
+    combos_seg = dict(zip(segmentos, decodificadas[n_grupos:]))
+    return combos, combos_seg, categorias_seg, conteos
+
+
+def _estimados_por_escenario(combos: Dict[str, np.ndarray], params: List[Dict[str, float]]) -> np.ndarray:
+    """Matriz (escenarios × combinaciones) de valores estimados, misma fórmula que calcular_soat_estimado."""
+    base = tabla_grupo("tarifa", params)[:, combos["tarifa"]]
+    f_edad = tabla_grupo("edad", params)[:, combos["edad"]]
+    f_sin = tabla_grupo("siniestros", params)[:, combos["siniestros"]]
+    f_zona = tabla_grupo("zona", params)[:, combos["zona"]]
+    f_hist = tabla_grupo("historial", params)[:, combos["historial"]]
+
+    bruto = base * f_edad * f_sin * f_zona * f_hist
+
+    lim_min = np.array([p["limite_min_factor"] for p in params])[:, None]
+    lim_max = np.array([p["limite_max_factor"] for p in params])[:, None]
+    minimo = base * lim_min
+    maximo = base * lim_max
+
+    ajustado = np.maximum(minimo, np.minimum(maximo, bruto))
+    return np.ceil(ajustado / 1000.0) * 1000
+
+
+def simular_escenarios_portafolio(
+    df: pd.DataFrame,
+    escenarios: List[Dict[str, Any]],
+    segmentos: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Evalúa N escenarios de tarifa sobre todo el portafolio como un cálculo
+    vectorizado (escenarios × combinaciones de póliza).
+
+    Cada escenario es un dict {"nombre": str, "factores": {parametro: valor}} donde
+    los parámetros son claves de PARAMETROS_TARIFA. El escenario base (tarifa vigente)
+    se agrega siempre como referencia.
+
+    Devuelve:
+    - resumen por escenario (ingreso total, delta vs base, pólizas que suben/bajan)
+    - por_segmento: DataFrame por (escenario, segmento) con ingreso, delta y participación
+    """
+    segmentos = segmentos or ["tipo_vehiculo"]
+    if not isinstance(segmentos, list):
+        raise ValueError(f"Los segmentos deben ser una lista: {segmentos!r}")
+    for seg in segmentos:
+        if seg not in SEGMENTOS_SOPORTADOS:
+            raise ValueError(f"Segmento no soportado: {seg}")
+    if not escenarios:
+        raise ValueError("Se requiere al menos un escenario.")
+    if not isinstance(escenarios, list) or not all(isinstance(esc, dict) for esc in escenarios):
+        raise ValueError("Los escenarios deben ser una lista de objetos {nombre, factores}.")
+    if df.empty:
+        raise ValueError("El portafolio está vacío.")
+
+    nombres = ["base"]
+    factores = [{}]
+    for i, esc in enumerate(escenarios, 1):
+        nombres.append(str(esc.get("nombre") or f"escenario_{i}"))
+        factores.append(esc.get("factores", {}) or {})
+    params = [validar_factores(f) for f in factores]
+
+    combos, combos_seg, categorias_seg, conteos = _combinaciones(df, segmentos)
+    estimados = _estimados_por_escenario(combos, params)  # (S, K)
+
+    ingreso = estimados @ conteos  # (S,)
+    ingreso_base = ingreso[0]
+    cambio = estimados - estimados[0]
+    suben = (cambio > 0).astype(np.int64) @ conteos
+    bajan = (cambio < 0).astype(np.int64) @ conteos
+
+    resumen = []
+    for s, nombre in enumerate(nombres):
+        resumen.append(
+            {
+                "nombre": nombre,
+                "factores": factores[s],
+                "ingreso_total": int(ingreso[s]),
+                "delta": int(ingreso[s] - ingreso_base),
+                "delta_pct": round(float((ingreso[s] - ingreso_base) / ingreso_base * 100), 2) if ingreso_base else 0.0,
+                "polizas_suben": int(suben[s]),
+                "polizas_bajan": int(bajan[s]),
+            }
+        )
+
+    por_segmento = {}
+    for seg in segmentos:
+        cats = categorias_seg[seg]
+        # Matriz (K × categorías) con el número de pólizas de cada combinación en cada categoría
+        pesos = np.zeros((len(conteos), len(cats)), dtype=np.float64)
+        pesos[np.arange(len(conteos)), combos_seg[seg]] = conteos
+        ingreso_seg = estimados @ pesos  # (S, C)
+        n_seg = pesos.sum(axis=0)
+
+        delta_seg = ingreso_seg - ingreso_seg[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            participacion = np.where(ingreso[:, None] > 0, ingreso_seg / ingreso[:, None] * 100, 0.0)
+            delta_pct_seg = np.where(ingreso_seg[0] > 0, delta_seg / ingreso_seg[0] * 100, 0.0)
+
+        tabla = pd.DataFrame(
+            {
+                "escenario": np.repeat(nombres, len(cats)),
+                seg: np.tile(cats, len(nombres)),
+                "polizas": np.tile(n_seg, len(nombres)).astype(np.int64),
+                "ingreso": ingreso_seg.ravel().astype(np.int64),
+                "prima_media": (ingreso_seg / np.maximum(n_seg, 1)).ravel().round(0),
+                "delta": delta_seg.ravel().astype(np.int64),
+                "delta_pct": delta_pct_seg.ravel().round(2),
+                "participacion_pct": participacion.ravel().round(2),
+                "cambio_participacion_pp": (participacion - participacion[0]).ravel().round(2),
+            }
+        ).set_index(["escenario", seg])
+        por_segmento[seg] = tabla
+
+    return {
+        "n_polizas": int(conteos.sum()),
+        "n_escenarios": len(escenarios),
+        "n_combinaciones": int(len(conteos)),
+        "ingreso_actual": int(df["valor_soat_actual"].sum()),
+        "ingreso_base_estimado": int(ingreso_base),
+        "escenarios": resumen,
+        "por_segmento": por_segmento,
+    }
@@ -0,0 +1,132 @@
+# src/synthetic.py
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from .business_rules import calcular_soat_vectorizado, codificar_portafolio
+
+# Distribuciones aproximadas a las de data/datasets/vehiculos_soat.csv
+TIPOS = {"bus": 0.32, "camion": 0.24, "moto": 0.20, "auto_particular": 0.16, "taxi": 0.08}
+CILINDRAJES = {
+    "auto_particular": [1200, 1400, 1600, 1800],
+    "bus": [3000, 4000],
+    "camion": [3500, 4500],
+    "moto": [90, 125, 150, 180, 250],
+    "taxi": [1200, 1400, 1600],
+}
+USO_PARTICULAR = {"auto_particular": 0.75, "moto": 0.60, "bus": 0.0, "camion": 0.0, "taxi": 0.0}
+CIUDADES = {
+    "Villavicencio": 0.16,
+    "Pereira": 0.16,
+    "Cartagena": 0.12,
+    "Barranquilla": 0.10,
+    "Bucaramanga": 0.10,
+    "Manizales": 0.10,
+    "Bogotá": 0.10,
+    "Medellín": 0.08,
+    "Cali": 0.04,
+    "Cúcuta": 0.04,
+}
+ZONAS = {"alta": 0.42, "baja": 0.32, "media": 0.26}
+SINIESTROS = {0: 0.46, 1: 0.18, 2: 0.18, 3: 0.18}
+ANIOS_SIN_SINIESTROS = {0: 0.30, 1: 0.20, 2: 0.15, 3: 0.20, 4: 0.15}
+
+LETRAS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+
+
+def _elegir(rng: np.random.Generator, distribucion: Dict, n: int) -> np.ndarray:
+    valores = list(distribucion)
+    probs = np.array(list(distribucion.values()), dtype=float)
+    return np.array(valores, dtype=object)[rng.choice(len(valores), size=n, p=probs / probs.sum())]
+
+
+def _placas(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Placas únicas tipo ABC123 (hasta 17.576.000)."""
+    ids = rng.choice(26 ** 3 * 1000, size=n, replace=False)
+    letras, numeros = np.divmod(ids, 1000)
+    l1, resto = np.divmod(letras, 26 * 26)
+    l2, l3 = np.divmod(resto, 26)
+    prefijo = np.char.add(np.char.add(LETRAS[l1], LETRAS[l2]), LETRAS[l3])
+    return np.char.add(prefijo, np.char.zfill(numeros.astype(str), 3)).astype(object)
+
+
+def generar_portafolio(n: int, seed: int = 42, ruido: float = 0.0) -> pd.DataFrame:
+    """
+    Genera un portafolio sintético con las mismas columnas que vehiculos_soat.csv.
+
+    valor_soat_actual es el valor estimado por las reglas vigentes; con ruido > 0 se
+    multiplica por un factor lognormal (útil para probar el repricing).
+    """
+    rng = np.random.default_rng(seed)
+
+    tipo = _elegir(rng, TIPOS, n)
+    cilindraje = np.zeros(n, dtype=np.int64)
+    uso = np.full(n, "publico", dtype=object)
+    for t, opciones in CILINDRAJES.items():
+        m = tipo == t
+        cilindraje[m] = rng.choice(opciones, size=int(m.sum()))
+        uso[m & (rng.random(n) < USO_PARTICULAR[t])] = "particular"
+
+    siniestros = _elegir(rng, SINIESTROS, n).astype(np.int64)
+    anios = _elegir(rng, ANIOS_SIN_SINIESTROS, n).astype(np.int64)
+    anios[siniestros > 0] = 0
+    edad = np.clip(rng.normal(49, 16, n).round(), 18, 85).astype(np.int64)
+    zona = _elegir(rng, ZONAS, n)
+
+    codigos = codificar_portafolio(tipo, cilindraje, edad, siniestros, zona, anios)
+    valor = calcular_soat_vectorizado(codigos)["valor_estimado"]
+    if ruido > 0:
+        valor = (np.ceil(valor * rng.lognormal(0.0, ruido, n) / 1000.0) * 1000).astype(np.int64)
+
+    vencimiento = pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+
+    return pd.DataFrame(
+        {
+            "placa": _placas(rng, n),
+            "tipo_vehiculo": tipo,
+            "cilindraje": cilindraje,
+            "modelo": rng.integers(2005, 2026, n),
+            "edad_conductor": edad,
+            "numero_siniestros_12m": siniestros,
+            "anios_sin_siniestros": anios,
+            "valor_soat_actual": valor,
+            "ciudad": _elegir(rng, CIUDADES, n),
+            "zona_riesgo": zona,
+            "genero_conductor": rng.choice(np.array(["M", "F"], dtype=object), size=n, p=[0.54, 0.46]),
+            "uso_vehiculo": uso,
+            "fecha_vencimiento": vencimiento.strftime("%Y-%m-%d"),
+        }
+    )
+
+
+# Vocabulario para documentos sintéticos del manual de tarifas
+VOCABULARIO = (
+    "tarifa base soat vehiculo moto automovil taxi bus camion cilindraje centimetros cubicos "
+    "conductor edad menor mayor años factor recargo descuento siniestro siniestros reclamacion "
+    "zona riesgo baja media alta ciudad historial asegurado poliza vigencia vencimiento renovacion "
+    "valor prima limite minimo maximo ajuste redondeo mil pesos cop resolucion superintendencia "
+    "financiera tabla categoria servicio publico particular uso tomador cobertura gastos medicos "
+    "incapacidad muerte transporte victimas accidente transito fondo adres contribucion"
+).split()
+
+
+def generar_corpus(n_docs: int, palabras_por_doc: int = 2000, seed: int = 42) -> Dict[str, str]:
+    """
+    Genera n_docs documentos de texto con vocabulario del manual SOAT (frecuencias tipo Zipf)
+    y algunas cifras, para indexarlos con KnowledgeBase.index_texts.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array(VOCABULARIO, dtype=object)
+    pesos = 1.0 / np.arange(1, len(vocab) + 1)
+    pesos /= pesos.sum()
+
+    corpus = {}
+    for i in range(n_docs):
+        palabras = vocab[rng.permutation(len(vocab))][rng.choice(len(vocab), size=palabras_por_doc, p=pesos)]
+        numeros = rng.integers(1, 2_000_000, size=palabras_por_doc // 20).astype(str)
+        posiciones = rng.choice(palabras_por_doc, size=len(numeros), replace=False)
+        palabras[posiciones] = numeros
+        lineas = [" ".join(palabras[j:j + 15]) for j in range(0, palabras_por_doc, 15)]
+        corpus[f"manual_sintetico_{i:05d}.pdf"] = "\n".join(lineas)
+    return corpus
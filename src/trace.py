@@ -0,0 +1,221 @@
+# src/trace.py
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import (
+    LOGS_DIR,
+    TRACE_BUFFER_SIZE,
+    TRACE_JSONL_ENABLED,
+    TRACE_RESUMEN_N,
+    TRACE_STDOUT_NIVEL,
+)
+
+NIVELES = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+# Máximo de eventos en cola por sink
+MAX_COLA_SINK = 10_000
+
+# Segundos que el sink de auditoría (JSONL) espera lugar en la cola antes de descartar;
+# la consola no espera (descarta al llenarse)
+ESPERA_SINK_AUDITORIA = 5.0
+
+
+@dataclass
+class EventoTraza:
+    ts: float
+    nivel: str
+    tipo: str
+    mensaje: str
+    datos: Dict[str, Any] = field(default_factory=dict)
+
+    def a_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["ts"] = datetime.fromtimestamp(self.ts).isoformat(timespec="milliseconds")
+        if not self.datos:
+            del d["datos"]
+        return d
+
+
+class SinkAsincrono:
+    """
+    Destino de eventos que escribe en lotes desde un hilo propio: quien registra el
+    evento solo hace un put en una cola acotada, sin syscalls.
+
+    Con espera=None, si la cola está llena el evento se descarta sin bloquear; con
+    espera=segundos, quien registra espera hasta ese tiempo (contrapresión) y solo
+    descarta si la cola sigue llena. Los descartes se cuentan en `descartados`.
+    """
+
+    def __init__(
+        self,
+        escribir_lote: Callable[[List[EventoTraza]], None],
+        nivel_min: str = "INFO",
+        lote: int = 512,
+        nombre: str = "sink",
+        espera: Optional[float] = None,
+    ):
+        self.escribir_lote = escribir_lote
+        self.nivel_min = NIVELES[nivel_min]
+        self.lote = lote
+        self.nombre = nombre
+        self.espera = espera
+        self.descartados = 0
+        self._cola: "queue.Queue[EventoTraza]" = queue.Queue(maxsize=MAX_COLA_SINK)
+        self._hilo = threading.Thread(target=self._bucle, name="soat-trace-sink", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, evento: EventoTraza) -> bool:
+        """Encola el evento; False si se descartó por cola llena."""
+        if NIVELES[evento.nivel] < self.nivel_min:
+            return True
+        try:
+            if self.espera is None:
+                self._cola.put_nowait(evento)
+            else:
+                self._cola.put(evento, timeout=self.espera)
+        except queue.Full:
+            self.descartados += 1
+            return False
+        return True
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < self.lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.escribir_lote(lote)
+            except Exception as e:
+                sys.stderr.write(f"[WARN] Sink de traza falló: {e}\n")
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    def vaciar(self):
+        """Espera a que se escriban los eventos pendientes."""
+        self._cola.join()
+
+
+def _escribir_stdout(lote: List[EventoTraza]):
+    sys.stdout.write("".join(f"{e.mensaje}\n" for e in lote))
+    sys.stdout.flush()
+
+
+def _escribir_jsonl(lote: List[EventoTraza]):
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    # Un archivo por día; se abre por lote, no por evento
+    path = LOGS_DIR / f"traza_{datetime.now().strftime('%Y%m%d')}.jsonl"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(e.a_dict(), ensure_ascii=False, default=str) + "\n" for e in lote))
+
+
+_sinks: Optional[List[SinkAsincrono]] = None
+_sinks_lock = threading.Lock()
+
+
+def sinks_globales() -> List[SinkAsincrono]:
+    """Sinks compartidos por todos los contextos del proceso (se crean al primer uso)."""
+    global _sinks
+    with _sinks_lock:
+        if _sinks is None:
+            _sinks = [SinkAsincrono(_escribir_stdout, nivel_min=TRACE_STDOUT_NIVEL, nombre="stdout")]
+            if TRACE_JSONL_ENABLED:
+                _sinks.append(
+                    SinkAsincrono(_escribir_jsonl, nivel_min="DEBUG", nombre="jsonl", espera=ESPERA_SINK_AUDITORIA)
+                )
+            atexit.register(vaciar_sinks)
+        return _sinks
+
+
+def vaciar_sinks():
+    for sink in _sinks or []:
+        sink.vaciar()
+
+
+def descartados_sinks() -> Dict[str, int]:
+    """Eventos descartados por cola llena en cada sink global (acumulado del proceso)."""
+    return {sink.nombre: sink.descartados for sink in _sinks or []}
+
+
+class Traza:
+    """
+    Traza estructurada de un contexto de ejecución.
+
+    Guarda los últimos `capacidad` eventos en un buffer circular, los primeros
+    `n_primeros` aparte y contadores por tipo y nivel, así que la memoria no crece
+    con el número de eventos. Cada evento se reenvía a los sinks (asíncronos).
+    """
+
+    def __init__(
+        self,
+        capacidad: int = TRACE_BUFFER_SIZE,
+        n_primeros: int = TRACE_RESUMEN_N,
+        sinks: Optional[List[SinkAsincrono]] = None,
+    ):
+        self.eventos: "deque[EventoTraza]" = deque(maxlen=capacidad)
+        self.primeros: List[EventoTraza] = []
+        self.n_primeros = n_primeros
+        self.total = 0
+        self.por_tipo: Counter = Counter()
+        self.por_nivel: Counter = Counter()
+        self.descartados: Counter = Counter()  # por sink, eventos de esta traza que no se escribieron
+        self.sinks = sinks
+
+    def evento(self, mensaje: str, nivel: str = "INFO", tipo: str = "log", **datos) -> EventoTraza:
+        if nivel not in NIVELES:
+            raise ValueError(f"Nivel de traza desconocido: {nivel}")
+        ev = EventoTraza(ts=time.time(), nivel=nivel, tipo=tipo, mensaje=mensaje, datos=datos)
+        self.total += 1
+        self.por_tipo[tipo] += 1
+        self.por_nivel[nivel] += 1
+        if len(self.primeros) < self.n_primeros:
+            self.primeros.append(ev)
+        self.eventos.append(ev)
+        for sink in self.sinks if self.sinks is not None else sinks_globales():
+            if not sink.enviar(ev):
+                self.descartados[sink.nombre] += 1
+        return ev
+
+    def mensajes(self) -> List[str]:
+        """Mensajes de los eventos retenidos en el buffer (los más recientes)."""
+        return [e.mensaje for e in self.eventos]
+
+    def limpiar(self):
+        self.eventos.clear()
+        self.primeros.clear()
+        self.total = 0
+        self.por_tipo.clear()
+        self.por_nivel.clear()
+        self.descartados.clear()
+
+    def resumen(self, n: int = TRACE_RESUMEN_N) -> Dict[str, Any]:
+        """
+        Traza resumida para el reporte: conteos por tipo y nivel, los primeros n y los
+        últimos n eventos, cuántos quedaron en medio sin mostrar y cuántos no llegaron
+        a algún sink (cola llena).
+        """
+        primeros = self.primeros[:n]
+        ultimos = list(self.eventos)[-n:] if n > 0 else []
+        # Sin solapar cuando hay pocos eventos
+        ya_mostrados = {id(e) for e in primeros}
+        ultimos = [e for e in ultimos if id(e) not in ya_mostrados]
+        return {
+            "total": self.total,
+            "por_tipo": dict(self.por_tipo.most_common()),
+            "por_nivel": dict(self.por_nivel),
+            "primeros": [e.a_dict() for e in primeros],
+            "ultimos": [e.a_dict() for e in ultimos],
+            "omitidos": max(self.total - len(primeros) - len(ultimos), 0),
+            "descartados": dict(self.descartados),
+        }